@@ -0,0 +1,114 @@
+import os
+import json
+import time
+from dataclasses import dataclass, asdict
+from typing import List, Set
+import FreeCAD
+
+# Statistics of a single phase of building a keyboard plate, times are in seconds
+@dataclass
+class PhaseStats:
+    name:            str
+    wallTime:        float = 0
+    # Time spent solving the sketches added during this phase, only if measureSolver is set
+    solverTime:      float = 0
+    objectCount:     int = 0
+    geometryCount:   int = 0
+    constraintCount: int = 0
+
+# Records PhaseStats for every phase of FreeCADKeyboard.createSketches().
+#
+#   profiler.start('Outline sketch')
+#   ... build the outline sketch ...
+#   profiler.stop()
+#
+# Geometry and constraint counts are those of the sketches added during the
+# phase. Solving them once more is how the solver time is measured, which adds
+# a solver pass to every build so it's only done when measureSolver is set.
+class BuildProfiler():
+    def __init__(self, doc: FreeCAD.Document, measureSolver: bool = False):
+        self.doc = doc
+        self.measureSolver = measureSolver
+        self.phases: List[PhaseStats] = []
+        self.current: PhaseStats = None
+        self.startTime = 0
+        self.objectNamesAtStart: Set[str] = set()
+
+    def start(self, name: str):
+        if self.current:
+            self.stop()
+
+        self.current = PhaseStats(name)
+        self.objectNamesAtStart = {obj.Name for obj in self.doc.Objects}
+        self.startTime = time.perf_counter()
+
+    def stop(self):
+        stats = self.current
+        stats.wallTime = time.perf_counter() - self.startTime
+
+        addedObjects = [obj for obj in self.doc.Objects if obj.Name not in self.objectNamesAtStart]
+        stats.objectCount = len(addedObjects)
+        for sketch in addedObjects:
+            if sketch.TypeId != 'Sketcher::SketchObject':
+                continue
+
+            stats.geometryCount += sketch.GeometryCount
+            stats.constraintCount += sketch.ConstraintCount
+            if self.measureSolver:
+                solveStart = time.perf_counter()
+                sketch.solve()
+                stats.solverTime += time.perf_counter() - solveStart
+
+        self.phases.append(stats)
+        self.current = None
+
+    def getTotalTime(self) -> float:
+        return sum(phase.wallTime for phase in self.phases)
+
+    def toString(self) -> str:
+        lines = [f"{'Phase':<26}{'Time':>9}{'Solver':>9}{'Objects':>9}{'Geometry':>10}{'Constraints':>13}"]
+        for phase in self.phases:
+            solverTime = f'{phase.solverTime:>8.2f}s' if self.measureSolver else f"{'-':>9}"
+            lines.append(
+                f"{phase.name:<26}{phase.wallTime:>8.2f}s{solverTime}"
+                f"{phase.objectCount:>9}{phase.geometryCount:>10}{phase.constraintCount:>13}"
+            )
+        lines.append(f"{'Total':<26}{self.getTotalTime():>8.2f}s")
+
+        return '\n'.join(lines)
+
+    def printToConsole(self):
+        FreeCAD.Console.PrintMessage(self.toString() + '\n')
+
+    # layoutInfo is stored along with the phases to tell the reports apart
+    def writeJSON(self, filePath: str, layoutInfo: dict):
+        report = {
+            'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'layout': layoutInfo,
+            'totalTime': self.getTotalTime(),
+            'phases': [asdict(phase) for phase in self.phases],
+        }
+        with open(filePath, 'w') as file:
+            json.dump(report, file, indent=4)
+
+    # Adds the totals of this build to a list of the last maxEntries builds, which
+    # CostEstimate calibrates its estimates with
+    def appendToHistory(self, filePath: str, layoutInfo: dict, maxEntries: int = 20):
+        history = []
+        if os.path.isfile(filePath):
+            try:
+                with open(filePath) as file:
+                    history = json.load(file)
+            except ValueError:
+                FreeCAD.Console.PrintWarning(f"Starting over with {filePath}, it couldn't be read\n")
+
+        history.append({
+            'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'layout': layoutInfo,
+            'totalTime': self.getTotalTime(),
+            'objectCount': sum(phase.objectCount for phase in self.phases),
+            'geometryCount': sum(phase.geometryCount for phase in self.phases),
+            'constraintCount': sum(phase.constraintCount for phase in self.phases),
+        })
+        with open(filePath, 'w') as file:
+            json.dump(history[-maxEntries:], file, indent=4)
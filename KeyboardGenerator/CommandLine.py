@@ -0,0 +1,386 @@
+# Generates a keyboard plate without the dialog, meant for FreeCADCmd:
+#
+#   FreeCADCmd KeyboardGenerator/CommandLine.py --pass --layout my-layout.json5 --format fcstd step dxf
+#
+# --soak and --compare-fusion don't write any files, they check and time the generator.
+#
+# Settings can be given as a JSON file (--settings), flags override whatever is in
+# there. The settings file uses the flag names in camelCase, e.g.:
+#
+#   {
+#       "switchType": "Cherry MX", "stabilizerType": "Cherry+Costar", "kerf": 0.1,
+#       "padding": 5, "cornerStyle": "rounded", "cornerRadiusX": 3, "cornerRadiusY": 3,
+#       "generationMode": "Placement only", "placementBackend": "Link arrays",
+#       "corners": {"topLeft": {"style": "angled", "radiusX": 5, "radiusY": 5}}
+#   }
+#
+# Run without arguments (or with --help) for all flags.
+import os
+import sys
+import json
+import gc
+import time
+import argparse
+from typing import List
+
+cliFolder = os.path.dirname(os.path.abspath(__file__))
+for folder in [cliFolder, os.path.dirname(cliFolder)]:
+    if folder not in sys.path:
+        sys.path.append(folder)
+
+# The key and plate shapes are calculated with a QGraphicsScene, which needs a
+# QApplication (also for the fonts KeyboardQ creates on import). Offscreen when
+# there's no GUI running.
+from PySide2 import QtWidgets
+if QtWidgets.QApplication.instance() is None:
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    qApplication = QtWidgets.QApplication([])
+
+import FreeCAD
+import Part
+from pykle_serial import serial
+import KeyboardQ
+import FreeCADKeyboard
+import TiledCut
+import Key
+
+FORMATS = ['fcstd', 'step', 'dxf']
+
+# How much the number of Python objects may grow over the course of a soak run
+SOAK_GROWTH_TOLERANCE = 0.01
+
+# FreeCADKeyboard.fuseTreeLeafSize values compared by --compare-fusion, 0 is a single flat MultiFuse
+FUSION_LEAF_SIZES = [0, 4, 8, 16, 32]
+# How much the volume of the plates may differ (relatively) between leaf sizes
+FUSION_VOLUME_TOLERANCE = 1e-6
+
+# Tile counts --compare-tiled-cut cuts the plate in when --cut-tiles isn't given
+TILED_CUT_COUNTS = [2, 4]
+
+CORNER_STYLES = {
+    'rounded': KeyboardQ.CornerStyle.ROUNDED,
+    'angled':  KeyboardQ.CornerStyle.ANGLED,
+    'right':   KeyboardQ.CornerStyle.RIGHT,
+}
+
+# Same defaults as the dialog
+DEFAULTS = {
+    'switchType':       KeyboardQ.KeyboardQ.switchType.value,
+    'stabilizerType':   KeyboardQ.KeyboardQ.stabilizerType.value,
+    'flipStabilizers':  False,
+    'rotateSwitch':     False,
+    'kerf':             KeyboardQ.KeyboardQ.kerf,
+    'thickness':        KeyboardQ.KeyboardQ.thickness,
+    'shape':            KeyboardQ.KeyboardQ.shape.value,
+    'padFromReserved':  True,
+    'padding':          0,
+    'cornerStyle':      'rounded',
+    'cornerRadiusX':    KeyboardQ.KbCorner.radiusX,
+    'cornerRadiusY':    KeyboardQ.KbCorner.radiusY,
+    'generationMode':   KeyboardQ.KeyboardQ.generationMode.value,
+    'placementBackend': KeyboardQ.KeyboardQ.placementBackend.value,
+    'cloneCap':         KeyboardQ.KeyboardQ.cloneCap,
+    'cutTiles':         FreeCADKeyboard.FreeCADKeyboard.cutTiles,
+    'fuseTreeLeafSize': FreeCADKeyboard.FreeCADKeyboard.fuseTreeLeafSize,
+    'rigidFootprints':  FreeCADKeyboard.FreeCADKeyboard.rigidFootprints,
+    'mirrorSymmetric':  KeyboardQ.KeyboardQ.mirrorSymmetric,
+    'footprintLibrary': None,
+    'buildProfile':     None,
+    'measureSolver':    FreeCADKeyboard.FreeCADKeyboard.measureSolverTime,
+}
+
+def CreateArgumentParser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='FreeCADCmd CommandLine.py --pass',
+        description='Generates a keyboard plate from a keyboard-layout-editor.com layout'
+    )
+    parser.add_argument('--layout', required=True, help='KLE layout file (JSON or JSON5)')
+    parser.add_argument('--settings', help='JSON file with settings, flags take precedence')
+    parser.add_argument('--output', help='Output path without extension, defaults to that of the layout')
+    parser.add_argument('--format', nargs='+', choices=FORMATS, default=['fcstd'], dest='formats')
+
+    # Everything below defaults to None so it's clear what was actually passed
+    parser.add_argument('--switch-type', dest='switchType', choices=[s.value for s in Key.SwitchType])
+    parser.add_argument('--stabilizer-type', dest='stabilizerType', choices=[s.value for s in Key.StabilizerType])
+    parser.add_argument('--flip-stabilizers', dest='flipStabilizers', action='store_true', default=None)
+    parser.add_argument('--rotate-switch', dest='rotateSwitch', action='store_true', default=None)
+    parser.add_argument('--kerf', type=float)
+    parser.add_argument('--thickness', type=float)
+    parser.add_argument('--shape', choices=[s.value for s in KeyboardQ.KbShape])
+    parser.add_argument(
+        '--pad-from-key', dest='padFromReserved', action='store_false', default=None,
+        help='Pad from the key rather than from the reserved space around it'
+    )
+    parser.add_argument('--padding', type=float, help='Padding for all sides')
+    for side in KeyboardQ.Padding.Sides():
+        parser.add_argument(f'--padding-{side.value}', dest=side.ToVarName('padding{}'), type=float)
+    parser.add_argument('--corner-style', dest='cornerStyle', choices=list(CORNER_STYLES))
+    parser.add_argument('--corner-radius-x', dest='cornerRadiusX', type=float)
+    parser.add_argument('--corner-radius-y', dest='cornerRadiusY', type=float)
+    parser.add_argument('--generation-mode', dest='generationMode', choices=[m.value for m in KeyboardQ.GenerationMode])
+    parser.add_argument(
+        '--placement-backend', dest='placementBackend', choices=[b.value for b in KeyboardQ.PlacementBackend]
+    )
+    parser.add_argument('--clone-cap', dest='cloneCap', type=int)
+    parser.add_argument('--cut-tiles', dest='cutTiles', type=int)
+    parser.add_argument(
+        '--fuse-tree-leaf-size', dest='fuseTreeLeafSize', type=int,
+        help='Cutouts per fuse when they overlap, 0 fuses all of them at once'
+    )
+    parser.add_argument('--rigid-footprints', dest='rigidFootprints', action='store_true', default=None)
+    parser.add_argument(
+        '--mirror-symmetric', dest='mirrorSymmetric', action='store_true', default=None,
+        help='Only build one half of mirror symmetric layouts and mirror it'
+    )
+    parser.add_argument('--footprint-library', dest='footprintLibrary', help='Folder of the footprint libraries')
+    parser.add_argument('--build-profile', dest='buildProfile', help='Where to write the JSON build profile')
+    parser.add_argument(
+        '--measure-solver', dest='measureSolver', action='store_true', default=None,
+        help='Solve every sketch once more to add the solver time to the build profile (slower)'
+    )
+    parser.add_argument(
+        '--soak', type=int, metavar='RUNS',
+        help='Generate the plate this many times in a row and check nothing is kept from one run to the next'
+    )
+    parser.add_argument(
+        '--compare-fusion', dest='compareFusion', action='store_true',
+        help='Time the plate with a flat fuse of the cutouts and with fuse trees of several leaf sizes'
+    )
+    parser.add_argument(
+        '--compare-tiled-cut', dest='compareTiledCut', action='store_true',
+        help='Cut the direct shape plate in tiles and check it has the same volume and faces as a serial cut'
+    )
+
+    return parser
+
+# FreeCADCmd hands everything after --pass to the script
+def GetArguments() -> List[str]:
+    if '--pass' in sys.argv:
+        return sys.argv[sys.argv.index('--pass') + 1:]
+
+    return sys.argv[1:]
+
+# Defaults, overwritten by the settings file, overwritten by the flags
+def GetSettings(args: argparse.Namespace) -> dict:
+    settings = dict(DEFAULTS)
+    if args.settings:
+        with open(args.settings, encoding='utf-8') as file:
+            settings.update(json.load(file))
+
+    settings.update({name: value for name, value in vars(args).items() if value is not None})
+
+    return settings
+
+def CreateFreeCADKeyboard(settings: dict) -> FreeCADKeyboard.FreeCADKeyboard:
+    keyboard = FreeCADKeyboard.FreeCADKeyboard()
+    keyboard.switchType = Key.SwitchType(settings['switchType'])
+    keyboard.stabilizerType = Key.StabilizerType(settings['stabilizerType'])
+    keyboard.flipStabilizers = settings['flipStabilizers']
+    keyboard.rotateSwitch = settings['rotateSwitch']
+    keyboard.showKeyCap = False
+    keyboard.kerf = settings['kerf']
+    keyboard.thickness = round(settings['thickness'], 2)
+    keyboard.shape = KeyboardQ.KbShape(settings['shape'])
+    keyboard.padFromReserved = settings['padFromReserved']
+    keyboard.generationMode = KeyboardQ.GenerationMode(settings['generationMode'])
+    keyboard.placementBackend = KeyboardQ.PlacementBackend(settings['placementBackend'])
+    keyboard.cloneCap = settings['cloneCap']
+    keyboard.cutTiles = settings['cutTiles']
+    keyboard.fuseTreeLeafSize = settings['fuseTreeLeafSize']
+    keyboard.rigidFootprints = settings['rigidFootprints']
+    keyboard.mirrorSymmetric = settings['mirrorSymmetric']
+    keyboard.footprintLibraryFolder = settings['footprintLibrary']
+    keyboard.buildProfilePath = settings['buildProfile']
+    keyboard.measureSolverTime = settings['measureSolver']
+
+    for side in KeyboardQ.Padding.Sides():
+        varName = side.ToVarName('padding{}')
+        setattr(keyboard, varName, settings.get(varName, settings['padding']))
+
+    corners = settings.get('corners', {})
+    for corner in KeyboardQ.Corner.Corners():
+        cornerSettings = corners.get(corner.value, {})
+        setattr(keyboard, corner.value, KeyboardQ.KbCorner(
+            corner,
+            round(cornerSettings.get('radiusX', settings['cornerRadiusX']), 2),
+            round(cornerSettings.get('radiusY', settings['cornerRadiusY']), 2),
+            CORNER_STYLES[cornerSettings.get('style', settings['cornerStyle'])]
+        ))
+
+    return keyboard
+
+# A 2D outline of the plate, the plate sliced halfway through its thickness
+def ExportDXF(doc: FreeCAD.Document, plate: FreeCAD.DocumentObject, thickness: float, filePath: str):
+    import importDXF
+
+    wires = plate.Shape.slice(FreeCAD.Vector(0, 0, 1), thickness / 2)
+    outlineShape = Part.makeCompound(wires)
+    outlineShape.translate(FreeCAD.Vector(0, 0, -thickness / 2))
+    outline = doc.addObject('Part::Feature', 'KeyboardPlateOutline')
+    outline.Shape = outlineShape
+    importDXF.export([outline], filePath)
+    doc.removeObject(outline.Name)
+
+def Generate(args: argparse.Namespace) -> int:
+    startTime = time.time()
+    settings = GetSettings(args)
+    with open(args.layout, encoding='utf-8') as file:
+        layout = KeyboardQ.AddArrayIfNeeded(file.read())
+
+    keyboard = CreateFreeCADKeyboard(settings)
+    # Lays out the keys, FreeCADKeyboard works off of the scene
+    keyboard.getScene(serial.parse(layout))
+
+    doc = FreeCAD.newDocument('KeyboardPlate')
+    body = None
+    if keyboard.generationMode != KeyboardQ.GenerationMode.DIRECT_SHAPE:
+        body = doc.addObject('PartDesign::Body', 'KeyboardPlateBody')
+    keyboard.createSketches(doc, body)
+
+    if not keyboard.plate.Shape.isValid():
+        FreeCAD.Console.PrintError("The generated plate isn't a valid shape\n")
+        return 1
+
+    outputPath = os.path.abspath(args.output or os.path.splitext(args.layout)[0])
+    for exportFormat in args.formats:
+        filePath = f'{outputPath}.{exportFormat}'
+        if exportFormat == 'step':
+            import Import
+            Import.export([keyboard.plate], filePath)
+        elif exportFormat == 'dxf':
+            ExportDXF(doc, keyboard.plate, keyboard.thickness, filePath)
+        else:
+            continue # Saved last, the DXF export temporarily adds an object
+        FreeCAD.Console.PrintMessage(f"Wrote {filePath}\n")
+
+    if 'fcstd' in args.formats:
+        doc.saveAs(f'{outputPath}.FCStd')
+        FreeCAD.Console.PrintMessage(f"Wrote {outputPath}.FCStd\n")
+    FreeCAD.closeDocument(doc.Name)
+
+    FreeCAD.Console.PrintMessage(f"Created keyboard files in: {time.time() - startTime:.2f} seconds\n")
+    return 0
+
+# Generates the same plate over and over in this one session. Every run should
+# leave nothing behind, the number of open documents and Python objects has to
+# stay the same. The first run is left out, it fills caches and may open the
+# footprint library.
+def Soak(args: argparse.Namespace, runs: int) -> int:
+    documentCounts = []
+    objectCounts = []
+    for run in range(runs):
+        if Generate(args) != 0:
+            return 1
+        gc.collect()
+        documentCounts.append(len(FreeCAD.listDocuments()))
+        objectCounts.append(len(gc.get_objects()))
+        FreeCAD.Console.PrintMessage(
+            f"Soak run {run + 1}/{runs}: {documentCounts[-1]} open documents, {objectCounts[-1]} Python objects\n"
+        )
+
+    documentGrowth = documentCounts[-1] - documentCounts[0]
+    objectGrowth = objectCounts[-1] - objectCounts[0]
+    if documentGrowth > 0 or objectGrowth > objectCounts[0] * SOAK_GROWTH_TOLERANCE:
+        FreeCAD.Console.PrintError(
+            f"Soak: {documentGrowth} documents and {objectGrowth} Python objects were left behind\n"
+        )
+        return 1
+
+    FreeCAD.Console.PrintMessage(f"Soak: {runs} runs without leftovers\n")
+    return 0
+
+# Generates the plate with every leaf size of FUSION_LEAF_SIZES and prints how long
+# each took (fusing happens in the final recompute, which is included) along with
+# the number of fuses. The plates have to have the same volume. Only layouts with
+# overlapping cutouts are fused, others are combined into a compound.
+def CompareFusion(args: argparse.Namespace) -> int:
+    settings = GetSettings(args)
+    with open(args.layout, encoding='utf-8') as file:
+        layout = KeyboardQ.AddArrayIfNeeded(file.read())
+
+    results = []
+    for leafSize in FUSION_LEAF_SIZES:
+        keyboard = CreateFreeCADKeyboard(settings)
+        keyboard.fuseTreeLeafSize = leafSize
+        keyboard.getScene(serial.parse(layout))
+        if keyboard.generationMode == KeyboardQ.GenerationMode.DIRECT_SHAPE:
+            FreeCAD.Console.PrintError("--compare-fusion doesn't apply to the direct shape generation mode\n")
+            return 1
+        if not keyboard.cutoutsOverlap():
+            FreeCAD.Console.PrintError("The cutouts of this layout don't overlap, they're never fused\n")
+            return 1
+
+        doc = FreeCAD.newDocument('FusionComparison')
+        body = doc.addObject('PartDesign::Body', 'KeyboardPlateBody')
+        startTime = time.perf_counter()
+        keyboard.createSketches(doc, body)
+        elapsed = time.perf_counter() - startTime
+        fuseCount = sum(1 for obj in doc.Objects if obj.TypeId == 'Part::MultiFuse')
+        results.append((leafSize, elapsed, fuseCount, keyboard.plate.Shape.Volume))
+        FreeCAD.closeDocument(doc.Name)
+
+    FreeCAD.Console.PrintMessage(f"{'Leaf size':<12}{'Fuses':>7}{'Time':>10}{'Volume':>14}\n")
+    for leafSize, elapsed, fuseCount, volume in results:
+        FreeCAD.Console.PrintMessage(
+            f"{leafSize or 'flat':<12}{fuseCount:>7}{elapsed:>9.2f}s{volume:>14.3f}\n"
+        )
+
+    flatVolume = results[0][3]
+    different = [
+        leafSize for leafSize, _, _, volume in results
+        if abs(volume - flatVolume) > abs(flatVolume) * FUSION_VOLUME_TOLERANCE
+    ]
+    if different:
+        FreeCAD.Console.PrintError(f"Leaf sizes {different} give a different plate than a flat fuse\n")
+        return 1
+
+    return 0
+
+# Cuts the direct shape plate in tiles by FreeCADCmd workers the way --cut-tiles does,
+# each result is compared (volume, bounding box and faces) with a serial cut.
+def CompareTiledCut(args: argparse.Namespace) -> int:
+    settings = GetSettings(args)
+    with open(args.layout, encoding='utf-8') as file:
+        layout = KeyboardQ.AddArrayIfNeeded(file.read())
+
+    keyboard = CreateFreeCADKeyboard(dict(settings, generationMode=KeyboardQ.GenerationMode.DIRECT_SHAPE.value))
+    keyboard.getScene(serial.parse(layout))
+    plateFace, cutoutFaces = keyboard.getDirectShapeFaces()
+    disjoint = not keyboard.cutoutsOverlap()
+
+    failed = []
+    for tileCount in [settings['cutTiles']] if settings['cutTiles'] > 1 else TILED_CUT_COUNTS:
+        tiles = TiledCut.SplitIntoTiles(plateFace, cutoutFaces, tileCount)
+        for problem in TiledCut.GetSplitProblems(plateFace, cutoutFaces, tiles):
+            FreeCAD.Console.PrintError(f"{tileCount} tiles: {problem}\n")
+            failed.append(tileCount)
+        FreeCAD.Console.PrintMessage(f"{tileCount} tiles ({len(tiles)} after splitting)\n")
+        parallelShape = TiledCut.CutParallel(
+            plateFace, cutoutFaces, keyboard.thickness, tileCount, disjoint=disjoint, fallBack=False
+        )
+        if parallelShape is None:
+            failed.append(tileCount)
+        elif not TiledCut.CompareWithSerial(parallelShape, plateFace, cutoutFaces, keyboard.thickness, disjoint):
+            failed.append(tileCount)
+
+    return 1 if failed else 0
+
+def Main() -> int:
+    parser = CreateArgumentParser()
+    arguments = GetArguments()
+    if not arguments:
+        parser.print_help()
+        return 2
+
+    args = parser.parse_args(arguments)
+    if args.soak:
+        return Soak(args, args.soak)
+    if args.compareFusion:
+        return CompareFusion(args)
+    if args.compareTiledCut:
+        return CompareTiledCut(args)
+
+    return Generate(args)
+
+if __name__ == '__main__':
+    sys.exit(Main())
@@ -0,0 +1,131 @@
+# Predicts what pressing Ok will build and roughly how long that takes, before
+# anything is built. The counts come from FreeCADKeyboard.estimateCost(), the time
+# is a weighted sum of them scaled to match the builds recorded by BuildProfiler
+# (see BuildProfiler.appendToHistory).
+import os
+import copy
+import json
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+import KeyboardQ
+
+# Seconds per object, geometry, constraint and cutout (every cutout adds to the
+# booleans of the final recompute). Only the ratios matter once calibrated.
+SECONDS_PER_OBJECT = 0.05
+SECONDS_PER_GEOMETRY = 0.001
+SECONDS_PER_CONSTRAINT = 0.004
+SECONDS_PER_CUTOUT = 0.02
+# Only the last builds are used to calibrate, the machine or FreeCAD may have changed
+CALIBRATION_ENTRIES = 10
+# Above this faster settings are suggested, if they save at least a quarter of the time
+SLOW_SECONDS = 30
+SUGGESTION_RATIO = 0.75
+CLONE_CAPS = [1, 2, 4, 8, 16, 32]
+
+@dataclass
+class CostEstimate():
+    keyCount: int = 0
+    sketchCount: int = 0
+    geometryCount: int = 0
+    constraintCount: int = 0
+    cloneCount: int = 0
+    pointArrayCount: int = 0
+    linkArrayCount: int = 0
+    # Part::Cut and Part::MultiFuse objects, or the single cut of GenerationMode.DIRECT_SHAPE
+    booleanCount: int = 0
+    # Every document object, the above included
+    objectCount: int = 0
+
+    def getSeconds(self, calibrationFactor: float = 1.) -> float:
+        return calibrationFactor * GetUncalibratedSeconds(
+            self.objectCount, self.geometryCount, self.constraintCount, self.keyCount
+        )
+
+def GetUncalibratedSeconds(objectCount: int, geometryCount: int, constraintCount: int, cutoutCount: int) -> float:
+    return objectCount * SECONDS_PER_OBJECT \
+        + geometryCount * SECONDS_PER_GEOMETRY \
+        + constraintCount * SECONDS_PER_CONSTRAINT \
+        + cutoutCount * SECONDS_PER_CUTOUT
+
+# How much slower (above 1) or faster the recorded builds were than the weights
+# predict. Builds in the same generation mode are preferred, 1 without any history.
+def GetCalibrationFactor(historyPath: str, generationMode: KeyboardQ.GenerationMode) -> float:
+    if not historyPath or not os.path.isfile(historyPath):
+        return 1.
+
+    try:
+        with open(historyPath) as file:
+            history = json.load(file)
+    except ValueError:
+        return 1.
+
+    sameMode = [entry for entry in history if entry['layout'].get('generationMode') == generationMode.value]
+    entries = (sameMode or history)[-CALIBRATION_ENTRIES:]
+    predicted = sum(
+        GetUncalibratedSeconds(
+            entry['objectCount'], entry['geometryCount'], entry['constraintCount'], entry['layout']['keyCount']
+        ) for entry in entries
+    )
+    actual = sum(entry['totalTime'] for entry in entries)
+    if predicted <= 0 or actual <= 0:
+        return 1.
+
+    return actual / predicted
+
+# '45s', '3 min'
+def FormatSeconds(seconds: float) -> str:
+    if seconds < 90:
+        return f'{max(1, round(seconds))}s'
+
+    return f'{round(seconds / 60)} min'
+
+# Settings that are estimated to be a good deal faster than those of keyboard, as
+# (description, estimated seconds) fastest first. Only when the estimate is high.
+#
+# The layout is only analysed once (see FreeCADKeyboard.getCostAnalysis(), pass its
+# analysis if there is one already), every alternative just counts it differently.
+# Every estimate is calibrated with the builds of its own generation mode in
+# keyboard.buildHistoryPath.
+def GetFasterSettings(keyboard, estimate: CostEstimate, analysis=None) -> List[Tuple[str, float]]:
+    calibrationFactors: Dict[KeyboardQ.GenerationMode, float] = {}
+    def getCalibrationFactor(generationMode: KeyboardQ.GenerationMode) -> float:
+        if generationMode not in calibrationFactors:
+            calibrationFactors[generationMode] = GetCalibrationFactor(keyboard.buildHistoryPath, generationMode)
+        return calibrationFactors[generationMode]
+
+    seconds = estimate.getSeconds(getCalibrationFactor(keyboard.generationMode))
+    if seconds < SLOW_SECONDS:
+        return []
+
+    analysis = analysis or keyboard.getCostAnalysis()
+
+    alternatives = [
+        ('Generation mode: ' + KeyboardQ.GenerationMode.PLACEMENT_ONLY.value,
+            'generationMode', KeyboardQ.GenerationMode.PLACEMENT_ONLY),
+        ('Generation mode: ' + KeyboardQ.GenerationMode.DIRECT_SHAPE.value + ' (not editable afterwards)',
+            'generationMode', KeyboardQ.GenerationMode.DIRECT_SHAPE),
+        ('Placement backend: ' + KeyboardQ.PlacementBackend.LINK_ARRAY.value,
+            'placementBackend', KeyboardQ.PlacementBackend.LINK_ARRAY),
+        ('Rigid footprints', 'rigidFootprints', True),
+    ]
+    # Only the best clone cap
+    cloneCapAlternatives = [(f'Clone cap: {cloneCap}', 'cloneCap', cloneCap) for cloneCap in CLONE_CAPS]
+
+    fasterSettings = []
+    for candidates in [[alternative] for alternative in alternatives] + [cloneCapAlternatives]:
+        best = None
+        for description, name, value in candidates:
+            if getattr(keyboard, name) == value:
+                continue
+            # A shallow copy, keyboard itself is left alone
+            alternative = copy.copy(keyboard)
+            setattr(alternative, name, value)
+            alternativeSeconds = alternative.estimateCost(analysis).getSeconds(
+                getCalibrationFactor(alternative.generationMode)
+            )
+            if best is None or alternativeSeconds < best[1]:
+                best = (description, alternativeSeconds)
+        if best and best[1] <= seconds * SUGGESTION_RATIO:
+            fasterSettings.append(best)
+
+    return sorted(fasterSettings, key=lambda setting: setting[1])
@@ -6,7 +6,6 @@ from PySide2 import QtCore, QtGui, QtWidgets, QtSvg, QtWebEngineWidgets
 import xml.etree.ElementTree as ET
 import FreeCADGui
 import FreeCAD
-import copy
 import re
 import os.path
 import json
@@ -24,6 +23,10 @@ import KeyboardQ
 from KeyboardQ import Corner
 import SvgPlateThickness
 import FreeCADKeyboard
+import BuildProfiler
+import TiledCut
+import FootprintLibrary
+import CostEstimate
 import Key
 
 # FreeCAD caches modules 
@@ -31,6 +34,10 @@ import Key
 reload(serial)
 reload(KeyboardQ)
 reload(Key)
+reload(BuildProfiler)
+reload(TiledCut)
+reload(FootprintLibrary)
+reload(CostEstimate)
 reload(FreeCADKeyboard)
 reload(SvgPlateThickness)
 
@@ -46,6 +53,12 @@ DEFAULTS = {
     'KeyboardPlateColor':   KeyboardQ.KeyboardQ.keyboardPlateBrush.color(),
     'HoverColor':           KeyboardQ.KeyboardQ.hoverBrush.color(),
     'CloneCap':             KeyboardQ.KeyboardQ.cloneCap,
+    'GenerationMode':       KeyboardQ.KeyboardQ.generationMode.value,
+    'FootprintLibrary':     False,
+    'PlacementBackend':     KeyboardQ.KeyboardQ.placementBackend.value,
+    'RigidFootprints':      FreeCADKeyboard.FreeCADKeyboard.rigidFootprints,
+    'MirrorSymmetric':      KeyboardQ.KeyboardQ.mirrorSymmetric,
+    'CutTiles':             FreeCADKeyboard.FreeCADKeyboard.cutTiles,
 }
 def GetColor(defaultName: str) -> QtGui.QColor:
     if defaultName in SETTINGS.allKeys():
@@ -485,10 +498,16 @@ class UiDialog(QtWidgets.QDialog):
     defaultKeyboardLayoutPath = cmdFolder + os.path.sep + 'kg-logo.json'
     defaultKeyboardLayout = Path(defaultKeyboardLayoutPath).read_text(encoding="utf-8")
 
-    messageOkDefault = "ⓘ FreeCAD may Freeze for a while after pressing Ok"
+    messageEstimate = "✔️ Valid keyboard layout, generating it takes about {}"
+    messageSlowEstimate = "⚠ Generating this keyboard takes about {}, hover here for faster settings"
+    messageCancelled = "Cancelled generating the keyboard, nothing was kept"
+    questionUpdate = "The active document '{}' holds a keyboard generated before. Update it to this layout or generate a new document?"
     messageNotOk = "⚠ Failed to parse the JSON5. Copy/paste from keyboard-layout.generator.com or a JSON file made by it"
 
     paddingToHighlight: KeyboardQ.Padding = KeyboardQ.Padding.NONE
+    # The cost estimate analyses the whole layout, it's only updated once the layout
+    # and settings haven't changed for this long (rather than on every keystroke)
+    costEstimateDelayMs = 300
 
     def __init__(self, appName: str, appVersion: str, userJSON5FilePath):
         super().__init__()
@@ -524,6 +543,10 @@ class UiDialog(QtWidgets.QDialog):
 
     def setupUi(self):
         self.keyboardQ = KeyboardQ.KeyboardQ()
+        self.costEstimateTimer = QtCore.QTimer(self)
+        self.costEstimateTimer.setSingleShot(True)
+        self.costEstimateTimer.setInterval(self.costEstimateDelayMs)
+        self.costEstimateTimer.timeout.connect(self.updateCostEstimate)
         self.gLayoutMain = QtWidgets.QGridLayout(self)
         self.gLayoutMain.setMargin(0)
 
@@ -602,6 +625,7 @@ class UiDialog(QtWidgets.QDialog):
         self.sbCloneCap.setValue(SETTINGS.value('CloneCap', KeyboardQ.KeyboardQ.cloneCap))
         self.sbCloneCap.valueChanged.connect(
             lambda: SETTINGS.setValue('CloneCap', self.sbCloneCap.value()))
+        self.sbCloneCap.valueChanged.connect(lambda: self.showCostEstimate())
         self.gLayoutSettings.addWidget(self.sbCloneCap, 1, 1, 1, 1)
         self.pbDefaultCloneCap = QtWidgets.QPushButton(
             str(KeyboardQ.KeyboardQ.cloneCap), self.mainP2)
@@ -642,6 +666,127 @@ To create the cutouts there are two options: <ol>
 
             setattr(self, 'cpb'+setting, cpb)
         
+        self.lblGenerationMode = QtWidgets.QLabel('Generation mode', self.mainP2)
+        self.gLayoutSettings.addWidget(self.lblGenerationMode, 7, 0, 1, 1)
+        self.cbGenerationMode = QtWidgets.QComboBox(self.mainP2)
+        self.cbGenerationMode.addItems([mode.value for mode in KeyboardQ.GenerationMode])
+        self.cbGenerationMode.setCurrentText(SETTINGS.value('GenerationMode', DEFAULTS['GenerationMode']))
+        self.cbGenerationMode.setToolTip('''<html>
+<strong>Constrained</strong>: every key position is constrained to the keyboard plate, 
+moving the plate in the sketch moves the keys along with it.<br/>
+<strong>Placement only</strong>: key positions are placed without any constraints, only the 
+keyboard plate and footprint sketches are constrained. Much faster for big layouts.<br/>
+<strong>Direct shape</strong>: a single solid without any sketches or parametric history, 
+the fastest option. Meant for exporting the plate (e.g. for laser cutting).
+        </html>''')
+        self.cbGenerationMode.currentTextChanged.connect(
+            lambda: SETTINGS.setValue('GenerationMode', self.cbGenerationMode.currentText()))
+        self.cbGenerationMode.currentTextChanged.connect(lambda: self.showCostEstimate())
+        self.gLayoutSettings.addWidget(self.cbGenerationMode, 7, 1, 1, 1)
+        self.pbDefaultGenerationMode = QtWidgets.QPushButton(DEFAULTS['GenerationMode'], self.mainP2)
+        self.pbDefaultGenerationMode.clicked.connect(
+            lambda: self.cbGenerationMode.setCurrentText(DEFAULTS['GenerationMode']))
+        self.gLayoutSettings.addWidget(self.pbDefaultGenerationMode, 7, 2, 1, 1)
+
+        self.lblFootprintLibrary = QtWidgets.QLabel('Footprint library', self.mainP2)
+        self.gLayoutSettings.addWidget(self.lblFootprintLibrary, 8, 0, 1, 1)
+        self.cbFootprintLibrary = QtWidgets.QCheckBox(self.mainP2)
+        self.cbFootprintLibrary.setChecked(
+            SETTINGS.value('FootprintLibrary', DEFAULTS['FootprintLibrary'], type=bool))
+        self.cbFootprintLibrary.setToolTip('''<html>
+Keeps the switch and stabilizer footprints in a separate document (in the footprint-library folder) 
+which keyboard plates link to, the footprints are then only sketched and extruded once.
+        </html>''')
+        self.cbFootprintLibrary.toggled.connect(
+            lambda: SETTINGS.setValue('FootprintLibrary', self.cbFootprintLibrary.isChecked()))
+        self.cbFootprintLibrary.toggled.connect(lambda: self.showCostEstimate())
+        self.gLayoutSettings.addWidget(self.cbFootprintLibrary, 8, 1, 1, 1)
+        self.pbDefaultFootprintLibrary = QtWidgets.QPushButton(
+            'On' if DEFAULTS['FootprintLibrary'] else 'Off', self.mainP2)
+        self.pbDefaultFootprintLibrary.clicked.connect(
+            lambda: self.cbFootprintLibrary.setChecked(DEFAULTS['FootprintLibrary']))
+        self.gLayoutSettings.addWidget(self.pbDefaultFootprintLibrary, 8, 2, 1, 1)
+
+        self.lblPlacementBackend = QtWidgets.QLabel('Placement backend', self.mainP2)
+        self.gLayoutSettings.addWidget(self.lblPlacementBackend, 9, 0, 1, 1)
+        self.cbPlacementBackend = QtWidgets.QComboBox(self.mainP2)
+        self.cbPlacementBackend.addItems([backend.value for backend in KeyboardQ.PlacementBackend])
+        self.cbPlacementBackend.setCurrentText(SETTINGS.value('PlacementBackend', DEFAULTS['PlacementBackend']))
+        self.cbPlacementBackend.setToolTip('''<html>
+<strong>Draft clones</strong>: every key is a clone of its footprint, point arrays are used 
+once the clone cap is exceeded.<br/>
+<strong>Link arrays</strong>: a single link array per footprint with an element for every key. 
+Uses far less memory and recomputes faster on big layouts. Not used by the Direct shape generation mode.
+        </html>''')
+        self.cbPlacementBackend.currentTextChanged.connect(
+            lambda: SETTINGS.setValue('PlacementBackend', self.cbPlacementBackend.currentText()))
+        self.cbPlacementBackend.currentTextChanged.connect(lambda: self.showCostEstimate())
+        self.gLayoutSettings.addWidget(self.cbPlacementBackend, 9, 1, 1, 1)
+        self.pbDefaultPlacementBackend = QtWidgets.QPushButton(DEFAULTS['PlacementBackend'], self.mainP2)
+        self.pbDefaultPlacementBackend.clicked.connect(
+            lambda: self.cbPlacementBackend.setCurrentText(DEFAULTS['PlacementBackend']))
+        self.gLayoutSettings.addWidget(self.pbDefaultPlacementBackend, 9, 2, 1, 1)
+
+        self.lblRigidFootprints = QtWidgets.QLabel('Rigid footprints', self.mainP2)
+        self.gLayoutSettings.addWidget(self.lblRigidFootprints, 10, 0, 1, 1)
+        self.cbRigidFootprints = QtWidgets.QCheckBox(self.mainP2)
+        self.cbRigidFootprints.setChecked(
+            SETTINGS.value('RigidFootprints', DEFAULTS['RigidFootprints'], type=bool))
+        self.cbRigidFootprints.setToolTip('''<html>
+Locks the lines of the switch and stabilizer footprint sketches with a single block constraint each, 
+rather than with horizontal/vertical, distance and coincident constraints. The sketches are still fully 
+constrained but there's (next to) nothing left for the solver to do. Editing a footprint means removing 
+the block constraints first.
+        </html>''')
+        self.cbRigidFootprints.toggled.connect(
+            lambda: SETTINGS.setValue('RigidFootprints', self.cbRigidFootprints.isChecked()))
+        self.cbRigidFootprints.toggled.connect(lambda: self.showCostEstimate())
+        self.gLayoutSettings.addWidget(self.cbRigidFootprints, 10, 1, 1, 1)
+        self.pbDefaultRigidFootprints = QtWidgets.QPushButton(
+            'On' if DEFAULTS['RigidFootprints'] else 'Off', self.mainP2)
+        self.pbDefaultRigidFootprints.clicked.connect(
+            lambda: self.cbRigidFootprints.setChecked(DEFAULTS['RigidFootprints']))
+        self.gLayoutSettings.addWidget(self.pbDefaultRigidFootprints, 10, 2, 1, 1)
+
+        self.lblMirrorSymmetric = QtWidgets.QLabel('Mirror symmetric', self.mainP2)
+        self.gLayoutSettings.addWidget(self.lblMirrorSymmetric, 11, 0, 1, 1)
+        self.cbMirrorSymmetric = QtWidgets.QCheckBox(self.mainP2)
+        self.cbMirrorSymmetric.setChecked(
+            SETTINGS.value('MirrorSymmetric', DEFAULTS['MirrorSymmetric'], type=bool))
+        self.cbMirrorSymmetric.setToolTip('''<html>
+Only builds the left half of a mirror symmetric layout (e.g. a split keyboard), the right half 
+is a Part::Mirroring of it. Layouts that aren't symmetric are built as usual. Not used by the 
+Direct shape generation mode.
+        </html>''')
+        self.cbMirrorSymmetric.toggled.connect(
+            lambda: SETTINGS.setValue('MirrorSymmetric', self.cbMirrorSymmetric.isChecked()))
+        self.cbMirrorSymmetric.toggled.connect(lambda: self.showCostEstimate())
+        self.gLayoutSettings.addWidget(self.cbMirrorSymmetric, 11, 1, 1, 1)
+        self.pbDefaultMirrorSymmetric = QtWidgets.QPushButton(
+            'On' if DEFAULTS['MirrorSymmetric'] else 'Off', self.mainP2)
+        self.pbDefaultMirrorSymmetric.clicked.connect(
+            lambda: self.cbMirrorSymmetric.setChecked(DEFAULTS['MirrorSymmetric']))
+        self.gLayoutSettings.addWidget(self.pbDefaultMirrorSymmetric, 11, 2, 1, 1)
+
+        self.lblCutTiles = QtWidgets.QLabel('Cut tiles', self.mainP2)
+        self.gLayoutSettings.addWidget(self.lblCutTiles, 12, 0, 1, 1)
+        self.sbCutTiles = QtWidgets.QSpinBox(self.mainP2)
+        self.sbCutTiles.setMinimum(0)
+        self.sbCutTiles.setMaximum(64)
+        self.sbCutTiles.setValue(SETTINGS.value('CutTiles', DEFAULTS['CutTiles'], type=int))
+        self.sbCutTiles.setToolTip('''<html>
+Direct shape generation mode only. Above 1 the plate is split into this many tiles which 
+are cut at the same time by separate FreeCADCmd processes, about one per CPU core is best. 
+0 or 1 cuts the plate in one go.
+        </html>''')
+        self.sbCutTiles.valueChanged.connect(
+            lambda: SETTINGS.setValue('CutTiles', self.sbCutTiles.value()))
+        self.gLayoutSettings.addWidget(self.sbCutTiles, 12, 1, 1, 1)
+        self.pbDefaultCutTiles = QtWidgets.QPushButton(str(DEFAULTS['CutTiles']), self.mainP2)
+        self.pbDefaultCutTiles.clicked.connect(
+            lambda: self.sbCutTiles.setValue(DEFAULTS['CutTiles']))
+        self.gLayoutSettings.addWidget(self.pbDefaultCutTiles, 12, 2, 1, 1)
+
         self.lblSettingsJSON5 = QtWidgets.QLabel('''<html>
 <p>If you're looking to customize the colors used in the JSON input field, 
 please do so in the main window under <div><code>Edit > Preferences > Editor</code>.</div>
@@ -650,17 +795,17 @@ please do so in the main window under <div><code>Edit > Preferences > Editor</co
             self.mainP2
         )
         self.lblSettingsJSON5.setWordWrap(True)
-        self.gLayoutSettings.addWidget(self.lblSettingsJSON5, 8, 0, 1, 1)
+        self.gLayoutSettings.addWidget(self.lblSettingsJSON5, 13, 0, 1, 1)
 
         self.gvSettingsPreview = ResizableGraphicsView(self.mainP2)
         self.gvSettingsPreview.setRenderHint(QtGui.QPainter.Antialiasing)
         self.gvSettingsPreview.setSizePolicy(
             QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Expanding)
-        self.gLayoutSettings.addWidget(self.gvSettingsPreview, 9, 0, 1, 3)
+        self.gLayoutSettings.addWidget(self.gvSettingsPreview, 14, 0, 1, 3)
         self.reloadSettingsPreview()
 
         self.pbResetSettings = QtWidgets.QPushButton('Reset', self.mainP2)
-        self.gLayoutSettings.addWidget(self.pbResetSettings, 10, 0, 1, 3)
+        self.gLayoutSettings.addWidget(self.pbResetSettings, 15, 0, 1, 3)
         self.pbResetSettings.clicked.connect(lambda:(
             SETTINGS.clear(), self.__reloadScenes(), self.__reloadSettingsValues(),
         ))
@@ -1366,6 +1511,7 @@ Settings are automatically and immediately saved to %AppData%/Roaming/FreeCAD/Ke
 
             self.lblStabCount.setText(self.getReportTable('Stabs:', stabReport))
             self.lblKeyCount.setText(self.getReportTable('Keys: ', keyReport))
+            self.showCostEstimate()
         except json.decoder.JSONDecodeError as e:
             self.helpStabAndKeySizes.startRedAlert()
             self.pbOk.setEnabled(False)
@@ -1408,17 +1554,7 @@ Settings are automatically and immediately saved to %AppData%/Roaming/FreeCAD/Ke
         return super().resizeEvent(event)
 
     def addArrayIfNeeded(self, userInputJSON5: str):
-        # The 'Raw data' field on keyboard-layout-generator.com foregoes the keyboard meta field
-        # and skips the 'outer array'. Skipping this outer array means it's not valid JSON(5)
-        # https://github.com/ijprest/keyboard-layout-editor/wiki/Serialized-Data-Format
-        #
-        # Add an entire array if there's none to fix this.
-        userInputEndsOnDoubleSquareBracket = re.search(']\s*,?\s*]\s*\Z', userInputJSON5)
-        if not userInputEndsOnDoubleSquareBracket:
-            # Add some brackets
-            userInputJSON5 = '[' + userInputJSON5 + ']'
-
-        return userInputJSON5
+        return KeyboardQ.AddArrayIfNeeded(userInputJSON5)
 
     def getReportTable(self, thText: str, report: KeyboardQ.UnitDifficultyReport):
         table = '<table border="0" cellpadding="3" cellspacing="1" bgcolor="#cecece"><tr>'\
@@ -1476,21 +1612,183 @@ Settings are automatically and immediately saved to %AppData%/Roaming/FreeCAD/Ke
     def __reloadSettingsValues(self):
         for cpb in [self.cpbKeyCapColor, self.cpbKeyCapSideColor, self.cpbKeyboardPlateColor]:
             cpb.reload()
+        self.cbGenerationMode.setCurrentText(SETTINGS.value('GenerationMode', DEFAULTS['GenerationMode']))
+        self.cbFootprintLibrary.setChecked(
+            SETTINGS.value('FootprintLibrary', DEFAULTS['FootprintLibrary'], type=bool))
+        self.cbPlacementBackend.setCurrentText(SETTINGS.value('PlacementBackend', DEFAULTS['PlacementBackend']))
+        self.cbRigidFootprints.setChecked(
+            SETTINGS.value('RigidFootprints', DEFAULTS['RigidFootprints'], type=bool))
+        self.cbMirrorSymmetric.setChecked(
+            SETTINGS.value('MirrorSymmetric', DEFAULTS['MirrorSymmetric'], type=bool))
+        self.sbCutTiles.setValue(SETTINGS.value('CutTiles', DEFAULTS['CutTiles'], type=int))
 
     def luminance(self, qcolor):
         return qcolor.red() * 0.2126 + qcolor.green() * 0.7152 + qcolor.blue() * 0.0722
 
+    # If the active document is a keyboard generated earlier, asks whether to update it
+    # to the current layout instead of generating a new document. Returns whether it
+    # was updated, None if the user cancelled.
+    def updateActiveDocument(self) -> typing.Optional[bool]:
+        doc = FreeCAD.ActiveDocument
+        if doc is None or FreeCADKeyboard.FreeCADKeyboard.GetGenerationState(doc) is None:
+            return False
+
+        messageBox = QtWidgets.QMessageBox(
+            QtWidgets.QMessageBox.Question, 'Keyboard Generator', self.questionUpdate.format(doc.Label),
+            QtWidgets.QMessageBox.Cancel, self
+        )
+        updateButton = messageBox.addButton('Update existing', QtWidgets.QMessageBox.AcceptRole)
+        newButton = messageBox.addButton('New document', QtWidgets.QMessageBox.AcceptRole)
+        messageBox.setDefaultButton(newButton)
+        messageBox.exec_()
+        if messageBox.clickedButton() == newButton:
+            return False
+        if messageBox.clickedButton() != updateButton:
+            return None
+
+        doc.openTransaction('Update keyboard plate')
+        try:
+            updated = self.freeCADKeyboard.updateDocument(doc)
+        except:
+            doc.abortTransaction()
+            raise
+        if not updated:
+            doc.abortTransaction()
+            return False
+
+        doc.commitTransaction()
+        self.doc = doc
+        return True
+
+    # Takes over the settings and scene of the preview, along with those on the settings page
+    def createFreeCADKeyboard(self) -> FreeCADKeyboard.FreeCADKeyboard:
+        freeCADKeyboard = FreeCADKeyboard.FreeCADKeyboard(self.keyboardQ)
+        freeCADKeyboard.cloneCap = SETTINGS.value('CloneCap', DEFAULTS['CloneCap'], type=int)
+        freeCADKeyboard.generationMode = KeyboardQ.GenerationMode(
+            SETTINGS.value('GenerationMode', DEFAULTS['GenerationMode'])
+        )
+        freeCADKeyboard.placementBackend = KeyboardQ.PlacementBackend(
+            SETTINGS.value('PlacementBackend', DEFAULTS['PlacementBackend'])
+        )
+        freeCADKeyboard.rigidFootprints = SETTINGS.value(
+            'RigidFootprints', DEFAULTS['RigidFootprints'], type=bool
+        )
+        freeCADKeyboard.mirrorSymmetric = SETTINGS.value(
+            'MirrorSymmetric', DEFAULTS['MirrorSymmetric'], type=bool
+        )
+        freeCADKeyboard.cutTiles = SETTINGS.value('CutTiles', DEFAULTS['CutTiles'], type=int)
+        freeCADKeyboard.buildProfilePath = cmdFolder + 'last-build-profile.json'
+        freeCADKeyboard.buildHistoryPath = cmdFolder + 'build-profile-history.json'
+        if SETTINGS.value('FootprintLibrary', DEFAULTS['FootprintLibrary'], type=bool):
+            freeCADKeyboard.footprintLibraryFolder = cmdFolder + 'footprint-library'
+
+        return freeCADKeyboard
+
+    # What pressing Ok would build and how long it'd take, in the status bar. The
+    # details (and faster settings if it's slow) are in its tooltip.
+    # (Re)starts the countdown to updateCostEstimate()
+    def showCostEstimate(self):
+        self.costEstimateTimer.start()
+
+    def updateCostEstimate(self):
+        if self.keyboardQ.scene is None or not self.pbOk.isEnabled():
+            return
+
+        freeCADKeyboard = self.createFreeCADKeyboard()
+        # Reused to estimate the faster settings
+        analysis = None
+        if freeCADKeyboard.generationMode != KeyboardQ.GenerationMode.DIRECT_SHAPE:
+            analysis = freeCADKeyboard.getCostAnalysis()
+        estimate = freeCADKeyboard.estimateCost(analysis)
+        calibrationFactor = CostEstimate.GetCalibrationFactor(
+            freeCADKeyboard.buildHistoryPath, freeCADKeyboard.generationMode
+        )
+        seconds = estimate.getSeconds(calibrationFactor)
+        fasterSettings = CostEstimate.GetFasterSettings(freeCADKeyboard, estimate, analysis)
+
+        message = self.messageSlowEstimate if fasterSettings else self.messageEstimate
+        self.sts.showMessage(message.format(CostEstimate.FormatSeconds(seconds)))
+        self.sts.setToolTip(self.getCostEstimateTable(estimate, fasterSettings))
+
+    def getCostEstimateTable(
+        self, estimate: CostEstimate.CostEstimate, fasterSettings: typing.List[typing.Tuple[str, float]]
+    ) -> str:
+        rows = [
+            ('Sketches', estimate.sketchCount),
+            ('Geometry', estimate.geometryCount),
+            ('Constraints', estimate.constraintCount),
+            ('Clones', estimate.cloneCount),
+            ('Point arrays', estimate.pointArrayCount),
+            ('Link arrays', estimate.linkArrayCount),
+            ('Booleans', estimate.booleanCount),
+            ('Objects in total', estimate.objectCount),
+        ]
+        table = '<table border="0" cellpadding="3" cellspacing="1">'
+        for label, count in rows:
+            table += f'<tr><td>{label}</td><td align="right">{count}</td></tr>'
+        table += '</table>'
+        if fasterSettings:
+            table += '<p>Faster settings (under 🔧 Settings):</p><ul>'
+            for description, seconds in fasterSettings:
+                table += f'<li>{description}, about {CostEstimate.FormatSeconds(seconds)}</li>'
+            table += '</ul>'
+
+        return table
+
+    # Runs the chunks of a build while showing their progress, the GUI is kept
+    # responsive in between. Returns False if it was cancelled, the chunks are closed then.
+    def runChunks(self, chunks) -> bool:
+        progressDialog = QtWidgets.QProgressDialog('Generating keyboard', 'Cancel', 0, 0, self)
+        progressDialog.setWindowTitle('Keyboard Generator')
+        progressDialog.setWindowModality(QtCore.Qt.WindowModal)
+        progressDialog.setMinimumDuration(0)
+        try:
+            for progress in chunks:
+                progressDialog.setLabelText(progress.toString())
+                # Busy indicator for phases that don't count anything
+                progressDialog.setMaximum(progress.total)
+                progressDialog.setValue(progress.done)
+                QtWidgets.QApplication.processEvents()
+                if progressDialog.wasCanceled():
+                    chunks.close()
+                    return False
+        finally:
+            progressDialog.close()
+
+        return True
+
     def createKeyboardSketch(self):
         startTime = time.time()
-        # Create clone of KeyboardQ and make it a FreeCADKeyboard
-        self.freeCADKeyboard = copy.copy(self.keyboardQ)
-        self.freeCADKeyboard.__class__ = FreeCADKeyboard.FreeCADKeyboard
+        self.freeCADKeyboard = self.createFreeCADKeyboard()
+
+        updated = self.updateActiveDocument()
+        if updated is None:
+            return
+        if updated:
+            self.close()
+            FreeCAD.Console.PrintMessage(f"Updated keyboard in: {time.time() - startTime:.2f} seconds\n")
+            return
   
         self.doc = FreeCAD.newDocument()
-        self.body = self.doc.addObject('PartDesign::Body', 'KeyboardPlateBody')
-        FreeCADGui.activeView().setActiveObject('pdbody', self.body)
-        self.freeCADKeyboard.createSketches(self.doc,  self.body)
-        self.doc.recompute(None, True, True)
+        # A single transaction so the whole keyboard can be undone in one step
+        self.doc.openTransaction('Create keyboard plate')
+        try:
+            self.body = None
+            if self.freeCADKeyboard.generationMode != KeyboardQ.GenerationMode.DIRECT_SHAPE:
+                self.body = self.doc.addObject('PartDesign::Body', 'KeyboardPlateBody')
+                FreeCADGui.activeView().setActiveObject('pdbody', self.body)
+            # Recomputes the document once it's done
+            if not self.runChunks(self.freeCADKeyboard.createSketchesInChunks(self.doc, self.body)):
+                # Rolls back everything that was built, the (empty) document isn't kept either
+                self.doc.abortTransaction()
+                FreeCAD.closeDocument(self.doc.Name)
+                self.sts.showMessage(self.messageCancelled)
+                FreeCAD.Console.PrintMessage(self.messageCancelled + '\n')
+                return
+        except:
+            self.doc.abortTransaction()
+            raise
+        self.doc.commitTransaction()
         FreeCADGui.ActiveDocument.ActiveView.fitAll()
         self.close()
 
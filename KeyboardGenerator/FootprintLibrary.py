@@ -0,0 +1,120 @@
+# A document holding the extruded footprints (switch and stabilizer cutouts) for one
+# combination of switch type, stabilizer type, kerf and thickness. Plates link to
+# its extrusions with App::Link rather than sketching and extruding them every time.
+#
+# The file name contains a hash of Key.py (where the footprints are defined) and
+# LIBRARY_VERSION, changing either starts a new library next to the old one. Older
+# versions are never removed, plates generated earlier still link to them.
+import os
+import glob
+import hashlib
+from typing import List
+import FreeCAD
+import Key
+
+# Increase when the way footprints are sketched or extruded changes
+LIBRARY_VERSION = 1
+
+class FootprintLibrary():
+    def __init__(
+        self,
+        folder: str,
+        switchType: Key.SwitchType,
+        stabilizerType: Key.StabilizerType,
+        kerf: float,
+        thickness: float
+    ):
+        self.folder = folder
+        self.switchType = switchType
+        self.stabilizerType = stabilizerType
+        self.kerf = kerf
+        self.thickness = thickness
+        self.doc: FreeCAD.Document = None
+        self.changed = False
+        # Whether open() created the file, and the objects added since the last save
+        self.created = False
+        self.addedObjectNames: List[str] = []
+
+    @staticmethod
+    def GetDefinitionsHash() -> str:
+        with open(Key.__file__, 'rb') as file:
+            keySource = file.read()
+
+        return hashlib.sha1(keySource + str(LIBRARY_VERSION).encode()).hexdigest()[:12]
+
+    # Everything but the hash, shared by all versions of this library
+    def getFileNamePrefix(self) -> str:
+        name = f'footprints_{self.switchType.value}_{self.stabilizerType.value}_{self.kerf:g}_{self.thickness:g}'
+        return ''.join(c if c.isalnum() or c in '._-' else '-' for c in name)
+
+    def getFilePath(self) -> str:
+        fileName = f'{self.getFileNamePrefix()}_{self.GetDefinitionsHash()}.FCStd'
+        return os.path.join(self.folder, fileName)
+
+    # Opens the library, creating it if needed
+    def open(self) -> FreeCAD.Document:
+        filePath = self.getFilePath()
+        for doc in FreeCAD.listDocuments().values():
+            if os.path.normpath(doc.FileName) == os.path.normpath(filePath):
+                self.doc = doc
+                return doc
+
+        if os.path.isfile(filePath):
+            self.doc = FreeCAD.openDocument(filePath, True)
+            return self.doc
+
+        os.makedirs(self.folder, exist_ok=True)
+        outdatedPaths = glob.glob(os.path.join(self.folder, self.getFileNamePrefix() + '_*.FCStd'))
+        if outdatedPaths:
+            FreeCAD.Console.PrintWarning(
+                f"The footprint definitions changed, creating {os.path.basename(filePath)}. "
+                f"Plates generated earlier still link to the {len(outdatedPaths)} older version(s) "
+                f"in {self.folder}, those can be deleted once no plate uses them anymore\n"
+            )
+
+        self.doc = FreeCAD.newDocument('FootprintLibrary', hidden=True)
+        self.doc.saveAs(filePath)
+        self.created = True
+
+        return self.doc
+
+    # The extrusion of the footprint, None if it's not in the library yet
+    def getExtrusion(self, signature: Key.FootprintSignature) -> FreeCAD.DocumentObject:
+        return self.doc.getObject(signature.toDocName() + 'Extrusion')
+
+    # Call after adding footprints to the library document, with the objects added
+    def markChanged(self, *objects: FreeCAD.DocumentObject):
+        self.changed = True
+        self.addedObjectNames += [obj.Name for obj in objects]
+
+    # The plate links to the footprints, they need a shape before its recompute
+    def recompute(self):
+        if self.changed:
+            self.doc.recompute()
+
+    # Writes the added footprints to the file, call once the plate is built
+    def save(self):
+        if self.changed:
+            self.doc.recompute()
+            self.doc.save()
+            self.changed = False
+        self.addedObjectNames = []
+        self.created = False
+
+    # Takes the footprints added since the last save back out, for builds that were
+    # cancelled or failed. If open() created the file it's removed again, no plate
+    # links to it.
+    def discard(self):
+        for name in reversed(self.addedObjectNames):
+            if self.doc.getObject(name) is not None:
+                self.doc.removeObject(name)
+        self.addedObjectNames = []
+        self.changed = False
+
+        if self.created:
+            filePath = self.doc.FileName
+            FreeCAD.closeDocument(self.doc.Name)
+            self.doc = None
+            self.created = False
+            if os.path.isfile(filePath):
+                os.remove(filePath)
@@ -1,7 +1,8 @@
 import math
-from dataclasses import dataclass
+import json
+from dataclasses import dataclass, field, replace
 from enum import Enum
-from typing import List, final, Dict, Tuple
+from typing import List, final, Dict, Tuple, Generator, Optional
 from itertools import groupby
 
 from PySide2 import QtGui, QtCore, QtWidgets
@@ -10,40 +11,121 @@ import Draft
 import FreeCAD
 import Sketcher
 import KeyboardQ
+import BuildProfiler
+import TiledCut
+import FootprintLibrary
+import CostEstimate
 from Sketcher import Constraint
 
 from KeyboardGenerator.KeyboardQ import KbIntermediaryData
 from KeyboardQ import CornerStyle
 import Key
 
-class Orientation(str, Enum):
-    AGNOSTIC = ''
-    VERTICAL = 'Ver'
-    HORIZONTAL = 'Hor'
-        
+Orientation = Key.Orientation
+
+# Key in FreeCAD.Document.Meta of what a document was generated with, see
+# FreeCADKeyboard.updateDocument(). Increase the version when its contents change, or
+# what they refer to (e.g. which footprint is canonical).
+GENERATION_STATE_KEY = 'KeyboardGenerator'
+GENERATION_STATE_VERSION = 2
+
 @dataclass
 class SketchAndExtrude():
     sketch: Sketcher.Sketch = None
     extrude: FreeCAD.DocumentObject = None
 
+# The footprint a key is cut with when footprints congruent under a rotation are
+# deduplicated, see FreeCADKeyboard.getCanonicalFootprint()
+@dataclass
+class CanonicalFootprint():
+    # Footprint signature id (without angle) of the footprint that is sketched
+    signatureId: int = 0
+    # Added to the angle of the key to end up with the same cutout
+    angleOffset: float = 0
+    # 360 divided by the symmetry order, rotating by this leaves the footprint unchanged
+    period: float = 360
+
+# A sketch holding the centre points of one group of keys, anchored to the
+# top left of the keyboard plate.
+@dataclass
+class KeyPositionSketch():
+    sketch: Sketcher.Sketch = None
+    anchorPointId: int = 0
+    # Added in bulk by FreeCADKeyboard.__sketchKeyPositions()
+    keyPoints: List['KeyPoint'] = field(default_factory=list)
+
+# The sketch builders route their Sketcher calls through this to count them.
+# Every call can trigger sketch bookkeeping so geometry and constraints are
+# submitted in bulk per sketch, the counts are printed after generation.
+class SketcherCallCounter():
+    def __init__(self):
+        self.counts: Dict[str, int] = {}
+
+    def count(self, name: str):
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    def addGeometry(self, sketch: Sketcher.Sketch, geometry, construction: bool = False):
+        self.count('addGeometry')
+        return sketch.addGeometry(geometry, construction)
+
+    def addConstraint(self, sketch: Sketcher.Sketch, constraints):
+        self.count('addConstraint')
+        return sketch.addConstraint(constraints)
+
+    def addExternal(self, sketch: Sketcher.Sketch, objectName: str, subElementName: str):
+        self.count('addExternal')
+        return sketch.addExternal(objectName, subElementName)
+
+    def exposeInternalGeometry(self, sketch: Sketcher.Sketch, geoId: int):
+        self.count('exposeInternalGeometry')
+        return sketch.exposeInternalGeometry(geoId)
+
+    def toString(self) -> str:
+        return ', '.join(f'{name}: {count}' for name, count in self.counts.items())
+
 class KeyPoint():
     def __init__(self, id: int, keyNumber: int, baseKey: Key.BaseKey, extVertexId):
         self.id = id
         self.keyNumber = keyNumber
-        key = baseKey.key
         biggestSize = baseKey.getBiggestSize()
         self.baseKey = baseKey
-
-        if key.width > key.height:
-            self.orientation = Orientation.HORIZONTAL
-        elif key.height > key.width:
-            self.orientation = Orientation.VERTICAL
-        else:
-            self.orientation = Orientation.AGNOSTIC
-
+        self.orientation = baseKey.getOrientation()
         self.size = biggestSize
         self.extVertexId = extVertexId
 
+        # Signature ids are what keys get grouped by, with and without the angle
+        self.signatureId = baseKey.getFootprintSignatureId(True)
+        self.baseSignatureId = baseKey.getFootprintSignatureId(False)
+        # Keys with the same (origin, angle) share their rotation
+        self.rotationClusterKey = baseKey.getRotationClusterKey()
+        # Angle the footprint is rotated by, differs from the angle of the key when
+        # its footprint is a rotated version of another one, see canonicalize()
+        self.angle = baseKey.key.rotation_angle
+        # Set for the left half of mirror symmetric layouts, see KeyboardQ.getMirrorSymmetry
+        self.mirrored = False
+        # Where the point is sketched, absolute for GenerationMode.PLACEMENT_ONLY
+        # and relative to the anchor point otherwise
+        self.position: FreeCAD.Vector = None
+        # The key position sketch (row or rotation cluster) this key was sketched in
+        self.positionSketch: Sketcher.Sketch = None
+        # Center of the key in the (y flipped) scene, regardless of the generation mode
+        self.center: QtCore.QPointF = None
+
+    def getSignatureId(self, includeAngle: bool = False) -> int:
+        return self.signatureId if includeAngle else self.baseSignatureId
+
+    # Cut the key with the canonical footprint instead, the angle is normalized to
+    # the symmetry of the footprint so e.g. a 1u key at 90° groups with those at 0°.
+    def canonicalize(self, canonical: CanonicalFootprint):
+        halfPeriod = canonical.period / 2
+        angle = (self.angle + canonical.angleOffset + halfPeriod) % canonical.period - halfPeriod
+        self.angle = round(angle, 6) + 0 # + 0 turns -0.0 into 0.0
+        self.baseSignatureId = canonical.signatureId
+        self.signatureId = replace(Key.FootprintSignature.FromId(canonical.signatureId), angle=self.angle).intern()
+
+    def getSignature(self, includeAngle: bool = False) -> Key.FootprintSignature:
+        return Key.FootprintSignature.FromId(self.getSignatureId(includeAngle))
+
     def toU(self) -> str:        
         return self.baseKey.FloatToU(self.baseKey.getBiggestSize())
     
@@ -53,42 +135,17 @@ class KeyPoint():
         
         return self.toU() + self.orientation
 
-    # Basically this method aims to create a FreeCAD document name friendly version of toLabelName()
-    #
     # The name is unique per 'layout' that needs to be unique. Technically for
     # the default Cherry MX style rotating wouldn't be needed (a rotated square is still square)
     # but its easier to treat it the same as everything else rather than creating exceptions
     #
-    # To figure out what is allowed in FreeCAD document names the FreeCAD wiki comes to the resue:
-    # https://wiki.freecad.org/Object_name
-    # The Name can only include simple alphanumeric characters, and the underscore, [_0-9a-zA-Z]
-    # The Name cannot start with a number; it must start with a letter or the underscore, [_a-zA-Z]
+    # Both names are derived from the keys Key.FootprintSignature, only use them for display
+    # purposes and group by getSignatureId() instead.
     def toDocName(self, includeAngle: bool = False):
-        docName = self.toLabelName(includeAngle)
-        docName = docName.replace('.', '_')
-        docName = docName.replace('°','deg')
-        docName = docName.replace('↻', 'SwitchRotated')
-        docName = docName.replace('⮃', 'StabFlipped')
-
-        return docName
+        return self.getSignature(includeAngle).toDocName()
 
-    # When adding new characters to this string make sure toDocName() reflects the same changes.
     def toLabelName(self, includeAngle: bool = False):
-        fileNamePart = 'k1u'
-        if self.baseKey.shouldBeStabilised():
-            fileNamePart = f's{self.baseKey.getStabSizeU()}'
-            fileNamePart += self.orientation
-
-        if includeAngle and self.baseKey.key.rotation_angle != 0:
-            fileNamePart += '{:g}°'.format(self.baseKey.key.rotation_angle)
-
-        if self.baseKey.rotateSwitch:
-            fileNamePart += '↻'
-
-        if self.baseKey.flipped:
-            fileNamePart += '⮃'
-        
-        return fileNamePart
+        return self.getSignature(includeAngle).toLabelName()
 
 @dataclass 
 class IdAndLineSegment:
@@ -97,29 +154,31 @@ class IdAndLineSegment:
 
 # FreeCAD.Vector is immutable, this class encapsulates it to add functionality.
 # 
-# To get around what I suspect are some slight deviations in numbers caused by
-# rotation calculations rx() and ry() do some rounding to negate this.
+# To get around the slight deviations in numbers caused by rotation calculations
+# the vector is converted to whole micrometres (Key.PointUm) once, all
+# comparisons are done on those integers. rx() and ry() return them in mm.
 class V:
     def __init__(self, vector: FreeCAD.Vector):
         self.vector = vector
+        self.point = Key.PointUm.FromXY(vector.x, vector.y)
 
     def rx(self):
-        return round(self.vector.x, 10)
+        return Key.UmToMm(self.point.x)
 
     def ry(self):
-        return round(self.vector.y, 10)
+        return Key.UmToMm(self.point.y)
 
     def isLeftOf(self, otherVector: 'V') -> bool:
-        return self.rx() < otherVector.rx()
+        return self.point.x < otherVector.point.x
 
     def isAbove(self, otherVector: 'V') -> bool:
-        return self.ry() < otherVector.ry()
+        return self.point.y < otherVector.point.y
 
     def isHorizontalTo(self, otherVector: 'V') -> bool:
-        return self.ry() == otherVector.ry()
+        return self.point.y == otherVector.point.y
 
     def isVerticalTo(self, otherVector: 'V') -> bool:
-        return self.rx() == otherVector.rx()
+        return self.point.x == otherVector.point.x
 
 class VP(V):
     def __init__(self, vector: FreeCAD.Vector, id: int = 0):
@@ -127,7 +186,7 @@ class VP(V):
         self.id = id
 
 # Convenience class for easily placing and constraining lines in a sketch
-# It uses VP class (and thus V parent class) to round the numbers slightly 
+# It uses VP class (and thus V parent class) to snap the numbers to micrometres
 # smoothing out minor inaccuracies caused by calculations.
 class L():
     def __init__(self, line: Part.Line, id):
@@ -144,9 +203,9 @@ class L():
     
     def length(self) -> float:
         if self.isHorizontal():
-            return abs(self.start.rx() - self.end.rx())
+            return Key.UmToMm(abs(self.start.point.x - self.end.point.x))
         else:
-            return abs(self.start.ry() - self.end.ry())
+            return Key.UmToMm(abs(self.start.point.y - self.end.point.y))
         
     def getDistanceXConstraint(self) -> Constraint:
         if self.start.isLeftOf(self.end):
@@ -226,105 +285,926 @@ class KeyDocCollection():
     def getPointArrayName(self) -> str:
         return '{}PointArray'.format(self.__prefix)
 
+# Where a build is at, yielded between the chunks of FreeCADKeyboard.createSketchesInChunks().
+# done and total are keys (or footprints), both 0 for phases that are done in one go.
+@dataclass
+class BuildProgress():
+    phase: str
+    done: int = 0
+    total: int = 0
+
+    def toString(self) -> str:
+        if self.total:
+            return f'{self.phase}: {self.done}/{self.total}'
+
+        return self.phase
+
+# Runs the chunks of a build (see FreeCADKeyboard.createSketchesInChunks()) without
+# stopping in between, returns what the generator returns
+def RunChunks(chunks: Generator[BuildProgress, None, object]):
+    while True:
+        try:
+            next(chunks)
+        except StopIteration as stop:
+            return stop.value
+
+# What FreeCADKeyboard.estimateCost() counts that only depends on the layout, so
+# other settings can be estimated without going through the layout again
+@dataclass
+class CostAnalysis():
+    keyCount: int = 0
+    # The outline sketch and its pad
+    outline: CostEstimate.CostEstimate = field(default_factory=CostEstimate.CostEstimate)
+    # Footprint signature id (without angle), the keys that are sketched using it
+    keyPoints: Dict[int, List[KeyPoint]] = field(default_factory=dict)
+    # The number of keys in every position sketch
+    positionSketchSizes: List[int] = field(default_factory=list)
+    # Footprint signature id (without angle), the lines of every polygon of its sketch
+    footprintLineCounts: Dict[int, List[int]] = field(default_factory=dict)
+    disjointCutouts: bool = False
+
+# Everything FreeCADKeyboard keeps track of while building (or updating) a single
+# document. Created at the start of createSketches() / updateDocument() and dropped
+# once they're done, nothing of one build or its document lingers on into the next.
+@dataclass
+class BuildContext():
+    doc: FreeCAD.Document = None
+    body: FreeCAD.DocumentObject = None
+    profiler: BuildProfiler.BuildProfiler = None
+    sketcherCalls: SketcherCallCounter = field(default_factory=SketcherCallCounter)
+    mirrorSymmetry: KeyboardQ.MirrorSymmetry = None
+    # The plate outline sketch, its pad, the combined cutouts and the cut
+    sketch: Sketcher.Sketch = None
+    kbPad: FreeCAD.DocumentObject = None
+    fusion: FreeCAD.DocumentObject = None
+    cut: FreeCAD.DocumentObject = None
+    disjointCutouts: bool = False
+    keyboardTopLineId: int = 0
+    keyboardLeftLineId: int = 0
+    # Where the anchor point of every position sketch ends up, see __initKeyPositioning()
+    anchorPosition: FreeCAD.Vector = None
+    vertexIdNumberOffset: int = 1
+    # Footprint signature id (without angle), the keys using it
+    keyPoints: Dict[int, List[KeyPoint]] = field(default_factory=dict)
+    # Footprint signature id (without angle), its sketch and extrude
+    keyAndStabBaseDocs: Dict[int, SketchAndExtrude] = field(default_factory=dict)
+    switchesAndStabsToCut: List[FreeCAD.DocumentObject] = field(default_factory=list)
+    # Cutouts of the keys that get mirrored, only used for mirror symmetric layouts
+    mirroredSwitchesAndStabs: List[FreeCAD.DocumentObject] = field(default_factory=list)
+    # KLE row (key.y) or rotation cluster key, KeyPositionSketch
+    keyPositionSketches: Dict[object, KeyPositionSketch] = field(default_factory=dict)
+    # Sketch name, (target sketch name, element name), external geometry id
+    externalGeometryIds: Dict[str, Dict[Tuple[str, str], int]] = field(default_factory=dict)
+    # Object name, (x, y) of the cutouts, used to fuse neighbouring cutouts first
+    cutoutPositions: Dict[str, Tuple[float, float]] = field(default_factory=dict)
+    # Only with a footprint library folder, saved at the end of the build
+    library: FootprintLibrary.FootprintLibrary = None
+    # Rotation per rotation cluster and angle, see Key.KeyReservedSpace.getRotationClusterKey
+    rotationClusterPlacements: Dict[Tuple[Tuple[Key.PointUm, float], float], FreeCAD.Placement] \
+        = field(default_factory=dict)
+    # Footprint signature id (without angle), CanonicalFootprint
+    canonicalFootprints: Dict[int, CanonicalFootprint] = field(default_factory=dict)
+    # Footprint signature id (without angle) of canonical footprints, their edges
+    canonicalFootprintEdges: Dict[int, Key.EdgesUm] = field(default_factory=dict)
+    # Footprint signature id (without angle) of canonical footprints, a key with that footprint
+    canonicalFootprintKeys: Dict[int, Key.BaseKey] = field(default_factory=dict)
+    # Footprint signature id (without angle), link array. PlacementBackend.LINK_ARRAY only
+    linkArrays: Dict[int, FreeCAD.DocumentObject] = field(default_factory=dict)
+    # Keys that have a clone, point array or link array element so far
+    placedKeyCount: int = 0
+
 class FreeCADKeyboard(KeyboardQ.KeyboardQ):
-    switchesAndStabsToCut = []
-    keyPoints: List[KeyPoint] = []
-    keyboardStabPositionSketches = {}#: dict[str, Sketcher.Sketch] = {}
+    # Share the footprint between keys whose footprints are the same apart from a
+    # rotation by a multiple of 90° (e.g. a flipped stabilizer is the unflipped one
+    # rotated by 180°), see getCanonicalFootprint()
+    dedupFootprints = True
+    # Max number of cutouts fused by a single Part::MultiFuse in the fuse tree, 0 fuses
+    # all of them in one flat MultiFuse. Smaller leaves mean smaller booleans but more
+    # fuse objects, at 8 there are about a third as many fuses as cutouts.
+    # CommandLine.py --compare-fusion times a layout with several leaf sizes.
+    fuseTreeLeafSize = 8
+    # GenerationMode.DIRECT_SHAPE only, above 1 the plate is cut in this many tiles
+    # by parallel FreeCADCmd processes (see TiledCut). Optionally checked against
+    # the result of cutting it in one go.
+    cutTiles = 0
+    verifyTiledCut = False
+    # Folder of the footprint libraries (see FootprintLibrary), if set the footprints are
+    # linked to from there instead of being sketched and extruded in every plate.
+    footprintLibraryFolder: str = None
+    # Lock every footprint line with a single Block constraint instead of the
+    # Horizontal/Vertical, distance and Coincident constraints, see addQPolysToSketch()
+    rigidFootprints = False
+    # Cross check every tracked external id with findIdForExternalGeometry
+    verifyExternalGeometryIds = False
+    # Keys handled per chunk by createSketchesInChunks(), the key positions and clones
+    # are the only phases whose length grows with the number of keys
+    chunkKeyCount = 25
+    # Have BuildProfiler solve every new sketch once more to time the solver, that
+    # is a whole extra solver pass so it's only meant for profiling (e.g. CommandLine.py)
+    measureSolverTime = False
+    # Where to write the JSON report of BuildProfiler, not written if None
+    buildProfilePath: str = None
+    # The totals of every build are added to this file, see CostEstimate
+    buildHistoryPath: str = None
+    # The finished plate once createSketches() is done
+    plate: FreeCAD.DocumentObject = None
+    # Only set while building, see BuildContext
+    context: 'BuildContext' = None
 
     # Qt uses the Cartesian coordinate system, FreeCAD does not adjust all.
     freecadTransform = QtGui.QTransform()
     freecadTransform.scale(1, -1)
+
+    # Takes over the settings and scene of keyboardQ (after its getScene() was called)
+    def __init__(self, keyboardQ: KeyboardQ.KeyboardQ = None):
+        super().__init__()
+        if keyboardQ is not None:
+            self.__dict__.update(keyboardQ.__dict__)
     
     def createSketches(self, doc: FreeCAD.Document, body):
-        self.doc = doc
-        self.body = body
-
-        self.sketch = self.doc.addObject('Sketcher::SketchObject', 'KeyboardPlateSketch')
+        RunChunks(self.createSketchesInChunks(doc, body))
+
+    # Same as createSketches() but split into chunks, a BuildProgress is yielded after
+    # every one of them so the caller can update the GUI in between. Closing the
+    # generator stops the build, whatever was added to doc is left for the caller to
+    # remove (e.g. by aborting the transaction it was built in).
+    def createSketchesInChunks(self, doc: FreeCAD.Document, body) -> Generator[BuildProgress, None, None]:
+        self.context = BuildContext(doc, body)
+        try:
+            yield from self.__createSketches()
+        except BaseException:
+            # Cancelled (GeneratorExit) or failed, the footprints added to the library are taken out again
+            if self.context.library:
+                self.context.library.discard()
+            raise
+        finally:
+            # Let go of the document and everything that was built
+            self.context = None
+
+    def __createSketches(self):
+        self.context.mirrorSymmetry = self.getUsedMirrorSymmetry()
+
+        # Document recomputes are frozen while building, the build order and expressions
+        # take care of the dependencies. Objects that a later step needs the shape of
+        # (for addExternal) are recomputed on their own. There's one recompute at the end.
+        self.context.doc.RecomputesFrozen = True
+        profiler = self.context.profiler = BuildProfiler.BuildProfiler(self.context.doc, self.measureSolverTime)
+        try:
+            if self.generationMode == KeyboardQ.GenerationMode.DIRECT_SHAPE:
+                yield from self.__generateDirectShape()
+            else:
+                yield from self.__generateParametric()
+                self.__storeGenerationState()
+            profiler.stop()
+        finally:
+            self.context.doc.RecomputesFrozen = False
+
+        yield self.__startPhase('Final recompute')
+        self.context.doc.recompute(None, True, True)
+        if self.context.library:
+            self.context.library.save()
+        profiler.stop()
+
+        FreeCAD.Console.PrintMessage(f"Sketcher calls: {self.context.sketcherCalls.toString()}\n")
+        profiler.printToConsole()
+        if self.buildProfilePath:
+            profiler.writeJSON(self.buildProfilePath, self.getBuildProfileLayoutInfo())
+        if self.buildHistoryPath:
+            profiler.appendToHistory(self.buildHistoryPath, self.getBuildProfileLayoutInfo())
+
+    # GenerationMode.DIRECT_SHAPE cuts every key on its own, it has no use for the symmetry
+    def getUsedMirrorSymmetry(self) -> KeyboardQ.MirrorSymmetry:
+        if not self.mirrorSymmetric or self.generationMode == KeyboardQ.GenerationMode.DIRECT_SHAPE:
+            return None
+
+        return self.getMirrorSymmetry()
+
+    # Sketches, pads, extrudes, clones and point arrays. Fully parametric (apart from
+    # GenerationMode.PLACEMENT_ONLY which leaves out the key position constraints).
+    def __generateParametric(self):
+        yield self.__startPhase('Outline sketch')
+        self.context.sketch = self.context.doc.addObject('Sketcher::SketchObject', 'KeyboardPlateSketch')
         self.__sketchKeyboardCase()
-        self.pad = self.__createPlatePad(self.sketch, self.thickness)
-
-        self.doc.recompute() # KeyPosMasterSketch references self.sketch, recompute needed.
-        self.__generateKeyPosMasterSketch()
-        self.keyPoints = self.__addAndSortKeysAndStabs()
-        self.__generateKeyAndStabSketches()  # Populates #self.keyAndStabBaseDocs
+        self.__createPlatePad(self.context.sketch, self.thickness)
+        self.context.sketch.recompute() # The key position sketches reference self.context.sketch.
+
+        yield self.__startPhase('Key positions')
+        self.__initKeyPositioning()
+        self.context.keyPoints = yield from self.__addAndSortKeysAndStabs()
+        if self.generationMode == KeyboardQ.GenerationMode.CONSTRAINED:
+            # Point array position sketches reference the key position sketches
+            for keyPosSketch in self.context.keyPositionSketches.values():
+                keyPosSketch.sketch.recompute()
+
+        yield self.__startPhase('Footprint sketches')
+        yield from self.__generateKeyAndStabSketches()  # Populates #self.context.keyAndStabBaseDocs
+        yield self.__startPhase('Extrudes')
         self.__generateKeyAndStabExtrudes()
-        self.doc.recompute() 
-        self.__generateClonesAndPointArrays() # Clones and point array reference other files, recompute needed
+        yield self.__startPhase('Clones and point arrays')
+        yield from self.__generateClonesAndPointArrays()
+        yield self.__startPhase('Fusion')
         self.__generateFusion()
+        yield self.__startPhase('Cut')
         self.__generateCut()
 
+    # Starts profiling the next phase, yielded before it's run
+    def __startPhase(self, name: str, total: int = 0) -> BuildProgress:
+        self.context.profiler.start(name)
+        return BuildProgress(name, 0, total)
+
+    # Yielded after a chunk of the current phase
+    def __getProgress(self, done: int, total: int) -> BuildProgress:
+        return BuildProgress(self.context.profiler.current.name, done, total)
+
+    # Only link arrays can be updated in place, they're the only objects whose
+    # placements aren't tied to position sketches by expressions.
+    def supportsIncrementalUpdates(self) -> bool:
+        return self.generationMode != KeyboardQ.GenerationMode.DIRECT_SHAPE \
+            and self.placementBackend == KeyboardQ.PlacementBackend.LINK_ARRAY \
+            and self.context.mirrorSymmetry is None
+
+    # Everything but the key positions, a document has to have been generated
+    # with the same settings (and plate outline) to be updated.
+    def getGenerationSettings(self) -> dict:
+        kbData = self.getKbIntermediaryData()
+        return {
+            'switchType': self.switchType.value,
+            'stabilizerType': self.stabilizerType.value,
+            'kerf': self.kerf,
+            'thickness': self.thickness,
+            'flipStabilizers': self.flipStabilizers,
+            'rotateSwitch': self.rotateSwitch,
+            'dedupFootprints': self.dedupFootprints,
+            'generationMode': self.generationMode.value,
+            'placementBackend': self.placementBackend.value,
+            'footprintLibraryFolder': self.footprintLibraryFolder,
+            'outline': [
+                [Key.PointUm.FromQPointF(border.p1()), Key.PointUm.FromQPointF(border.p2())]
+                for border in kbData.getBorders()
+            ],
+            'corners': [
+                [kbCorner.style.name, kbCorner.radiusX, kbCorner.radiusY]
+                for kbCorner in [getattr(self, corner) for corner in KeyboardQ.Corner.Corners()]
+            ],
+        }
+
+    @staticmethod
+    def GetGenerationState(doc: FreeCAD.Document) -> dict:
+        state = doc.Meta.get(GENERATION_STATE_KEY)
+        return json.loads(state) if state else None
+
+    # Stores what's needed to find the objects of every footprint back. Keys aren't
+    # stored, those are matched with the link array elements by position on update.
+    def __storeGenerationState(self):
+        if not self.supportsIncrementalUpdates():
+            return
+
+        state = {
+            'version': GENERATION_STATE_VERSION,
+            'settings': self.getGenerationSettings(),
+            'disjointCutouts': self.context.disjointCutouts,
+            'cutouts': self.context.fusion.Name,
+            'positionSketches': [keyPosSketch.sketch.Name for keyPosSketch in self.context.keyPositionSketches.values()],
+            'footprints': {
+                Key.FootprintSignature.FromId(signatureId).toDocName(): {
+                    'linkArray': linkArray.Name,
+                    'extrude': self.context.keyAndStabBaseDocs[signatureId].extrude.Name,
+                    'sketch': getattr(self.context.keyAndStabBaseDocs[signatureId].sketch, 'Name', None),
+                } for signatureId, linkArray in self.context.linkArrays.items()
+            },
+        }
+        meta = self.context.doc.Meta
+        meta[GENERATION_STATE_KEY] = json.dumps(state)
+        self.context.doc.Meta = meta
+
+    # Why doc (generated by createSketches()) can't be updated to the current layout,
+    # None if it can.
+    def getReasonUpdateIsImpossible(self, doc: FreeCAD.Document, state: dict) -> str:
+        if state is None:
+            return "it wasn't generated by this macro"
+        if state['version'] != GENERATION_STATE_VERSION:
+            return 'it was generated by a different version of this macro'
+        if not self.supportsIncrementalUpdates():
+            return 'only link arrays of layouts without mirror symmetry can be updated'
+
+        settings = json.dumps(self.getGenerationSettings(), sort_keys=True)
+        if settings != json.dumps(state['settings'], sort_keys=True):
+            return 'the settings or the outline of the plate changed'
+
+        if state['disjointCutouts'] and self.cutoutsOverlap():
+            return 'cutouts that used to be apart overlap now'
+
+        docNames = {
+            Key.FootprintSignature.FromId(self.getFootprintSignatureId(keyReservedSpaceGi.data(0))).toDocName()
+            for keyReservedSpaceGi in self.getKeyReservedSpaceGis()
+        }
+        if docNames != set(state['footprints']) and not state['disjointCutouts']:
+            return 'footprints were added or removed and the cutouts are fused'
+
+        objectNames = [state['cutouts']] + state['positionSketches'] + [
+            name for names in state['footprints'].values() for name in names.values() if name
+        ]
+        if any(doc.getObject(name) is None for name in objectNames + ['KeyboardPlateSketch']):
+            return 'objects it needs were deleted'
+
+        return None
+
+    # Updates a document generated before to the current layout rather than generating
+    # a new one. Only the link array elements of keys that were added, moved or removed
+    # change, footprints that are new or no longer used get their objects added/removed.
+    #
+    # Returns False without touching the document if it can't be updated, see
+    # getReasonUpdateIsImpossible().
+    def updateDocument(self, doc: FreeCAD.Document) -> bool:
+        self.context = BuildContext(doc, doc.getObject('KeyboardPlateBody'))
+        try:
+            return self.__updateDocument(doc)
+        finally:
+            self.context = None
+
+    def __updateDocument(self, doc: FreeCAD.Document) -> bool:
+        self.context.mirrorSymmetry = self.getUsedMirrorSymmetry()
+        state = self.GetGenerationState(doc)
+        reason = self.getReasonUpdateIsImpossible(doc, state)
+        if reason:
+            FreeCAD.Console.PrintMessage(f"Not updating {doc.Label}, {reason}\n")
+            return False
+
+        self.context.sketch = doc.getObject('KeyboardPlateSketch')
+        self.context.fusion = doc.getObject(state['cutouts'])
+        self.context.disjointCutouts = state['disjointCutouts']
+
+        self.context.doc.RecomputesFrozen = True
+        profiler = self.context.profiler = BuildProfiler.BuildProfiler(self.context.doc, self.measureSolverTime)
+        try:
+            profiler.start('Key positions')
+            # Cheap to sketch again, nothing references them when using link arrays
+            for name in state['positionSketches']:
+                self.context.doc.removeObject(name)
+            self.__initKeyPositioning()
+            self.context.keyPoints = RunChunks(self.__addAndSortKeysAndStabs())
+
+            profiler.start('Link arrays')
+            self.__updateLinkArrays(state['footprints'])
+            self.__storeGenerationState()
+            profiler.stop()
+        finally:
+            self.context.doc.RecomputesFrozen = False
+
+        profiler.start('Final recompute')
+        self.context.doc.recompute(None, True, True)
+        profiler.stop()
+        profiler.printToConsole()
+
+        return True
+
+    def __updateLinkArrays(self, footprints: Dict[str, Dict[str, str]]):
+        allKeyPoints = self.context.keyPoints
+        newKeyPoints = {
+            signatureId: keyPointList for signatureId, keyPointList in allKeyPoints.items()
+            if Key.FootprintSignature.FromId(signatureId).toDocName() not in footprints
+        }
+        # Footprints that weren't used before, sketched and extruded like in createSketches()
+        self.context.keyPoints = newKeyPoints
+        self.context.keyAndStabBaseDocs = {}
+        if newKeyPoints:
+            RunChunks(self.__generateKeyAndStabSketches())
+            self.__generateKeyAndStabExtrudes()
+        self.context.keyPoints = allKeyPoints
+
+        movedCount = addedCount = removedCount = 0
+        usedDocNames = set()
+        for signatureId, keyPointList in allKeyPoints.items():
+            if signatureId in newKeyPoints:
+                addedCount += len(keyPointList)
+                continue
+
+            docName = Key.FootprintSignature.FromId(signatureId).toDocName()
+            usedDocNames.add(docName)
+            names = footprints[docName]
+            linkArray = self.context.doc.getObject(names['linkArray'])
+            self.context.linkArrays[signatureId] = linkArray
+            self.context.keyAndStabBaseDocs[signatureId] = SketchAndExtrude(
+                self.context.doc.getObject(names['sketch']) if names['sketch'] else None,
+                self.context.doc.getObject(names['extrude'])
+            )
+
+            # Every key keeps the element of the key nearest to it, see MatchElements()
+            placements = [self.getElementPlacement(keyPoint) for keyPoint in keyPointList]
+            oldPlacements = linkArray.PlacementList
+            matches = self.MatchElements(oldPlacements, placements)
+            moved = sum(
+                1 for placement, oldIndex in zip(placements, matches)
+                if oldIndex is not None and not oldPlacements[oldIndex].isSame(placement, 1e-7)
+            )
+            added = matches.count(None)
+            removed = len(oldPlacements) - (len(matches) - added)
+            movedCount += moved
+            addedCount += added
+            removedCount += removed
+            if moved or added or removed:
+                placementList = self.GetUpdatedPlacementList(len(oldPlacements), placements, matches)
+                linkArray.ElementCount = len(placementList)
+                linkArray.PlacementList = placementList
+                linkArray.Label = f"{self.keyPointsToRangeString(keyPointList)} {keyPointList[0].toLabelName()}LinkArray"
+
+        newCutouts = []
+        self.__generateLinkArraysFor(
+            [keyPoint for keyPointList in newKeyPoints.values() for keyPoint in keyPointList], newCutouts
+        )
+
+        unusedFootprints = [names for docName, names in footprints.items() if docName not in usedDocNames]
+        unusedNames = [name for names in unusedFootprints for name in names.values() if name]
+        for names in unusedFootprints:
+            removedCount += len(self.context.doc.getObject(names['linkArray']).PlacementList)
+
+        # Only disjoint cutouts get here with added or removed footprints, see getReasonUpdateIsImpossible()
+        if newCutouts or unusedFootprints:
+            self.context.fusion.Links = [
+                cutout for cutout in self.context.fusion.Links if cutout.Name not in unusedNames
+            ] + newCutouts
+        for names in unusedFootprints:
+            for name in [names['linkArray'], names['extrude'], names['sketch']]:
+                if name:
+                    self.context.doc.removeObject(name)
+
+        FreeCAD.Console.PrintMessage(
+            f"Updated {self.context.doc.Label}: {addedCount} keys added, {movedCount} moved, {removedCount} removed\n"
+        )
+
+    # For every placement the index of the old placement (link array element) it takes
+    # over, None for keys that were added. Keys that didn't move take their own element,
+    # the others that of the nearest old key that's left within a unit (further away it's
+    # a key that was removed and another that was added). Inserting or removing a key
+    # doesn't shift the elements of the keys after it.
+    @staticmethod
+    def MatchElements(oldPlacements: List[FreeCAD.Placement], placements: List[FreeCAD.Placement]) -> List[Optional[int]]:
+        matches: List[Optional[int]] = [None] * len(placements)
+        unmatchedOld = set(range(len(oldPlacements)))
+        oldByPosition: Dict[Tuple[float, float], List[int]] = {}
+        for oldIndex, oldPlacement in enumerate(oldPlacements):
+            oldByPosition.setdefault((round(oldPlacement.Base.x, 4), round(oldPlacement.Base.y, 4)), []).append(oldIndex)
+        for index, placement in enumerate(placements):
+            candidates = oldByPosition.get((round(placement.Base.x, 4), round(placement.Base.y, 4)), [])
+            oldIndex = next((i for i in candidates if i in unmatchedOld and oldPlacements[i].isSame(placement, 1e-7)), None)
+            if oldIndex is not None:
+                matches[index] = oldIndex
+                unmatchedOld.remove(oldIndex)
+
+        # Moved keys, closest pairs first
+        pairs = sorted(
+            pair for pair in (
+                ((oldPlacements[oldIndex].Base - placements[index].Base).Length, index, oldIndex)
+                for index in range(len(placements)) if matches[index] is None for oldIndex in unmatchedOld
+            ) if pair[0] <= Key.KeyReservedSpace.ONE_U
+        )
+        for _, index, oldIndex in pairs:
+            if matches[index] is None and oldIndex in unmatchedOld:
+                matches[index] = oldIndex
+                unmatchedOld.remove(oldIndex)
+
+        return matches
+
+    # The placement list of a link array that had oldCount elements, with the matches of
+    # MatchElements(). Added keys fill the elements of removed ones before being appended,
+    # elements that are left over are filled with the last ones.
+    @staticmethod
+    def GetUpdatedPlacementList(
+        oldCount: int, placements: List[FreeCAD.Placement], matches: List[Optional[int]]
+    ) -> List[FreeCAD.Placement]:
+        placementList: List[Optional[FreeCAD.Placement]] = [None] * oldCount
+        added = []
+        for placement, oldIndex in zip(placements, matches):
+            if oldIndex is None:
+                added.append(placement)
+            else:
+                placementList[oldIndex] = placement
+
+        for index in range(oldCount):
+            if placementList[index] is None and added:
+                placementList[index] = added.pop(0)
+        placementList += added
+
+        while None in placementList:
+            last = placementList.pop()
+            if last is not None:
+                placementList[placementList.index(None)] = last
+
+        return placementList
+
+    # Stored in the build profile to tell apart which layout and settings it was for
+    def getBuildProfileLayoutInfo(self) -> dict:
+        layoutInfo = {
+            'keyCount': len(self.getKeyReservedSpaceGis()),
+            'generationMode': self.generationMode.value,
+        }
+        if self.generationMode == KeyboardQ.GenerationMode.DIRECT_SHAPE:
+            layoutInfo['cutTiles'] = self.cutTiles
+        if self.generationMode != KeyboardQ.GenerationMode.DIRECT_SHAPE:
+            layoutInfo.update({
+                'footprintLibrary': bool(self.footprintLibraryFolder),
+                'sketchedKeyCount': sum(len(keyPointList) for keyPointList in self.context.keyPoints.values()),
+                'footprintCount': len(self.context.keyAndStabBaseDocs),
+                'positionSketchCount': len(self.context.keyPositionSketches),
+                'mirrored': self.context.mirrorSymmetry is not None,
+                'cloneCap': self.cloneCap,
+                'placementBackend': self.placementBackend.value,
+                'rigidFootprints': self.rigidFootprints,
+                'dedupFootprints': self.dedupFootprints,
+            })
+
+        return layoutInfo
+
+    # What createSketches() would build, counted without building anything. Goes through
+    # the same grouping: position sketches per row and rotation cluster, (canonical)
+    # footprints, clones or point arrays depending on cloneCap, link arrays and the
+    # compound or fuse tree. The outline sketch is counted give or take a constraint.
+    #
+    # Only objects createSketches() adds are counted, not the body it's passed, same
+    # as BuildProfiler does. Pass the analysis of getCostAnalysis() to estimate the
+    # same layout with different settings without analysing it again.
+    def estimateCost(self, analysis: CostAnalysis = None) -> CostEstimate.CostEstimate:
+        if self.generationMode == KeyboardQ.GenerationMode.DIRECT_SHAPE:
+            keyCount = analysis.keyCount if analysis else len(self.getKeyReservedSpaceGis())
+            return CostEstimate.CostEstimate(keyCount=keyCount, objectCount=1, booleanCount=1)
+
+        analysis = analysis or self.getCostAnalysis()
+        estimate = replace(analysis.outline, keyCount=analysis.keyCount)
+        self.__estimateParametricCost(estimate, analysis)
+
+        return estimate
+
+    # The parts of estimateCost() that only depend on the layout, mirrorSymmetric and
+    # dedupFootprints. Built in a context of its own, a build that's going on keeps its context.
+    def getCostAnalysis(self) -> CostAnalysis:
+        analysis = CostAnalysis(keyCount=len(self.getKeyReservedSpaceGis()))
+        # Any of the parametric modes, DIRECT_SHAPE has no use for the analysis
+        mirrorSymmetry = self.getMirrorSymmetry() if self.mirrorSymmetric else None
+        buildContext = self.context
+        self.context = BuildContext(mirrorSymmetry=mirrorSymmetry)
+        try:
+            self.__estimateOutlineCost(analysis.outline)
+
+            keyReservedSpaceGis = self.getKeyReservedSpaceGis()
+            mirroredCount = 0
+            if mirrorSymmetry:
+                mirroredCount = len(mirrorSymmetry.leftHalf)
+                keyReservedSpaceGis = mirrorSymmetry.leftHalf + mirrorSymmetry.onAxis
+
+            # Row or rotation cluster, the number of keys in its position sketch
+            positionSketchSizes: Dict[object, int] = {}
+            for index, keyReservedSpaceGi in enumerate(keyReservedSpaceGis):
+                baseKey = keyReservedSpaceGi.data(0)
+                keyPoint = KeyPoint(None, index + 1, baseKey, None)
+                if self.dedupFootprints:
+                    keyPoint.canonicalize(self.getCanonicalFootprint(baseKey))
+                keyPoint.mirrored = index < mirroredCount
+                self.addToKeyPointList(analysis.keyPoints, keyPoint)
+                groupKey, _ = self.getKeyPosSketchGroup(baseKey)
+                positionSketchSizes[groupKey] = positionSketchSizes.get(groupKey, 0) + 1
+            analysis.positionSketchSizes = list(positionSketchSizes.values())
+
+            analysis.footprintLineCounts = {
+                signatureId: self.getFootprintLineCounts(self.getFootprintKey(signatureId, keyPointList))
+                for signatureId, keyPointList in analysis.keyPoints.items()
+            }
+            analysis.disjointCutouts = not self.cutoutsOverlap()
+        finally:
+            self.context = buildContext
+
+        return analysis
+
+    def __estimateParametricCost(self, estimate: CostEstimate.CostEstimate, analysis: CostAnalysis):
+        constrained = self.generationMode == KeyboardQ.GenerationMode.CONSTRAINED
+        for keyCount in analysis.positionSketchSizes:
+            estimate.sketchCount += 1
+            estimate.objectCount += 1
+            estimate.geometryCount += 1 + keyCount
+            estimate.constraintCount += 2 + (2 * keyCount if constrained else 0)
+
+        for lineCounts in analysis.footprintLineCounts.values():
+            if self.footprintLibraryFolder:
+                estimate.objectCount += 1 # The link, the library is assumed to have the footprint
+                continue
+            lineCount, constraintCount = self.getFootprintSketchSize(lineCounts)
+            estimate.sketchCount += 1
+            estimate.objectCount += 2 # Sketch and extrusion
+            estimate.geometryCount += lineCount
+            estimate.constraintCount += constraintCount
+
+        flattenedKeyPoints = [keyPoint for keyPointList in analysis.keyPoints.values() for keyPoint in keyPointList]
+        mirroredCutoutCount = self.__estimatePlacementCost(
+            estimate, [keyPoint for keyPoint in flattenedKeyPoints if keyPoint.mirrored]
+        )
+        cutoutCount = self.__estimatePlacementCost(
+            estimate, [keyPoint for keyPoint in flattenedKeyPoints if not keyPoint.mirrored]
+        )
+
+        if mirroredCutoutCount:
+            if mirroredCutoutCount > 1:
+                self.__estimateCombinedCutoutsCost(estimate, mirroredCutoutCount, analysis.disjointCutouts)
+            estimate.objectCount += 1 # Part::Mirroring
+            cutoutCount += 2
+        self.__estimateCombinedCutoutsCost(estimate, cutoutCount, analysis.disjointCutouts)
+        estimate.objectCount += 1 # Part::Cut
+        estimate.booleanCount += 1
+
+    # The outline sketch and its pad, see __sketchKeyboardCase(). The body they're in is
+    # added before createSketches() is called.
+    def __estimateOutlineCost(self, estimate: CostEstimate.CostEstimate):
+        kbData = self.getKbIntermediaryData()
+        borderCount = len(kbData.getBorders())
+        estimate.sketchCount += 1
+        estimate.objectCount += 2
+        estimate.geometryCount += borderCount
+        estimate.constraintCount += 2 * borderCount
+        for corner in KeyboardQ.Corner.Corners():
+            kbCorner: KeyboardQ.KbCorner = getattr(self, corner)
+            rect: QtCore.QRectF = kbData.getCornerRect(corner)
+            if kbCorner.style == KeyboardQ.CornerStyle.ROUNDED:
+                # Ellipses get their axes and foci exposed and two constraints more
+                isCircle = rect.width() == rect.height()
+                estimate.geometryCount += 1 if isCircle else 5
+                estimate.constraintCount += 6 if isCircle else 8
+            elif kbCorner.style == KeyboardQ.CornerStyle.ANGLED:
+                estimate.geometryCount += 4
+                estimate.constraintCount += 10
+            else:
+                estimate.constraintCount += 1
+
+    # Returns the number of objects the keys end up as, see __generateClonesAndPointArraysFor()
+    def __estimatePlacementCost(self, estimate: CostEstimate.CostEstimate, keyPoints: List[KeyPoint]) -> int:
+        if self.placementBackend == KeyboardQ.PlacementBackend.LINK_ARRAY:
+            linkArrayCount = len({keyPoint.baseSignatureId for keyPoint in keyPoints})
+            estimate.linkArrayCount += linkArrayCount
+            estimate.objectCount += linkArrayCount
+            return linkArrayCount
+
+        fullySortedKeyPoints: Dict[int, List[KeyPoint]] = {}
+        for keyPoint in keyPoints:
+            self.addToKeyPointList(fullySortedKeyPoints, keyPoint, True)
+
+        cutoutCount = 0
+        for signatureId, keyPointList in fullySortedKeyPoints.items():
+            if len(keyPointList) > self.cloneCap:
+                # The positions sketch and the point array
+                estimate.sketchCount += 1
+                estimate.pointArrayCount += 1
+                estimate.objectCount += 2
+                estimate.geometryCount += len(keyPointList)
+                if self.generationMode == KeyboardQ.GenerationMode.CONSTRAINED:
+                    estimate.constraintCount += len(keyPointList)
+                if signatureId != keyPointList[0].baseSignatureId:
+                    # The rotated footprint that's arrayed
+                    estimate.cloneCount += 1
+                    estimate.objectCount += 1
+                cutoutCount += 1
+            else:
+                estimate.cloneCount += len(keyPointList)
+                estimate.objectCount += len(keyPointList)
+                cutoutCount += len(keyPointList)
+
+        return cutoutCount
+
+    def __estimateCombinedCutoutsCost(self, estimate: CostEstimate.CostEstimate, cutoutCount: int, disjoint: bool):
+        if disjoint:
+            estimate.objectCount += 1 # Part::Compound
+            return
+
+        fuseCount = self.getFuseTreeSize(cutoutCount)
+        estimate.objectCount += fuseCount
+        estimate.booleanCount += fuseCount
+
+    # No sketches, clones, point arrays or expressions. The plate and all cutouts are
+    # built as faces, cut in one (2D) boolean and extruded once into a single Part::Feature.
+    def __generateDirectShape(self):
+        yield self.__startPhase('Outline face')
+        plateFace, anchorPosition = self.getPlateFace()
+
+        keyReservedSpaceGis = self.getKeyReservedSpaceGis()
+        yield self.__startPhase('Cutout faces', len(keyReservedSpaceGis))
+        cutoutFaces = []
+        for index, keyReservedSpaceGi in enumerate(keyReservedSpaceGis):
+            cutoutFaces += self.getCutoutFaces(keyReservedSpaceGi, anchorPosition)
+            if (index + 1) % self.chunkKeyCount == 0:
+                yield self.__getProgress(index + 1, len(keyReservedSpaceGis))
+
+        yield self.__startPhase('Cut and extrude')
+        self.context.disjointCutouts = not self.cutoutsOverlap()
+        disjoint = self.context.disjointCutouts
+        if self.cutTiles > 1:
+            plateShape = TiledCut.CutParallel(
+                plateFace, cutoutFaces, self.thickness, self.cutTiles, disjoint=disjoint
+            )
+            if self.verifyTiledCut:
+                TiledCut.CompareWithSerial(plateShape, plateFace, cutoutFaces, self.thickness, disjoint)
+        else:
+            plateShape = TiledCut.CutSerial(plateFace, cutoutFaces, self.thickness, disjoint)
+        self.plate = self.context.doc.addObject('Part::Feature', 'KeyboardPlate')
+        self.plate.Shape = plateShape
+
+    # The faces GenerationMode.DIRECT_SHAPE cuts, the plate and all cutouts
+    def getDirectShapeFaces(self) -> Tuple[Part.Face, List[Part.Face]]:
+        plateFace, anchorPosition = self.getPlateFace()
+        cutoutFaces = [
+            cutoutFace for keyReservedSpaceGi in self.getKeyReservedSpaceGis()
+            for cutoutFace in self.getCutoutFaces(keyReservedSpaceGi, anchorPosition)
+        ]
+
+        return plateFace, cutoutFaces
+
+    # The plate outline as a face, along with the spot the anchor point of the
+    # position sketches ends up at (the cutouts are placed relative to it)
+    def getPlateFace(self) -> Tuple[Part.Face, QtCore.QPointF]:
+        kbData = self.getKbIntermediaryData()
+        plateFace = Part.Face(Part.Wire(Part.__sortEdges__(self.getPlateOutlineEdges(kbData))))
+        anchorPosition = QtCore.QPointF(kbData.leftBorder.p1().x(), kbData.topBorder.p2().y())
+
+        return plateFace, anchorPosition
+
+    def getCutoutFaces(
+        self, keyReservedSpaceGi: KeyboardQ.KeyReservedSpaceGi, anchorPosition: QtCore.QPointF
+    ) -> List[Part.Face]:
+        cutoutFaces = []
+        for polygon in keyReservedSpaceGi.getSceneCutoutPolygons():
+            polygon = Key.SimplifyPolygon(self.freecadTransform.map(polygon))
+            polygon.translate(anchorPosition)
+            cutoutFaces.append(Part.Face(Part.makePolygon([point.toFv() for point in polygon])))
+
+        return cutoutFaces
+
+    # The outline of the plate as edges, the same geometry __sketchKeyboardCase()
+    # sketches but without any constraints.
+    def getPlateOutlineEdges(self, kbData: KbIntermediaryData) -> List[Part.Edge]:
+        edges = [Part.LineSegment(border.p1().toFv(), border.p2().toFv()).toShape() for border in kbData.getBorders()]
+        for corner in KeyboardQ.Corner.Corners():
+            cornerGeometry = self.getCornerGeometry(kbData, corner)
+            if cornerGeometry is not None:
+                edges.append(cornerGeometry.toShape())
+
+        return edges
+
+    # The line of an angled corner or the arc of a rounded one. None for right
+    # angled corners, the borders meet there.
+    def getCornerGeometry(self, kbData: KbIntermediaryData, corner: KeyboardQ.Corner) -> Part.Geometry:
+        kbCorner: KeyboardQ.KbCorner = getattr(self, corner)
+        rect: QtCore.QRectF = kbData.getCornerRect(corner)
+        if kbCorner.style == KeyboardQ.CornerStyle.ANGLED:
+            cornerLine = kbData.getCornerLine(corner)
+            return Part.LineSegment(cornerLine.p1().toFv(), cornerLine.p2().toFv())
+        elif kbCorner.style != KeyboardQ.CornerStyle.ROUNDED:
+            return None
+
+        if rect.width() == rect.height():
+            circle = Part.Circle(rect.center().toFv(), FreeCAD.Vector(0, 0, 1), rect.width()/2)
+            return Part.ArcOfCircle(circle, kbData.getAngleAsRad(corner, 0), kbData.getAngleAsRad(corner, 90))
+        elif rect.width() >= rect.height():
+            ellipse = Part.Ellipse(rect.center().toFv(), rect.width()/2, rect.height()/2)
+            return Part.ArcOfEllipse(ellipse, kbData.getAngleAsRad(corner, 0), kbData.getAngleAsRad(corner, 90))
+
+        ellipse = Part.Ellipse(rect.center().toFv(), rect.width()/2, rect.height()/2)
+        ellipse.AngleXU = math.radians(90)
+        return Part.ArcOfEllipse(ellipse, kbData.getAngleAsRad(corner, -90), kbData.getAngleAsRad(corner, 0))
+
     # Any errors like:
-    # kbStabPosSketch.addExternal(self.sketch.Name, keyPoint.extVertexId)
+    # kbStabPosSketch.addExternal(self.context.sketch.Name, keyPoint.extVertexId)
     #  ValueError: Not able to add external shape element
     # likely mean that vertexIdNumberOffset has been set incorrectly here.
-    def __generateKeyPosMasterSketch(self):
-        self.keyPosMasterSketch = self.doc.addObject('Sketcher::SketchObject', 'KeyPosMasterSketch')
+    def __generateKeyPosSketch(self, name: str) -> KeyPositionSketch:
+        keyPosSketch = self.context.doc.addObject('Sketcher::SketchObject', name)
         # First add external will be the id -3 by convention
-        self.keyPosMasterSketch.addExternal(self.sketch.Name, 'Vertex2') # Top border, left Vertex
-        topExternalPointId = -3
+        self.addExternal(keyPosSketch, self.context.sketch, 'Vertex2') # Top border, left Vertex
 
         # Second add external will be the id -4
-        self.keyPosMasterSketch.addExternal(self.sketch.Name, 'Vertex3') # Left border, top vertex
-        leftExternalPointId = -4
+        self.addExternal(keyPosSketch, self.context.sketch, 'Vertex3') # Left border, top vertex
 
         # Create a point every key position will be constrained to, this is the most top left
         # point of the keyboard plate. If the top left corner is rounded/angled it will fall
         # outside the plate itself.
-        self.anchorPointId = self.keyPosMasterSketch.addGeometry(Part.Point(FreeCAD.Vector()))
-        anchorConstraints = [
-            Constraint('Horizontal', topExternalPointId, 1, self.anchorPointId, 1),
-            Constraint('Vertical', leftExternalPointId, 1, self.anchorPointId, 1),
-        ]
-        self.keyPosMasterSketch.addConstraint(anchorConstraints)
+        anchorPointId = self.context.sketcherCalls.addGeometry(keyPosSketch, Part.Point(FreeCAD.Vector()))
+        # The constraints for the anchor point are added along with those of the keys
+
+        return KeyPositionSketch(keyPosSketch, anchorPointId)
+
+    # Key positions are split over several small sketches rather than one big one,
+    # every KLE row and every rotation cluster gets its own sketch. Each is solved
+    # on its own and editing one only re-solves that sketch.
+    def __getKeyPosSketch(self, baseKey: Key.KeyReservedSpace) -> KeyPositionSketch:
+        groupKey, name = self.getKeyPosSketchGroup(baseKey)
+        if groupKey not in self.context.keyPositionSketches:
+            self.context.keyPositionSketches[groupKey] = self.__generateKeyPosSketch(name)
+
+        return self.context.keyPositionSketches[groupKey]
+
+    # The KLE row or rotation cluster, along with the name of its position sketch
+    def getKeyPosSketchGroup(self, baseKey: Key.KeyReservedSpace) -> Tuple[object, str]:
+        if baseKey.isRotated():
+            return baseKey.getRotationClusterKey(), 'KeyPosClusterSketch'
+
+        return baseKey.key.y, 'KeyPosRowSketch'
+
+    def __initKeyPositioning(self):
+        self.context.keyPositionSketches = {}
+        # Where the anchor point of every position sketch ends up, Vertex2 and Vertex3
+        # have their final positions as the plate sketch was already recomputed.
+        plateVertexes = self.context.sketch.Shape.Vertexes
+        self.context.anchorPosition = FreeCAD.Vector(plateVertexes[2].X, plateVertexes[1].Y, 0)
 
-        # Other sketches will reference self.keyPosMasterSketch and need to know the external vertex id.
+        # Other sketches will reference the position sketches and need to know the external vertex id.
         # As there doesn't seem to a way to query the sketch directly to get the external id for a given
         # ID it seems like this needs to be tracked manually.
-        self.vertexIdNumberOffset = 1
+        self.context.vertexIdNumberOffset = 1
 
     def __addAndSortKeysAndStabs(self):
         keyReservedSpaceGis = self.getKeyReservedSpaceGis()
-        # str = stabSize (or 1 for everything under the minimum stab size)
-        keyPoints: Dict[str, List[KeyPoint]] = {}
+        mirroredGis = []
+        if self.context.mirrorSymmetry:
+            # The right half is never sketched, it'll be a mirror of the left half
+            mirroredGis = self.context.mirrorSymmetry.leftHalf
+            keyReservedSpaceGis = self.context.mirrorSymmetry.leftHalf + self.context.mirrorSymmetry.onAxis
+
+        # int = footprint signature id (without angle)
+        keyPoints: Dict[int, List[KeyPoint]] = {}
         for index, keyReservedSpaceGi in enumerate(keyReservedSpaceGis):
-            vertexId = f"Vertex{index + self.vertexIdNumberOffset}"
-            keyPoint = self.__sketchKeyMidPoint(keyReservedSpaceGi, vertexId)
+            keyPoint = self.__sketchKeyMidPoint(keyReservedSpaceGi, index + 1)
+            keyPoint.mirrored = index < len(mirroredGis)
             self.addToKeyPointList(keyPoints, keyPoint)
+            if (index + 1) % self.chunkKeyCount == 0:
+                yield self.__getProgress(index + 1, len(keyReservedSpaceGis))
+        self.__sketchKeyPositions()
 
         return keyPoints
     
     
-    def __sketchKeyMidPoint(self, keyReservedSpace: KeyboardQ.KeyReservedSpaceGi, extVertexId: str) -> KeyPoint:
+    def __sketchKeyMidPoint(self, keyReservedSpace: KeyboardQ.KeyReservedSpaceGi, keyNumber: int) -> KeyPoint:
         bbox = keyReservedSpace.sceneBoundingRect()
         bbox = self.freecadTransform.mapRect(bbox)
         center: QtCore.QPointF = bbox.center()
 
-        keyCenterPointId = self.keyPosMasterSketch.addGeometry(Part.Point(center.toFv()))
-        self.keyPosMasterSketch.toggleConstruction(keyCenterPointId)
-        self.keyPosMasterSketch.addConstraint(Constraint(
-            'DistanceX', self.anchorPointId, 1, keyCenterPointId, 2, center.x()
-        ))
-        self.keyPosMasterSketch.addConstraint(Constraint(
-            'DistanceY', self.anchorPointId, 2, keyCenterPointId, 1, center.y()
-        ))
+        placementOnly = self.generationMode == KeyboardQ.GenerationMode.PLACEMENT_ONLY
+        position = self.context.anchorPosition + center.toFv() if placementOnly else center.toFv()
+
+        keyPosSketch = self.__getKeyPosSketch(keyReservedSpace.data(0))
+        extVertexId = f"Vertex{len(keyPosSketch.keyPoints) + self.context.vertexIdNumberOffset}"
         
+        # The id is set once the point is actually sketched, see __sketchKeyPositions()
         keyPoint = KeyPoint(
-            keyCenterPointId,
-            keyCenterPointId,
+            None,
+            keyNumber,
             keyReservedSpace.data(0),
             extVertexId
         )
-        self.keyPoints.append(keyPoint)
+        keyPoint.position = position
+        keyPoint.center = center
+        if self.dedupFootprints:
+            keyPoint.canonicalize(self.getCanonicalFootprint(keyPoint.baseKey))
+        keyPoint.positionSketch = keyPosSketch.sketch
+        keyPosSketch.keyPoints.append(keyPoint)
 
         return keyPoint
+
+    # Adds the points (and constraints) of all keys to the position sketches, one
+    # bulk addGeometry and addConstraint call per sketch.
+    def __sketchKeyPositions(self):
+        placementOnly = self.generationMode == KeyboardQ.GenerationMode.PLACEMENT_ONLY
+        for keyPosSketch in self.context.keyPositionSketches.values():
+            sketch = keyPosSketch.sketch
+            anchorPointId = keyPosSketch.anchorPointId
+            keyCenterPointIds = self.context.sketcherCalls.addGeometry(
+                sketch, [Part.Point(keyPoint.position) for keyPoint in keyPosSketch.keyPoints], True
+            )
+
+            externalIds = self.context.externalGeometryIds[sketch.Name]
+            topExternalPointId = externalIds[(self.context.sketch.Name, 'Vertex2')]
+            leftExternalPointId = externalIds[(self.context.sketch.Name, 'Vertex3')]
+            constraints = [
+                Constraint('Horizontal', topExternalPointId, 1, anchorPointId, 1),
+                Constraint('Vertical', leftExternalPointId, 1, anchorPointId, 1),
+            ]
+            for keyPoint, keyCenterPointId in zip(keyPosSketch.keyPoints, keyCenterPointIds):
+                keyPoint.id = keyCenterPointId
+                if not placementOnly:
+                    constraints += [
+                        Constraint('DistanceX', anchorPointId, 1, keyCenterPointId, 2, keyPoint.position.x),
+                        Constraint('DistanceY', anchorPointId, 2, keyCenterPointId, 1, keyPoint.position.y),
+                    ]
+            self.context.sketcherCalls.addConstraint(sketch, constraints)
     
     
-    def __generateKeyPositionSketch(self, idStr: str, keyPointList: List[KeyPoint]) -> Sketcher.Sketch:
-        kbStabPosSketch = self.doc.addObject(
+    def __generateKeyPositionSketch(self, signature: Key.FootprintSignature, keyPointList: List[KeyPoint]) -> Sketcher.Sketch:
+        kbStabPosSketch = self.context.doc.addObject(
             'Sketcher::SketchObject', 
-            idStr+"PositionsSketch"
+            signature.toDocName()+"PositionsSketch"
         )
+        kbStabPosSketch.Label = signature.toLabelName()+"PositionsSketch"
+
+        if self.generationMode == KeyboardQ.GenerationMode.PLACEMENT_ONLY:
+            self.context.sketcherCalls.addGeometry(
+                kbStabPosSketch, [Part.Point(keyPoint.position) for keyPoint in keyPointList], True
+            )
+            return kbStabPosSketch
 
+        extRefIds = []
         for keyPoint in keyPointList:
             # If this line is throwing errors, check what the lowest ID of the most
             # bottom right Point in the first position sketch is (likely k1uPositionsSketch)
@@ -333,14 +1213,48 @@ class FreeCADKeyboard(KeyboardQ.KeyboardQ):
             #
             # That's where this script creates the external vertex id hoping to reflect 
             # FreeCADs internal bookkeeping as I couldn't find any way to obtain it through the FreeCAD API.
-            kbStabPosSketch.addExternal(self.keyPosMasterSketch.Name, keyPoint.extVertexId)
-            extRefId = self.findIdForExternalGeometry(kbStabPosSketch, self.keyPosMasterSketch, keyPoint.extVertexId)
-            stabPointId = kbStabPosSketch.addGeometry(Part.Point(FreeCAD.Vector(20, 20)))
-            kbStabPosSketch.toggleConstruction(stabPointId)
-            kbStabPosSketch.addConstraint(Constraint('Coincident', stabPointId, 1, extRefId, 1))
+            # There's no bulk variant of addExternal
+            extRefIds.append(
+                self.addExternal(kbStabPosSketch, keyPoint.positionSketch, keyPoint.extVertexId)
+            )
+
+        stabPointIds = self.context.sketcherCalls.addGeometry(
+            kbStabPosSketch, [Part.Point(FreeCAD.Vector(20, 20)) for _ in keyPointList], True
+        )
+        self.context.sketcherCalls.addConstraint(kbStabPosSketch, [
+            Constraint('Coincident', stabPointId, 1, extRefId, 1)
+            for stabPointId, extRefId in zip(stabPointIds, extRefIds)
+        ])
 
         return kbStabPosSketch
     
+    # Adds the external geometry and returns its id. The ids are tracked per sketch
+    # (starting at -3 and counting down) rather than looked up with
+    # findIdForExternalGeometry, which scans all external geometry of the sketch.
+    #
+    # Adding the same element twice returns the id it got the first time, it's not
+    # added again. Every element in externalIds is then one external geometry of the sketch.
+    def addExternal(self, sketch: Sketcher.Sketch, targetSketch: Sketcher.Sketch, targetName: str) -> int:
+        externalIds = self.context.externalGeometryIds.setdefault(sketch.Name, {})
+        if (targetSketch.Name, targetName) in externalIds:
+            return externalIds[(targetSketch.Name, targetName)]
+
+        self.context.sketcherCalls.addExternal(sketch, targetSketch.Name, targetName)
+        externalId = -3 - len(externalIds)
+        externalIds[(targetSketch.Name, targetName)] = externalId
+
+        if self.verifyExternalGeometryIds:
+            foundId = self.findIdForExternalGeometry(sketch, targetSketch, targetName)
+            if foundId != externalId:
+                FreeCAD.Console.PrintError(
+                    f"{sketch.Name}: external id {externalId} for {targetSketch.Name}.{targetName}"
+                    f" doesn't match FreeCADs {foundId}\n"
+                )
+                externalIds[(targetSketch.Name, targetName)] = foundId
+                return foundId
+
+        return externalId
+
     # Big thanks to edwilliams16 on the FreeCAD forums
     # https://forum.freecad.org/viewtopic.php?t=76421#post_content663962
     def findIdForExternalGeometry(
@@ -361,107 +1275,103 @@ class FreeCADKeyboard(KeyboardQ.KeyboardQ):
         
         return None
 
+    # The borders and corners are added in a single addGeometry call, the construction
+    # geometry of angled corners in a second one and all constraints in a single
+    # addConstraint call. Only the axes of elliptic corners are exposed one by one,
+    # there's no bulk variant of exposeInternalGeometry.
     def __sketchKeyboardCase(self):
-        def toLineSegment(self) -> Part.LineSegment:
-            return Part.LineSegment(self.p1().toFv(), self.p2().toFv())
-        QtCore.QLineF.toLineSegment = toLineSegment
-
+        sketch = self.context.sketch
         kbData = self.getKbIntermediaryData()
+        corners = KeyboardQ.Corner.Corners()
 
-        borderIdAndLines: List[IdAndLineSegment] = []
-        for border in kbData.getBorders():
-            borderLine = border.toLineSegment()
-            id = self.sketch.addGeometry(borderLine)
-            borderIdAndLines.append(IdAndLineSegment(id, borderLine))
-        self.keyboardTopLineId = borderIdAndLines[0].id
-        self.keyboardLeftLineId = borderIdAndLines[1].id
+        # The borders are 0 to 3 (top, left, bottom, right), followed by the corners
+        geometry: List[Part.Geometry] = [
+            Part.LineSegment(border.p1().toFv(), border.p2().toFv()) for border in kbData.getBorders()
+        ]
+        borderCount = len(geometry)
+        cornerIds: Dict[KeyboardQ.Corner, int] = {}
+        for corner in corners:
+            cornerGeometry = self.getCornerGeometry(kbData, corner)
+            if cornerGeometry is not None:
+                cornerIds[corner] = len(geometry)
+                geometry.append(cornerGeometry)
+        self.context.keyboardTopLineId = 0
+        self.context.keyboardLeftLineId = 1
 
         skipLastTwoDistanceConstraints = self.topRight.style == KeyboardQ.CornerStyle.RIGHT
+        constructionGeometry: List[Part.Geometry] = []
+        constraints: List[Constraint] = []
+        # Id and rect of the elliptic corners, their axes are constrained once exposed
+        ellipticCorners: List[Tuple[int, QtCore.QRectF]] = []
+        for i, corner in enumerate(corners):
+            beforeLineId = i
+            afterLineId = (i + 1) % borderCount
+            lastCorner = corner == KeyboardQ.Corner.TOPRIGHT
+            kbCorner: KeyboardQ.KbCorner = getattr(self, corner)
+            rect: QtCore.QRectF = kbData.getCornerRect(corner)
 
-        cornerLineIds = []
-        for i, (corner, border) in enumerate(zip(KeyboardQ.Corner.Corners(), borderIdAndLines)):
-            beforeLineId = border.id
-            nextI = i+1 if i+1 < len(borderIdAndLines) else 0
-            afterLineId = borderIdAndLines[nextI].id
+            if corner not in cornerIds: # No corner just constraint the borders
+                constraints.append(Constraint('Coincident', beforeLineId, 2, afterLineId, 1))
+            else:
+                cornerId = cornerIds[corner]
+                constraints += [
+                    Constraint('Coincident', beforeLineId, 2, cornerId, 1),
+                    Constraint('Coincident', afterLineId, 1, cornerId, 2),
+                ]
 
-            kbCorner: KeyboardQ.KbCorner = getattr(self, corner)
             if kbCorner.style == KeyboardQ.CornerStyle.ROUNDED:
-                cornerLineIds.append(
-                    self.addRoundedCorner(kbData, corner, beforeLineId, afterLineId)
-                )
+                # Circle self imposes constraints that are needed for the ellipse
+                constraints += self.getArcConstraints(geometry[cornerId], cornerId, lastCorner)
+                if rect.width() != rect.height():
+                    ellipticCorners.append((cornerId, rect))
             elif kbCorner.style == KeyboardQ.CornerStyle.ANGLED:
-                cornerLineIds.append(
-                    self.addAngledCorner(kbData, corner, beforeLineId, afterLineId)
-                )
-            else: # No corner just constraint the borders
-                self.sketch.addConstraint(Constraint('Coincident', beforeLineId, 2, afterLineId, 1))
-
-            self.addLineConstraints(afterLineId, skipLastTwoDistanceConstraints and i >= 2)
-            
-    def addRoundedCorner(
-        self, 
-        kbData: KbIntermediaryData, 
-        corner: KeyboardQ.Corner,
-        beforeLineId: int,
-        afterLineId: int,
-    ):
-        rect: QtCore.QRectF = kbData.getCornerRect(corner)
-        halfWidth = rect.width()/2
-        halfHeight = rect.height()/2
-        lastCorner = corner == KeyboardQ.Corner.TOPRIGHT
+                # A point in the center of the corner rect with a line to the end of either border
+                cornerPointId = borderCount + len(cornerIds) + len(constructionGeometry)
+                constructionGeometry.append(Part.Point(rect.center().toFv()))
+                for lineId, pointPos in [(beforeLineId, 2), (afterLineId, 1)]:
+                    border: Part.LineSegment = geometry[lineId]
+                    cornerDistanceLine = Part.LineSegment(
+                        rect.center().toFv(), border.EndPoint if pointPos == 2 else border.StartPoint
+                    )
+                    cornerDistanceLineId = borderCount + len(cornerIds) + len(constructionGeometry)
+                    constructionGeometry.append(cornerDistanceLine)
+                    constraints += self.getLineConstraints(cornerDistanceLine, cornerDistanceLineId, lastCorner)
+                    constraints += [
+                        Constraint('Coincident', cornerPointId, 1, cornerDistanceLineId, 1),
+                        Constraint('Coincident', lineId, pointPos, cornerDistanceLineId, 2),
+                    ]
+
+            constraints += self.getLineConstraints(
+                geometry[afterLineId], afterLineId, skipLastTwoDistanceConstraints and i >= 2
+            )
 
-        if rect.width() == rect.height():
-            circle = Part.Circle(rect.center().toFv(), FreeCAD.Vector(0, 0, 1), halfWidth)
-            cornerLineId = self.sketch.addGeometry(Part.ArcOfCircle(
-                circle, kbData.getAngleAsRad(corner, 0), kbData.getAngleAsRad(corner, 90)
-            ))
-            # Circle self imposes constraints that are needed for the elipse
-        elif rect.width() >= rect.height():
-            ellipse = Part.Ellipse(rect.center().toFv(), halfWidth, halfHeight)
-            cornerLineId = self.sketch.addGeometry(Part.ArcOfEllipse(
-                ellipse, kbData.getAngleAsRad(corner, 0), kbData.getAngleAsRad(corner, 90)
-            ))
-            self.sketch.exposeInternalGeometry(cornerLineId)
-            hLineId = cornerLineId+1
-            vLineId = cornerLineId+2
-            #if not lastCorner:
-            self.sketch.addConstraint(Constraint('DistanceY', vLineId, 2, vLineId, 1, rect.height()))
-            self.sketch.addConstraint(Constraint('Horizontal', hLineId))
-        else:
-            aRect = rect.transposed()
-            ellipse = Part.Ellipse(rect.center().toFv(), halfWidth, halfHeight)
-            ellipse.AngleXU = math.radians(90)
-            cornerLineId = self.sketch.addGeometry(Part.ArcOfEllipse(
-                ellipse, kbData.getAngleAsRad(corner, -90), kbData.getAngleAsRad(corner, 0)
-            ))            
-            self.sketch.exposeInternalGeometry(cornerLineId)            
-            vLineId = cornerLineId+1
-            hLineId = cornerLineId+2
-            self.sketch.addConstraint(Constraint('DistanceY', vLineId, 2, vLineId, 1, aRect.width()))
-            self.sketch.addConstraint(Constraint('Vertical', vLineId))
-
-        self.sketch.addConstraint(Constraint('Coincident', beforeLineId, 2, cornerLineId, 1))
-        self.sketch.addConstraint(Constraint('Coincident', afterLineId, 1, cornerLineId, 2))
-        self.addArcConstraints(cornerLineId, lastCorner)
-        
+        self.context.sketcherCalls.addGeometry(sketch, geometry)
+        if constructionGeometry:
+            self.context.sketcherCalls.addGeometry(sketch, constructionGeometry, True)
+        for cornerId, rect in ellipticCorners:
+            # The major axis is exposed first, then the minor axis and the foci
+            majorAxisId = sketch.GeometryCount
+            self.context.sketcherCalls.exposeInternalGeometry(sketch, cornerId)
+            if rect.width() > rect.height():
+                vLineId = majorAxisId + 1
+                constraints.append(Constraint('Horizontal', majorAxisId))
+            else:
+                vLineId = majorAxisId
+                constraints.append(Constraint('Vertical', majorAxisId))
+            constraints.append(Constraint('DistanceY', vLineId, 2, vLineId, 1, rect.height()))
+        self.context.sketcherCalls.addConstraint(sketch, constraints)
 
-        return cornerLineId
-        
-    def addLineConstraints(self, lineId: int, skipDistance: bool = False):
-        line: Part.LineSegment = self.sketch.Geometry[lineId]
+    def getLineConstraints(self, line: Part.LineSegment, lineId: int, skipDistance: bool = False) -> List[Constraint]:
         l = L(line, lineId)
         if skipDistance:
-            self.sketch.addConstraint(l.getDirectionalConstraint())
-        else:
-            self.sketch.addConstraint(l.getConstraints())
-        
+            return [l.getDirectionalConstraint()]
 
-    def addArcConstraints(self, geoId: int, lastCorner: bool):
-        aoe: Part.ArcOfEllipse = self.sketch.Geometry[geoId]
+        return l.getConstraints()
 
-        startOfArc = VP(aoe.StartPoint, 1)
-        endOfArc = VP(aoe.EndPoint, 2)
-        center = VP(aoe.Location, 3)
+    def getArcConstraints(self, arc: Part.ArcOfEllipse, geoId: int, lastCorner: bool) -> List[Constraint]:
+        startOfArc = VP(arc.StartPoint, 1)
+        endOfArc = VP(arc.EndPoint, 2)
+        center = VP(arc.Location, 3)
 
         constraints = []
         for arcPoint in [endOfArc, startOfArc]:
@@ -474,37 +1384,7 @@ class FreeCADKeyboard(KeyboardQ.KeyboardQ):
             if arcPoint.isVerticalTo(center):
                 constraints.append(Constraint('Vertical', geoId, center.id, geoId, arcPoint.id))
 
-        self.sketch.addConstraint(constraints)
-
-    def addAngledCorner(
-        self,
-        kbData: KbIntermediaryData,
-        corner: KeyboardQ.Corner,
-        beforeLineId: int,
-        afterLineId: int,
-    ):
-        cornerLine = kbData.getCornerLine(corner)
-        lineSegment = Part.LineSegment(cornerLine.p1().toFv(), cornerLine.p2().toFv())
-        lineId = self.sketch.addGeometry(lineSegment)
-        self.sketch.addConstraint(Constraint('Coincident', beforeLineId, 2, lineId, 1))
-        self.sketch.addConstraint(Constraint('Coincident', afterLineId, 1, lineId, 2))
-        
-        rect: QtCore.QRectF = kbData.getCornerRect(corner)
-        lastCorner = corner == KeyboardQ.Corner.TOPRIGHT
-        cornerPoint = Part.Point(rect.center().toFv())
-        cornerPointId = self.sketch.addGeometry(cornerPoint, True)
-
-        cornerDistanceLine1 = Part.LineSegment(rect.center().toFv(), self.sketch.Geometry[beforeLineId].EndPoint)
-        cornerDistanceLineId1 = self.sketch.addGeometry(cornerDistanceLine1, True)
-        self.addLineConstraints(cornerDistanceLineId1, lastCorner)
-        self.sketch.addConstraint(Constraint('Coincident', cornerPointId, 1, cornerDistanceLineId1, 1))
-        self.sketch.addConstraint(Constraint('Coincident', beforeLineId, 2, cornerDistanceLineId1, 2))
-        
-        cornerDistanceLine2 = Part.LineSegment(rect.center().toFv(), self.sketch.Geometry[afterLineId].StartPoint)
-        cornerDistanceLineId2 = self.sketch.addGeometry(cornerDistanceLine2, True)
-        self.addLineConstraints(cornerDistanceLineId2, lastCorner)
-        self.sketch.addConstraint(Constraint('Coincident', cornerPointId, 1, cornerDistanceLineId2, 1))
-        self.sketch.addConstraint(Constraint('Coincident', afterLineId, 1, cornerDistanceLineId2, 2))
+        return constraints
 
     def getKbIntermediaryData(self) -> KbIntermediaryData:
         roundedRect = super().getKbIntermediaryData()
@@ -520,15 +1400,92 @@ class FreeCADKeyboard(KeyboardQ.KeyboardQ):
         return roundedRect
 
     def __generateCut(self):
-        self.cut = self.doc.addObject('Part::Cut', 'KbSwitchStabCutouts')
-        self.cut.Base = self.kbPad
-        self.cut.Tool = self.fusion
-        #self.cut.ViewObject.ShapeColor = 
+        self.context.cut = self.context.doc.addObject('Part::Cut', 'KbSwitchStabCutouts')
+        self.context.cut.Base = self.context.kbPad
+        self.context.cut.Tool = self.context.fusion
+        self.plate = self.context.cut
+        #self.context.cut.ViewObject.ShapeColor = 
     
-    # Fuse all keys and stabs together into one shape
+    # Combine all keys and stabs into the one shape that gets cut out of the plate
     def __generateFusion(self):
-        self.fusion = self.doc.addObject('Part::MultiFuse', 'KbPlateCutouts')
-        self.fusion.Shapes = self.switchesAndStabsToCut
+        # Fusing is the most expensive boolean, cutting a compound gives the
+        # same result as long as none of the cutouts overlap.
+        self.context.disjointCutouts = not self.cutoutsOverlap()
+        if self.context.mirrorSymmetry:
+            self.__generateMirroredHalf()
+
+        self.context.fusion = self.__combineCutouts(self.context.switchesAndStabsToCut, 'KbPlateCutouts')
+
+    # A Part::Compound of the cutouts if they're disjoint, fused otherwise
+    def __combineCutouts(self, cutouts: List[FreeCAD.DocumentObject], name: str) -> FreeCAD.DocumentObject:
+        if self.context.disjointCutouts:
+            combined = self.context.doc.addObject('Part::Compound', name)
+            combined.Links = cutouts
+        else:
+            combined = self.__generateFuseTree(cutouts, name)
+
+        return combined
+
+    # Number of Part::MultiFuse objects __generateFuseTree() creates for this many cutouts
+    def getFuseTreeSize(self, cutoutCount: int) -> int:
+        if not self.fuseTreeLeafSize or cutoutCount <= self.fuseTreeLeafSize:
+            return 1
+
+        half = cutoutCount // 2
+        return 1 + self.getFuseTreeSize(half) + self.getFuseTreeSize(cutoutCount - half)
+
+    # Fuses the cutouts in a balanced tree rather than in a single MultiFuse. The cutouts
+    # are split at the median of the widest axis until no more than fuseTreeLeafSize are
+    # left, so each fuse only works on a few neighbouring cutouts. Every branch is its
+    # own object, a change only recomputes the branches leading up to it.
+    def __generateFuseTree(self, cutouts: List[FreeCAD.DocumentObject], name: str) -> FreeCAD.DocumentObject:
+        fusion = self.context.doc.addObject('Part::MultiFuse', name)
+        if not self.fuseTreeLeafSize or len(cutouts) <= self.fuseTreeLeafSize:
+            fusion.Shapes = cutouts
+            return fusion
+
+        positions = [self.context.cutoutPositions[cutout.Name] for cutout in cutouts]
+        width = max(x for x, _ in positions) - min(x for x, _ in positions)
+        height = max(y for _, y in positions) - min(y for _, y in positions)
+        axis = 0 if width >= height else 1
+        sortedCutouts = sorted(cutouts, key=lambda cutout: self.context.cutoutPositions[cutout.Name][axis])
+
+        half = len(sortedCutouts) // 2
+        branches = [
+            self.__generateFuseTree(sortedCutouts[:half], 'KbPlateCutoutsBranch'),
+            self.__generateFuseTree(sortedCutouts[half:], 'KbPlateCutoutsBranch'),
+        ]
+        for branch in branches:
+            branch.Visibility = False
+        fusion.Shapes = branches
+
+        return fusion
+
+    # Combines the left half of a mirror symmetric layout and mirrors it across
+    # the layouts vertical axis, both halves are then cut like any other key.
+    def __generateMirroredHalf(self):
+        halfFusion = self.context.mirroredSwitchesAndStabs[0]
+        if len(self.context.mirroredSwitchesAndStabs) > 1:
+            halfFusion = self.__combineCutouts(self.context.mirroredSwitchesAndStabs, 'KbPlateCutoutsHalf')
+
+        mirror = self.context.doc.addObject('Part::Mirroring', 'KbPlateCutoutsMirrored')
+        mirror.Source = halfFusion
+        mirror.Normal = FreeCAD.Vector(1, 0, 0)
+        # Key positions are relative to the anchor point, so is the axis. Every
+        # position sketch has the same anchor, any will do.
+        keyPosSketch: KeyPositionSketch = next(iter(self.context.keyPositionSketches.values()))
+        mirror.setExpression(
+            '.Base.x',
+            f'{keyPosSketch.sketch.Name}.Geometry[{keyPosSketch.anchorPointId}].X + {self.context.mirrorSymmetry.axisX}'
+        )
+        halfFusion.Visibility = False
+
+        halfX, halfY = self.getAveragePosition(
+            [self.context.cutoutPositions[cutout.Name] for cutout in self.context.mirroredSwitchesAndStabs]
+        )
+        self.context.cutoutPositions[halfFusion.Name] = (halfX, halfY)
+        self.context.cutoutPositions[mirror.Name] = (2 * self.context.mirrorSymmetry.axisX - halfX, halfY)
+        self.context.switchesAndStabsToCut.extend([halfFusion, mirror])
 
     def __generatePointArray(self, base: FreeCAD.DocumentObject, positionsSketch: Sketcher.Sketch):
         return Draft.make_point_array(base, positionsSketch)
@@ -539,50 +1496,183 @@ class FreeCADKeyboard(KeyboardQ.KeyboardQ):
     #
     # This means sketches can have simple constraints as things aren't angled in the sketch itself.
     def __generateKeyAndStabSketches(self):
+        if self.footprintLibraryFolder:
+            yield from self.__linkKeyAndStabFootprints()
+            return
+
+        # Footprint signature id (without angle), Sketch
+        keyAndStabBaseDocs: Dict[int, SketchAndExtrude] = {}
+
+        for index, (signatureId, listOfKeyPoints) in enumerate(self.context.keyPoints.items()):
+            signature = Key.FootprintSignature.FromId(signatureId)
+            footprintKey = self.getFootprintKey(signatureId, listOfKeyPoints)
+            sketch = self.__generateFootprintSketch(self.context.doc, signature, footprintKey)
+            keyAndStabBaseDocs[signatureId] = SketchAndExtrude(sketch)
+            yield self.__getProgress(index + 1, len(self.context.keyPoints))
+
+        self.context.keyAndStabBaseDocs = keyAndStabBaseDocs
+
+    # The polygons __generateFootprintSketch() sketches for the footprint of the key
+    def getFootprintPolygons(self, baseKey: Key.BaseKey) -> List[QtGui.QPolygonF]:
+        if baseKey.shouldBeStabilised():
+            return [self.freecadTransform.map(poly) for poly in baseKey.getStabParts()]
+
+        return [baseKey.footprint()]
+
+    # Footprint signature id (without angle) the key is cut with, that of its canonical
+    # footprint if footprints are deduplicated.
+    def getFootprintSignatureId(self, baseKey: Key.BaseKey) -> int:
+        if self.dedupFootprints:
+            return self.getCanonicalFootprint(baseKey).signatureId
+
+        return baseKey.getFootprintSignatureId(False)
+
+    # The key the footprint sketch of signatureId is sketched from. The first key using
+    # a canonical footprint doesn't need to have that footprint itself, it may be rotated.
+    def getFootprintKey(self, signatureId: int, keyPoints: List[KeyPoint]) -> Key.BaseKey:
+        return self.context.canonicalFootprintKeys.get(signatureId, keyPoints[0].baseKey)
+
+    # Of the footprints (without angle) that are the same when rotated by a multiple
+    # of 90°, the one with the lowest document name becomes canonical and the others
+    # reuse it. The footprints of all keys that are sketched are sorted up front, so
+    # the choice doesn't depend on the order of the keys.
+    #
+    # Footprints that are only the same when mirrored are kept apart, a Placement
+    # can't mirror so that'd take an extra object per key or point array.
+    def getCanonicalFootprint(self, baseKey: Key.BaseKey) -> CanonicalFootprint:
+        if not self.context.canonicalFootprints:
+            self.__findCanonicalFootprints()
 
-        #FileNamePart, Sketch
-        keyAndStabBaseDocs: Dict[str, SketchAndExtrude] = {}
+        return self.__addCanonicalFootprint(baseKey)
 
-        for key, listOfKeyPoints in self.keyPoints.items():
-            sketch = self.doc.addObject('Sketcher::SketchObject', key+'Sketch')
-            firstEntry: Key.BaseKey = listOfKeyPoints[0].baseKey
-            if firstEntry.shouldBeStabilised():
-                for poly in firstEntry.getStabParts():
-                    flippedPoly = self.freecadTransform.map(poly)
-                    self.addQPolyToSketch(sketch,flippedPoly)
-            else:
-                self.addQPolyToSketch(sketch, firstEntry.footprint())
-            keyAndStabBaseDocs[key] = SketchAndExtrude(sketch)
+    def __findCanonicalFootprints(self):
+        mirrorSymmetry = self.context.mirrorSymmetry
+        keyReservedSpaceGis = self.getKeyReservedSpaceGis()
+        if mirrorSymmetry:
+            keyReservedSpaceGis = mirrorSymmetry.leftHalf + mirrorSymmetry.onAxis
+
+        # Document name, (unique) footprint signature, a key with that footprint
+        baseKeys = {}
+        for keyReservedSpaceGi in keyReservedSpaceGis:
+            signature = keyReservedSpaceGi.data(0).getFootprintSignature().withoutAngle()
+            baseKeys[(signature.toDocName(), repr(signature))] = keyReservedSpaceGi.data(0)
+        for sortKey in sorted(baseKeys):
+            self.__addCanonicalFootprint(baseKeys[sortKey])
+
+    def __addCanonicalFootprint(self, baseKey: Key.BaseKey) -> CanonicalFootprint:
+        signatureId = baseKey.getFootprintSignatureId(False)
+        if signatureId in self.context.canonicalFootprints:
+            return self.context.canonicalFootprints[signatureId]
+
+        edges = Key.PolygonEdgesUm(self.getFootprintPolygons(baseKey))
+        canonical = None
+        for canonicalId, canonicalEdges in self.context.canonicalFootprintEdges.items():
+            for quarterTurns in range(4):
+                if Key.RotateEdgesUm(canonicalEdges, quarterTurns) == edges:
+                    # KLE angles are clockwise, FreeCAD rotates counterclockwise
+                    canonical = replace(
+                        self.context.canonicalFootprints[canonicalId], angleOffset=-90 * quarterTurns
+                    )
+                    break
+            if canonical:
+                break
+
+        if canonical is None:
+            symmetryOrder = sum(1 for quarterTurns in range(4) if Key.RotateEdgesUm(edges, quarterTurns) == edges)
+            canonical = CanonicalFootprint(signatureId, 0, 360 / symmetryOrder)
+            self.context.canonicalFootprintEdges[signatureId] = edges
+            self.context.canonicalFootprintKeys[signatureId] = baseKey
+        self.context.canonicalFootprints[signatureId] = canonical
+
+        return canonical
+
+    def __generateFootprintSketch(
+        self, doc: FreeCAD.Document, signature: Key.FootprintSignature, firstEntry: Key.BaseKey
+    ) -> Sketcher.Sketch:
+        sketch = doc.addObject('Sketcher::SketchObject', signature.toDocName()+'Sketch')
+        sketch.Label = signature.toLabelName()+'Sketch'
+        self.addQPolysToSketch(sketch, self.getFootprintPolygons(firstEntry))
 
-        self.keyAndStabBaseDocs = keyAndStabBaseDocs
+        return sketch
+
+    # Links to the extruded footprints in the footprint library, footprints that
+    # aren't in there yet are sketched and extruded in the library first.
+    def __linkKeyAndStabFootprints(self):
+        library = self.context.library = FootprintLibrary.FootprintLibrary(
+            self.footprintLibraryFolder, self.switchType, self.stabilizerType, self.kerf, self.thickness
+        )
+        libraryDoc = library.open()
+
+        keyAndStabBaseDocs: Dict[int, SketchAndExtrude] = {}
+        for index, (signatureId, listOfKeyPoints) in enumerate(self.context.keyPoints.items()):
+            signature = Key.FootprintSignature.FromId(signatureId)
+            extrude = library.getExtrusion(signature)
+            if extrude is None:
+                footprintKey = self.getFootprintKey(signatureId, listOfKeyPoints)
+                sketch = self.__generateFootprintSketch(libraryDoc, signature, footprintKey)
+                extrude = self.createExtrusion(sketch, self.thickness)
+                library.markChanged(sketch, extrude)
+
+            link = self.context.doc.addObject('App::Link', signature.toDocName()+'Link')
+            link.Label = signature.toLabelName()+'Link'
+            link.LinkedObject = extrude
+            link.Visibility = False
+            keyAndStabBaseDocs[signatureId] = SketchAndExtrude(None, link)
+            yield self.__getProgress(index + 1, len(self.context.keyPoints))
+
+        # Saved once the plate is built (open() saved it once already, linking requires that)
+        library.recompute()
+        self.context.keyAndStabBaseDocs = keyAndStabBaseDocs
 
     def __generateKeyAndStabExtrudes(self):
-        for key, keyStabDoc in self.keyAndStabBaseDocs.items():
+        if self.footprintLibraryFolder:
+            return # The library links are used as is
+
+        for signatureId, keyStabDoc in self.context.keyAndStabBaseDocs.items():
             extrude: FreeCAD.DocumentObject = self.createExtrusion(
                 keyStabDoc.sketch, self.thickness
             )
             extrude.Visibility = False
-            self.keyAndStabBaseDocs[key].extrude = extrude
+            self.context.keyAndStabBaseDocs[signatureId].extrude = extrude
 
     def __generateClonesAndPointArrays(self):
         # Flatten into a big list of keypoints
-        flattenedSortedKeyPoints = (keyPoint for subList in self.keyPoints.values() for keyPoint in subList)
+        flattenedSortedKeyPoints = [keyPoint for subList in self.context.keyPoints.values() for keyPoint in subList]
+        keyCount = len(flattenedSortedKeyPoints)
+
+        # Mirrored keys are kept apart, they're fused into their own half
+        yield from self.__generateClonesAndPointArraysFor(
+            [keyPoint for keyPoint in flattenedSortedKeyPoints if keyPoint.mirrored],
+            self.context.mirroredSwitchesAndStabs, keyCount
+        )
+        yield from self.__generateClonesAndPointArraysFor(
+            [keyPoint for keyPoint in flattenedSortedKeyPoints if not keyPoint.mirrored],
+            self.context.switchesAndStabsToCut, keyCount
+        )
+
+    # Yields after every point array and every chunkKeyCount clones, keyCount is that of both halves
+    def __generateClonesAndPointArraysFor(self, keyPoints: List[KeyPoint], switchesAndStabsToCut: list, keyCount: int):
+        if self.placementBackend == KeyboardQ.PlacementBackend.LINK_ARRAY:
+            # Only a placement per key, not worth splitting up
+            self.__generateLinkArraysFor(keyPoints, switchesAndStabsToCut)
+            self.context.placedKeyCount += len(keyPoints)
+            yield self.__getProgress(self.context.placedKeyCount, keyCount)
+            return
 
         # Group everything by angle (in addition to orientation and size and flipped stab)
-        fullySortedKeyPoints: Dict[str, List[KeyPoint]] = {}
-        for keyPoint in flattenedSortedKeyPoints:
+        fullySortedKeyPoints: Dict[int, List[KeyPoint]] = {}
+        for keyPoint in keyPoints:
             self.addToKeyPointList(fullySortedKeyPoints, keyPoint, True)
 
-        for key, keyPointList in fullySortedKeyPoints.items():
+        for signatureId, keyPointList in fullySortedKeyPoints.items():
             firstEntry: KeyPoint = keyPointList[0]
-            labelNameWithoutRotation = firstEntry.toLabelName(False) 
-            keyStabBaseDoc = self.keyAndStabBaseDocs[labelNameWithoutRotation]
+            keyStabBaseDoc = self.context.keyAndStabBaseDocs[firstEntry.baseSignatureId]
             if len(keyPointList) > self.cloneCap:
                 multiplyMe = None
                 keyPositionSketch = self.__generateKeyPositionSketch(
-                    firstEntry.toLabelName(True), keyPointList
+                    firstEntry.getSignature(True), keyPointList
                 )
-                if key == labelNameWithoutRotation:
+                if signatureId == firstEntry.baseSignatureId:
                     multiplyMe = keyStabBaseDoc.extrude
                 else:
                     clone = self.cloneAndRotate(keyStabBaseDoc.extrude, firstEntry)
@@ -590,31 +1680,87 @@ class FreeCADKeyboard(KeyboardQ.KeyboardQ):
                     multiplyMe = clone
                 
                 pa = self.__generatePointArray(multiplyMe, keyPositionSketch)
-                pa.Label = f"{self.keyPointsToRangeString(keyPointList)} {key}PointArray"
-                self.switchesAndStabsToCut.append(pa)
+                pa.Label = f"{self.keyPointsToRangeString(keyPointList)} {firstEntry.toLabelName(True)}PointArray"
+                switchesAndStabsToCut.append(pa)
+                self.context.cutoutPositions[pa.Name] = self.getAveragePosition(
+                    [(keyPoint.center.x(), keyPoint.center.y()) for keyPoint in keyPointList]
+                )
+                self.context.placedKeyCount += len(keyPointList)
+                yield self.__getProgress(self.context.placedKeyCount, keyCount)
             else:
                 for keyPoint in keyPointList:
                     clone = self.cloneAndMatchPositioning(keyStabBaseDoc.extrude, keyPoint)
-                    self.switchesAndStabsToCut.append(clone)
+                    switchesAndStabsToCut.append(clone)
+                    self.context.cutoutPositions[clone.Name] = (keyPoint.center.x(), keyPoint.center.y())
+                    self.context.placedKeyCount += 1
+                    if self.context.placedKeyCount % self.chunkKeyCount == 0:
+                        yield self.__getProgress(self.context.placedKeyCount, keyCount)
+
+    # One App::Link array per footprint (the angle is part of the element placements).
+    # The elements only hold a placement rather than a copy of the shape and aren't
+    # separate document objects, unlike clones and point arrays.
+    #
+    # The placements are calculated from the key centres, they're not bound to the
+    # key position sketches like the clones are in GenerationMode.CONSTRAINED.
+    def __generateLinkArraysFor(self, keyPoints: List[KeyPoint], switchesAndStabsToCut: list):
+        keyPointsPerFootprint: Dict[int, List[KeyPoint]] = {}
+        for keyPoint in keyPoints:
+            self.addToKeyPointList(keyPointsPerFootprint, keyPoint)
+
+        for signatureId, keyPointList in keyPointsPerFootprint.items():
+            firstEntry: KeyPoint = keyPointList[0]
+            linkArray = self.context.doc.addObject('App::Link', firstEntry.toDocName()+'LinkArray')
+            linkArray.Label = f"{self.keyPointsToRangeString(keyPointList)} {firstEntry.toLabelName()}LinkArray"
+            linkArray.LinkedObject = self.context.keyAndStabBaseDocs[signatureId].extrude
+            # Elements aren't exposed as objects of their own
+            linkArray.ShowElement = False
+            linkArray.ElementCount = len(keyPointList)
+            linkArray.PlacementList = [self.getElementPlacement(keyPoint) for keyPoint in keyPointList]
+            self.context.linkArrays[signatureId] = linkArray
+
+            switchesAndStabsToCut.append(linkArray)
+            self.context.cutoutPositions[linkArray.Name] = self.getAveragePosition(
+                [(keyPoint.center.x(), keyPoint.center.y()) for keyPoint in keyPointList]
+            )
+
+    # The absolute placement of a key, same as that of its clone after recomputing
+    def getElementPlacement(self, keyPoint: KeyPoint) -> FreeCAD.Placement:
+        position = self.context.anchorPosition + keyPoint.center.toFv()
+        if keyPoint.angle == 0:
+            return FreeCAD.Placement(position, FreeCAD.Rotation())
+
+        return FreeCAD.Placement(position, self.getRotationClusterPlacement(keyPoint).Rotation)
+
+    def getAveragePosition(self, positions: List[Tuple[float, float]]) -> Tuple[float, float]:
+        return (
+            sum(x for x, _ in positions) / len(positions),
+            sum(y for _, y in positions) / len(positions)
+        )
 
     def addToKeyPointList(
         self,
-        keyPoints: Dict[str, List[KeyPoint]],
+        keyPoints: Dict[int, List[KeyPoint]],
         keyPoint: KeyPoint,
         incAngle: bool = False
     ):
-        fileNamePart = keyPoint.toLabelName(incAngle)
-        if fileNamePart not in keyPoints:
-            keyPoints[fileNamePart] = []
-        keyPoints[fileNamePart].append(keyPoint)
+        signatureId = keyPoint.getSignatureId(incAngle)
+        if signatureId not in keyPoints:
+            keyPoints[signatureId] = []
+        keyPoints[signatureId].append(keyPoint)
 
     def cloneAndMatchPositioning(self, doc: FreeCAD.DocumentObject, keyPoint: KeyPoint) -> Part.Part2DObject:
         clone = self.cloneAndRotate(doc, keyPoint)
 
+        if self.generationMode == KeyboardQ.GenerationMode.PLACEMENT_ONLY:
+            placement = clone.Placement
+            placement.Base = keyPoint.position
+            clone.Placement = placement
+            return clone
+
         for (coordSmall, coordBig) in (('x', 'X'), ('y', 'Y')):
             clone.setExpression(
                 f'.Placement.Base.{coordSmall}',
-                f'{self.keyPosMasterSketch.Name}.Geometry[{keyPoint.id}].{coordBig}'
+                f'{keyPoint.positionSketch.Name}.Geometry[{keyPoint.id}].{coordBig}'
             )
 
         return clone
@@ -623,14 +1769,24 @@ class FreeCADKeyboard(KeyboardQ.KeyboardQ):
         clone: Part.Part2DObject = Draft.make_clone(doc)
         clone.Label = f'Key_{keyPoint.keyNumber} - {keyPoint.toLabelName(True)}'
 
-        if keyPoint.baseKey.key.rotation_angle != 0:
-            clone.Placement = FreeCAD.Placement(
+        if keyPoint.angle != 0:
+            clone.Placement = self.getRotationClusterPlacement(keyPoint)
+
+        return clone
+
+    # The rotation is the same for every key in a rotation cluster (with the same
+    # footprint angle, see KeyPoint.canonicalize) so it's only calculated once per
+    # cluster (assigning a Placement copies it).
+    def getRotationClusterPlacement(self, keyPoint: KeyPoint) -> FreeCAD.Placement:
+        clusterKey = (keyPoint.rotationClusterKey, keyPoint.angle)
+        if clusterKey not in self.context.rotationClusterPlacements:
+            self.context.rotationClusterPlacements[clusterKey] = FreeCAD.Placement(
                 FreeCAD.Vector(),
                 FreeCAD.Vector(),
-                keyPoint.baseKey.key.rotation_angle * -1
+                keyPoint.angle * -1
             )
 
-        return clone
+        return self.context.rotationClusterPlacements[clusterKey]
 
 
     # Returns a string with the key numbers abbreviated, e.g. '1-4,5,6,9-10
@@ -647,32 +1803,75 @@ class FreeCADKeyboard(KeyboardQ.KeyboardQ):
         return ','.join(result)
 
 
-    # Fills the given sketch with the given QPolygonF adding constraints where approperiate.
+    # The number of lines of every polygon addQPolysToSketch() sketches for the footprint of the key
+    def getFootprintLineCounts(self, baseKey: Key.BaseKey) -> List[int]:
+        return [Key.SimplifyPolygon(poly).length() - 1 for poly in self.getFootprintPolygons(baseKey)]
+
+    # Lines and constraints of a footprint sketch of polygons with lineCounts lines
+    def getFootprintSketchSize(self, lineCounts: List[int]) -> Tuple[int, int]:
+        lineCount = sum(lineCounts)
+        # A Block per line, or 2 per line, 2 to pin the first and a Coincident
+        # between every pair of lines (the last one being replaced).
+        constraintCount = lineCount if self.rigidFootprints else 3 * lineCount + len(lineCounts)
+
+        return lineCount, constraintCount
+
+    # Fills the given sketch with the given QPolygonFs adding constraints where approperiate.
+    # All lines go in a single addGeometry call and all constraints in a single
+    # addConstraint call, no matter the number of polygons.
     # 
     # Note: Only does vertical/horizontal/distance/coincident constraints,
     # If the polygon contains any diagonals they won't be constrained.
-    def addQPolyToSketch(self, sketch: Sketcher.Sketch, poly: QtGui.QPolygonF) -> Sketcher.Sketch:
+    # With rigidFootprints every line (diagonals included) gets a Block constraint instead.
+    #
+    # The polygons are simplified first, every point left over means another line
+    # and another set of constraints for the solver.
+    def addQPolysToSketch(self, sketch: Sketcher.Sketch, polys: List[QtGui.QPolygonF]) -> Sketcher.Sketch:
+        lines: List[Part.LineSegment] = []
+        constraints: List[Constraint] = []
+        for poly in polys:
+            polyLines, polyConstraints = self.getQPolyGeometryAndConstraints(poly, sketch.GeometryCount + len(lines))
+            lines += polyLines
+            constraints += polyConstraints
+
+        self.context.sketcherCalls.addGeometry(sketch, lines)
+        self.context.sketcherCalls.addConstraint(sketch, constraints)
+
+        return sketch
+
+    # The lines of the polygon and their constraints, the lines get ids from firstLineId on
+    def getQPolyGeometryAndConstraints(
+        self, poly: QtGui.QPolygonF, firstLineId: int
+    ) -> Tuple[List[Part.LineSegment], List[Constraint]]:
+        poly = Key.SimplifyPolygon(poly)
         nFootPrintPoints = poly.length()
-        firstLineId = None
         prevLineId = None
         qpointfList = poly.toList()
 
         # Start at 1 because 2 points are needed to draw a line [0, 1] [1, 2] etc
         r = range(1, nFootPrintPoints)
-        for i in r:
-            start = qpointfList[i-1].toTuple()
-            end = qpointfList[i].toTuple()
-
-            line = Part.LineSegment(FreeCAD.Vector(*start),FreeCAD.Vector(*end))
-            lineId = sketch.addGeometry(line)
+        lines = [
+            Part.LineSegment(
+                FreeCAD.Vector(*qpointfList[i-1].toTuple()),
+                FreeCAD.Vector(*qpointfList[i].toTuple())
+            ) for i in r
+        ]
+        lineIds = range(firstLineId, firstLineId + len(lines))
+        if self.rigidFootprints:
+            # Fully constrained as well, but the solver skips blocked geometry altogether.
+            # The lines still form a closed wire as their end points are the same points.
+            return lines, [Constraint('Block', lineId) for lineId in lineIds]
+
+        allConstraints = []
+        for i, line, lineId in zip(r, lines, lineIds):
             l = L(line, lineId)
             constraints = l.getConstraints()
 
-            if firstLineId == None:  # First loop
-                firstLineId = lineId
+            if lineId == firstLineId:  # First loop
                 # Attach first point to center point of the sketch to eliminate degrees of freedom
-                fX = round(qpointfList[0].x(), 8)
-                fY = round(qpointfList[0].y(), 8) * -1
+                firstPoint = Key.PointUm.FromQPointF(qpointfList[0])
+                fX = Key.UmToMm(firstPoint.x)
+                fY = Key.UmToMm(firstPoint.y) * -1
                 constraints += [                    
                     Constraint('DistanceX', -1, 1, firstLineId, 1, fX),
                     Constraint('DistanceY', firstLineId, 1, -1, 1, fY)
@@ -685,21 +1884,21 @@ class FreeCADKeyboard(KeyboardQ.KeyboardQ):
                 constraints.append(Constraint('Coincident', lineId, 2, firstLineId, 1))
 
             prevLineId = lineId
-            sketch.addConstraint(constraints)
+            allConstraints += constraints
 
-        return sketch
+        return lines, allConstraints
     
     def __createPlatePad(self, sketch: Sketcher.Sketch, thickness: float = 1.5):
         padName = sketch.Name.replace('Sketch', 'Pad')
         padLabel = sketch.Label.replace('Sketch', 'Pad')
-        self.kbPad = self.body.newObject('PartDesign::Pad', padName)
-        self.kbPad.Label = padLabel
-        self.kbPad.Profile = self.sketch
-        self.kbPad.Length = thickness        
+        self.context.kbPad = self.context.body.newObject('PartDesign::Pad', padName)
+        self.context.kbPad.Label = padLabel
+        self.context.kbPad.Profile = self.context.sketch
+        self.context.kbPad.Length = thickness        
 
     def createExtrusion(self, sketch: Sketcher.Sketch, thickness: float = 1.5):
         extrusionName = sketch.Name.replace('Sketch', 'Extrusion')
-        extrusion = self.doc.addObject('Part::Extrusion', extrusionName)
+        extrusion = sketch.Document.addObject('Part::Extrusion', extrusionName)
         extrusion.Base = sketch
         extrusion.DirMode = 'Normal'
         extrusion.DirLink = None
@@ -711,21 +1910,23 @@ class FreeCADKeyboard(KeyboardQ.KeyboardQ):
         extrusion.TaperAngle = 0.0
         extrusion.TaperAngleRev = 0.0
 
-        extrusion.ViewObject.ShapeColor = getattr(
-            sketch.getLinkedObject(True).ViewObject,
-            'ShapeColor',
-            extrusion.ViewObject.ShapeColor
-        )
-        extrusion.ViewObject.LineColor = getattr(
-            sketch.getLinkedObject(True).ViewObject,
-            'LineColor',
-            extrusion.ViewObject.LineColor
-        )
-        extrusion.ViewObject.PointColor = getattr(
-            sketch.getLinkedObject(True).ViewObject,
-            'PointColor',
-            extrusion.ViewObject.PointColor
-        )
+        # There's no ViewObject when running without the GUI (see CommandLine.py)
+        if extrusion.ViewObject:
+            extrusion.ViewObject.ShapeColor = getattr(
+                sketch.getLinkedObject(True).ViewObject,
+                'ShapeColor',
+                extrusion.ViewObject.ShapeColor
+            )
+            extrusion.ViewObject.LineColor = getattr(
+                sketch.getLinkedObject(True).ViewObject,
+                'LineColor',
+                extrusion.ViewObject.LineColor
+            )
+            extrusion.ViewObject.PointColor = getattr(
+                sketch.getLinkedObject(True).ViewObject,
+                'PointColor',
+                extrusion.ViewObject.PointColor
+            )
         sketch.Visibility = False
 
         return extrusion
\ No newline at end of file
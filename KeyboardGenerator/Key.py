@@ -5,6 +5,7 @@ from typing import List
 from PySide2.QtCore import QPointF as Qpf
 from PySide2 import QtGui, QtCore
 from abc import abstractmethod
+from dataclasses import dataclass, replace
 
 class Component(Enum):
     ENTIRE = 0
@@ -30,6 +31,12 @@ class StabilizerType(str, Enum):
             return [Component.ENTIRE]
 
 
+class Orientation(str, Enum):
+    AGNOSTIC = ''
+    VERTICAL = 'Ver'
+    HORIZONTAL = 'Hor'
+
+
 class SwitchType(str, Enum):
     CHERRY_MX = 'Cherry MX'
     CHERRY_MX_OPENABLE = 'Cherry MX Openable'
@@ -46,6 +53,190 @@ class SwitchType(str, Enum):
         }
         return switchClassMap[switchType]
 
+    @classmethod
+    def FromSwitchTypeClass(cls, switchClass) -> 'SwitchType':
+        for switchType in SwitchType:
+            if SwitchType.GetSwitchTypeClass(switchType) is switchClass:
+                return switchType
+
+
+# Layout geometry is stored and compared as integer micrometres rather than as
+# floats. Rotating, flipping and adding up floats leaves tiny deviations behind
+# (19.049999999 vs 19.05), integers make equality, hashing and orientation
+# tests exact without having to round on every comparison.
+UM_PER_MM: int = 1000
+
+def MmToUm(mm: float) -> int:
+    return int(round(mm * UM_PER_MM))
+
+def UmToMm(um: int) -> float:
+    return um / UM_PER_MM
+
+class PointUm(typing.NamedTuple):
+    x: int
+    y: int
+
+    @classmethod
+    def FromXY(cls, x: float, y: float) -> 'PointUm':
+        return cls(MmToUm(x), MmToUm(y))
+
+    @classmethod
+    def FromQPointF(cls, point: QtCore.QPointF) -> 'PointUm':
+        return cls.FromXY(point.x(), point.y())
+
+    def toQPointF(self) -> QtCore.QPointF:
+        return QtCore.QPointF(UmToMm(self.x), UmToMm(self.y))
+
+
+# Normalizes a (closed) polygon so it consists of as few edges as possible.
+#
+# QPolygonF.united() leaves duplicate points and points halfway a straight line
+# behind. Every one of those turns into a separate line (with its own constraints)
+# once the polygon is sketched in FreeCAD, so they're removed here:
+# * Duplicate points (zero length edges) are dropped
+# * Points on a straight line between their neighbours (collinear runs) are merged
+# * The start vertex is moved to the top left most point, so equal outlines
+#   always result in the exact same polygon
+#
+# Points are snapped to whole micrometres (PointUm) which keeps all tests exact.
+def SimplifyPolygon(poly: QtGui.QPolygonF) -> QtGui.QPolygonF:
+    points = [PointUm.FromQPointF(point) for point in poly.toList()]
+
+    def isCollinear(a: PointUm, b: PointUm, c: PointUm) -> bool:
+        return (b.x - a.x) * (c.y - b.y) == (b.y - a.y) * (c.x - b.x)
+
+    uniquePoints = []
+    for point in points:
+        if not uniquePoints or uniquePoints[-1] != point:
+            uniquePoints.append(point)
+    while len(uniquePoints) > 1 and uniquePoints[0] == uniquePoints[-1]:
+        uniquePoints.pop()
+    points = uniquePoints
+
+    removedPoint = True
+    while removedPoint and len(points) > 3:
+        removedPoint = False
+        for i in range(len(points)):
+            if isCollinear(points[i-1], points[i], points[(i+1) % len(points)]):
+                del points[i]
+                removedPoint = True
+                break
+
+    if len(points) < 3:
+        return QtGui.QPolygonF(poly)
+
+    start = points.index(min(points, key=lambda point: (point.y, point.x)))
+    points = points[start:] + points[:start]
+
+    return QtGui.QPolygonF([point.toQPointF() for point in points + [points[0]]])
+
+
+# The edges of the (simplified) polygons as unordered pairs of PointUm, two
+# outlines are the same if their edge sets are equal regardless of where the
+# polygons start or in which direction they run.
+EdgesUm = typing.FrozenSet[typing.FrozenSet[PointUm]]
+
+def PolygonEdgesUm(polygons: typing.List[QtGui.QPolygonF]) -> EdgesUm:
+    edges = set()
+    for polygon in polygons:
+        points = [PointUm.FromQPointF(point) for point in SimplifyPolygon(polygon).toList()]
+        for a, b in zip(points, points[1:] + points[:1]):
+            if a != b:
+                edges.add(frozenset((a, b)))
+
+    return frozenset(edges)
+
+# Rotates the edges counterclockwise around (0, 0) by a number of quarter turns,
+# exact as it only swaps and negates the integer coordinates.
+def RotateEdgesUm(edges: EdgesUm, quarterTurns: int) -> EdgesUm:
+    def rotate(point: PointUm) -> PointUm:
+        for _ in range(quarterTurns % 4):
+            point = PointUm(-point.y, point.x)
+        return point
+
+    return frozenset(frozenset(rotate(point) for point in edge) for edge in edges)
+
+# Everything that makes the cutout of a key different from the cutout of another key.
+#
+# Keys sharing a signature share a footprint sketch in FreeCAD. Every distinct
+# signature is interned and gets a small integer id, use the id as the (dictionary)
+# key when grouping and only turn it into a string with toLabelName()/toDocName()
+# when it needs to be displayed.
+#
+# The ids only hold for the current layout, KeyboardQ.getScene() clears them
+# (see ClearInterned()) so they don't pile up over a FreeCAD session.
+@dataclass(frozen=True)
+class FootprintSignature:
+    switchType:     SwitchType
+    stabType:       StabilizerType  # None if the key isn't stabilised
+    stabSize:       float           # 0 if the key isn't stabilised
+    orientation:    Orientation
+    angle:          float
+    flipped:        bool
+    rotateSwitch:   bool
+
+    def intern(self) -> int:
+        id = _footprintSignatureIds.get(self)
+        if id is None:
+            id = len(_footprintSignatures)
+            _footprintSignatureIds[self] = id
+            _footprintSignatures.append(self)
+
+        return id
+
+    @staticmethod
+    def FromId(id: int) -> 'FootprintSignature':
+        return _footprintSignatures[id]
+
+    # Ids handed out before are no longer valid afterwards
+    @staticmethod
+    def ClearInterned():
+        _footprintSignatureIds.clear()
+        _footprintSignatures.clear()
+
+    def withoutAngle(self) -> 'FootprintSignature':
+        return replace(self, angle=0)
+
+    def isStabilised(self) -> bool:
+        return self.stabSize > 0
+
+    # When adding new characters to this string make sure toDocName() reflects the same changes.
+    def toLabelName(self) -> str:
+        labelName = 'k1u'
+        if self.isStabilised():
+            labelName = f's{KeyReservedSpace.FloatToU(self.stabSize)}'
+            labelName += self.orientation
+
+        if self.angle != 0:
+            labelName += '{:g}°'.format(self.angle)
+
+        if self.rotateSwitch:
+            labelName += '↻'
+
+        if self.flipped:
+            labelName += '⮃'
+
+        return labelName
+
+    # Basically this method aims to create a FreeCAD document name friendly version of toLabelName()
+    #
+    # To figure out what is allowed in FreeCAD document names the FreeCAD wiki comes to the resue:
+    # https://wiki.freecad.org/Object_name
+    # The Name can only include simple alphanumeric characters, and the underscore, [_0-9a-zA-Z]
+    # The Name cannot start with a number; it must start with a letter or the underscore, [_a-zA-Z]
+    def toDocName(self) -> str:
+        docName = self.toLabelName()
+        docName = docName.replace('.', '_')
+        docName = docName.replace('-', 'minus')
+        docName = docName.replace('°','deg')
+        docName = docName.replace('↻', 'SwitchRotated')
+        docName = docName.replace('⮃', 'StabFlipped')
+
+        return docName
+
+_footprintSignatureIds: typing.Dict[FootprintSignature, int] = {}
+_footprintSignatures: typing.List[FootprintSignature] = []
+
 
 # Typically a 19.05x19.05 square
 # But may be rotated and/or some kind of multiplication of 19.05 (or 19mm)
@@ -61,9 +252,14 @@ class KeyReservedSpace():
     reservedSpace:      QtGui.QPolygonF = None
     keyPlacementPoint:  QtCore.QPointF = None
     originPoint:        QtCore.QPointF = None
+    # Same as keyCenter and originPoint but in whole micrometres, use these
+    # whenever keys are compared, grouped or used as (dictionary) keys.
+    keyCenterUm:        PointUm = None
+    originPointUm:      PointUm = None
     stabType:           StabilizerType = StabilizerType.CHERRY_COSTAR
     flipped:            bool = False
     rotateSwitch:       bool = False
+    __signatureCache:   tuple = None
 
     def getMidPoint(self) -> QtCore.QPointF:
         return self.reservedSpace.boundingRect().center()
@@ -82,7 +278,8 @@ class KeyReservedSpace():
         self.flipped = flipped
         self.rotateSwitch = self.shouldBeStabilised() and rotateSwitch
 
-        self.originPoint = self._createOffsetPointU(key.rotation_x, key.rotation_y)
+        self.originPointUm = self._createOffsetPointUm(key.rotation_x, key.rotation_y)
+        self.originPoint = self.originPointUm.toQPointF()
         
         self.transf = QtGui.QTransform().rotate(key.rotation_angle)
 
@@ -96,13 +293,17 @@ class KeyReservedSpace():
             self.reservedSpace.width()  - (2 * self.KEYCAP_OFFSET),
             self.reservedSpace.height() - (2 * self.KEYCAP_OFFSET)
         )
-        self.keyCenter = self._createOffsetPointU(
+        self.keyCenterUm = self._createOffsetPointUm(
             key.x + (key.width  * 0.5),
             key.y + (key.height * 0.5)
         )
+        self.keyCenter = self.keyCenterUm.toQPointF()
 
     def _createOffsetPointU(self, x: float, y: float) -> QtCore.QPointF:
-        return QtCore.QPointF((x * self.ONE_U), (y * self.ONE_U))
+        return self._createOffsetPointUm(x, y).toQPointF()
+
+    def _createOffsetPointUm(self, x: float, y: float) -> PointUm:
+        return PointUm.FromXY(x * self.ONE_U, y * self.ONE_U)
 
     def hasOriginPoint(self) -> bool:
         return (self.key.rotation_x != 0. or self.key.rotation_y != 0.) \
@@ -141,7 +342,7 @@ class KeyReservedSpace():
                 unifiedPolygon = unifiedPolygon.united(polygon)
             polygons = [unifiedPolygon]
 
-        return polygons
+        return [SimplifyPolygon(polygon) for polygon in polygons]
 
     @classmethod
     def footprintMockup(cls, kerf: float = 0.) -> QtGui.QPolygonF:
@@ -197,10 +398,60 @@ class KeyReservedSpace():
     def getBiggestSize(self) -> float:
         return max([self.key.width, self.key.height])
     
+    def getOrientation(self) -> Orientation:
+        if self.key.width > self.key.height:
+            return Orientation.HORIZONTAL
+        elif self.key.height > self.key.width:
+            return Orientation.VERTICAL
+
+        return Orientation.AGNOSTIC
+
+    # Computed once per key, only recalculated when the key gets flipped or
+    # has its switch rotated (in the preview)
+    def getFootprintSignature(self) -> FootprintSignature:
+        cacheKey = (self.stabType, self.flipped, self.rotateSwitch)
+        if self.__signatureCache is not None and self.__signatureCache[0] == cacheKey:
+            return self.__signatureCache[1]
+
+        if self.shouldBeStabilised():
+            signature = FootprintSignature(
+                SwitchType.FromSwitchTypeClass(self.__class__),
+                self.stabType,
+                self.StrToFloat(self.getStabSizeU()),
+                self.getOrientation(),
+                self.key.rotation_angle,
+                self.flipped,
+                self.rotateSwitch
+            )
+        else:
+            # Orientation, the stabilizer and flipping it don't affect a key without stabilizer
+            signature = FootprintSignature(
+                SwitchType.FromSwitchTypeClass(self.__class__),
+                None, 0, Orientation.AGNOSTIC, self.key.rotation_angle, False, self.rotateSwitch
+            )
+        self.__signatureCache = (cacheKey, signature)
+
+        return signature
+
+    def getFootprintSignatureId(self, includeAngle: bool = True) -> int:
+        signature = self.getFootprintSignature()
+        if not includeAngle:
+            signature = signature.withoutAngle()
+
+        return signature.intern()
+
+    # Keys sharing this key (same origin point and angle) form a rotation cluster,
+    # all keys without rotation end up in the same unrotated cluster.
+    def getRotationClusterKey(self) -> typing.Tuple[PointUm, float]:
+        if not self.isRotated():
+            return (PointUm(0, 0), 0)
+
+        return (self.originPointUm, self.key.rotation_angle)
+
     def hasSameOriginPoint(self, other: 'KeyReservedSpace') -> bool:
         return other is not None \
             and self.hasOriginPoint() \
-            and self.originPoint == other.originPoint
+            and self.originPointUm == other.originPointUm
 
 # Basically just here so elsewhere it doesn't look like a key is CherryMx when
 # it isn't. CherryMx for all intents however is the base class
@@ -466,7 +717,7 @@ class Stabilizer:
         transform.rotate(rotationAngle)
         poly = transform.map(poly)
 
-        return poly
+        return SimplifyPolygon(poly)
     
     @classmethod
     def GetLeftFootPrint(cls, kerf: float, width: float, stabType: StabilizerType) -> QtGui.QPolygonF:
@@ -7,6 +7,8 @@ from pykle_serial import serial
 import typing
 import xml.etree.ElementTree as ET
 import math
+import bisect
+import weakref
 from PySide2 import QtGui, QtCore
 import FreeCAD
 from enum import Enum
@@ -62,6 +64,23 @@ class KbShape(str, Enum):
     RECTANGULAR = 'Rectangular'
     CONVEX_HULL = 'Convex Hull'
 
+# How FreeCADKeyboard positions the key and stabilizer cutouts
+class GenerationMode(str, Enum):
+    # Every key position is constrained relative to the plate
+    CONSTRAINED = 'Constrained'
+    # Key positions are plain points and placements without solver constraints,
+    # only the plate outline and footprint sketches remain parametric.
+    PLACEMENT_ONLY = 'Placement only'
+    # A single Part::Feature built directly from faces, no parametric history
+    DIRECT_SHAPE = 'Direct shape'
+
+# How FreeCADKeyboard places the extruded footprints at the key positions
+class PlacementBackend(str, Enum):
+    # Draft clones, and point arrays once there's more of the same than cloneCap
+    DRAFT = 'Draft clones'
+    # One App::Link array per footprint, every key is an element of it
+    LINK_ARRAY = 'Link arrays'
+
 class CornerStyle(Enum):
     ROUNDED = 1
     ANGLED = 2
@@ -94,6 +113,28 @@ class UnitDifficultyReport:
     unsupportedSize: bool
 
 
+# KLE rotates keys in clusters, every key with the same rotation origin (rx, ry)
+# and angle (r) is part of the same cluster. The keys of a cluster are laid out
+# in their own unrotated coordinates inside groupGi and only groupGi is rotated.
+@dataclass
+class RotationCluster:
+    originPoint:    QtCore.QPointF
+    angle:          float
+    groupGi:        QtWidgets.QGraphicsItemGroup = None
+    originPointGi:  QtWidgets.QGraphicsEllipseItem = None
+
+    def isRotated(self) -> bool:
+        return self.angle != 0
+
+# Result of KeyboardQ.getMirrorSymmetry(), axisX is in scene coordinates.
+@dataclass
+class MirrorSymmetry:
+    axisX:      float
+    # Keys left of the axis, mirrored they make up the right half
+    leftHalf:   typing.List['KeyReservedSpaceGi']
+    # Keys on the axis are their own mirror image
+    onAxis:     typing.List['KeyReservedSpaceGi']
+
 @dataclass
 class KeyAndStabDifficultyReports:
     keyReport: UnitDifficultyReport
@@ -308,6 +349,8 @@ class KeyReservedSpaceGi(QtWidgets.QGraphicsRectItem):
         return txtFlipped
     
     # Padding when doing a hullshape
+    # The returned item is not part of the scene, its transform places the grown
+    # polygon where this item is in the scene (including any cluster rotation).
     def Grow(self, growBy: float):
         center = self.boundingRect().center()
         newPolygon = QtGui.QPolygonF()
@@ -328,16 +371,21 @@ class KeyReservedSpaceGi(QtWidgets.QGraphicsRectItem):
             newPolygon.append(newPoint)
 
         polyGi = QtWidgets.QGraphicsPolygonItem(newPolygon)
-        polyGi.setPos(self.pos())
-        polyGi.setTransformOriginPoint(self.transformOriginPoint())
-        polyGi.setTransform(self.transform())
-        polyGi.setRotation(self.rotation())
+        polyGi.setTransform(self.sceneTransform())
 
         return polyGi
 
+    # The cutouts (switch and stabilizer polygons) of this key in scene coordinates
+    def getSceneCutoutPolygons(self) -> typing.List[QPolygonF]:
+        return [
+            child.mapToScene(child.polygon())
+            for child in self.childItems() if isinstance(child, SwitchGi)
+        ]
+
 # data(0) = KeyReservedSpace
-# data(1) = KeyboardQ
-# data(2) = Elipse to highlight as origin point
+# data(1) = weakref to the KeyboardQ (a strong one is held by Qt, out of sight of the
+#           garbage collector, and would keep the KeyboardQ and its scene alive forever)
+# data(2) = Elipse to highlight as origin point (shared by the rotation cluster)
     def hoverEnterEvent(self, event: QtWidgets.QGraphicsSceneMouseEvent) -> None:
         self.originalBrush = self.brush()
         self.setBrush(self.hoverBrush)
@@ -354,7 +402,7 @@ class KeyReservedSpaceGi(QtWidgets.QGraphicsRectItem):
     def mousePressEvent(self, event: QtWidgets.QGraphicsSceneHoverEvent) -> None:
         keyInfo: Key.KeyReservedSpace = self.data(0)
         if keyInfo.shouldBeStabilised():
-            svbKbQ: KeyboardQ = self.data(1)
+            svbKbQ: KeyboardQ = self.data(1)()
             if event.button() == QtCore.Qt.LeftButton:
                 keyInfo.rotateSwitch = not keyInfo.rotateSwitch
             elif event.button() == QtCore.Qt.RightButton:
@@ -362,9 +410,6 @@ class KeyReservedSpaceGi(QtWidgets.QGraphicsRectItem):
 
             svbKbQ.addKeyToScene(keyInfo)
             svbKbQ.scene.removeItem(self)
-            originPointGi: QtWidgets.QGraphicsEllipseItem = self.data(2)
-            if originPointGi:
-                svbKbQ.scene.removeItem(originPointGi)
 
     def createStabilisedSwitch(
         self, keyInfo: Key.KeyReservedSpace, reservedSpace: QtWidgets.QGraphicsItem
@@ -421,6 +466,16 @@ class KeyLabel():
     def get(self, keyLabelLocation: KeyLabelLocation):
         return getattr(self, KeyLabelLocation(keyLabelLocation).name)
 
+# Parent item of all keys in a rotation cluster, see RotationCluster
+class RotationClusterGi(QtWidgets.QGraphicsItemGroup):
+    def __init__(self, cluster: 'RotationCluster'):
+        super().__init__()
+        # Item groups swallow the events of their children by default, the keys
+        # need them for hovering and clicking.
+        self.setHandlesChildEvents(False)
+        self.setTransformOriginPoint(cluster.originPoint)
+        self.setRotation(cluster.angle)
+
 class SwitchGi(QtWidgets.QGraphicsPolygonItem):
     pass
 class StabilisedSwitchGi(SwitchGi):
@@ -609,6 +664,19 @@ class ArrowLine(QtWidgets.QGraphicsLineItem):
 
         return QtCore.QRectF(xMin, yMin, xMax - xMin, yMax - yMin)
 
+# The 'Raw data' field on keyboard-layout-generator.com foregoes the keyboard meta field
+# and skips the 'outer array'. Skipping this outer array means it's not valid JSON(5)
+# https://github.com/ijprest/keyboard-layout-editor/wiki/Serialized-Data-Format
+#
+# Add an entire array if there's none to fix this.
+def AddArrayIfNeeded(userInputJSON5: str) -> str:
+    userInputEndsOnDoubleSquareBracket = re.search(r']\s*,?\s*]\s*\Z', userInputJSON5)
+    if not userInputEndsOnDoubleSquareBracket:
+        # Add some brackets
+        userInputJSON5 = '[' + userInputJSON5 + ']'
+
+    return userInputJSON5
+
 # Contains a whole bunch of options and brushes to draw a QGraphicsScene @ getScene()
 class KeyboardQ():
     paddingTop      = 0
@@ -633,9 +701,6 @@ class KeyboardQ():
     showCutout:         bool = True
     rotateSwitch:       bool = False
 
-    keyCount = {}
-    stabCount = {}
-
     keyCapBrush         = QtGui.QBrush(QtGui.QColor(221, 204, 186, 255))
     keyCapSideBrush     = QtGui.QBrush(QtGui.QColor(185, 169, 151, 255))
     noBrush             = QtGui.QBrush(QtCore.Qt.transparent)
@@ -647,18 +712,38 @@ class KeyboardQ():
     keyboardPlateBrush  = QtGui.QBrush(QtGui.QColor(240, 236, 221, 255))
     dimensionsPen       = QtGui.QPen(keyCapSideBrush.color(), 0.5)
 
-    kbPoly = QtGui.QPolygonF()
-
     # If the number of same (same orientation and angle) keys exceeds this cap
     # a point array will be used in FreeCAD rather than cloning and positioning 
     # over and over
     cloneCap = 1
+    generationMode = GenerationMode.CONSTRAINED
+    placementBackend = PlacementBackend.DRAFT
     renderArrows = True
+    # Mirror symmetric layouts (split boards) only get one half built in FreeCAD,
+    # the other half is a mirror of it. Cutout points within the tolerance of their
+    # mirrored counterpart are considered symmetric. Off by default as the document
+    # ends up with a Part::Mirroring (and an expression on its base) instead of the
+    # keys of the other half.
+    mirrorSymmetric = False
+    symmetryToleranceUm = 10
+
+    # Everything that's filled in by getScene() is per instance, the class attributes
+    # above are only the defaults of the settings.
+    def __init__(self):
+        self.keyCount: typing.Dict[float, int] = {}
+        self.stabCount: typing.Dict[float, int] = {}
+        self.rotationClusters: typing.Dict[typing.Tuple[Key.PointUm, float], RotationCluster] = {}
+        self.kbPoly = QtGui.QPolygonF()
+        self.scene: QtWidgets.QGraphicsScene = None
 
     def getScene(self, skb: serial.Keyboard) -> QtWidgets.QGraphicsScene:
         self.keyCount = {}    
         self.stabCount = {}
+        self.rotationClusters = {}
+        self.kbPoly = QtGui.QPolygonF()
         self.scene = QtWidgets.QGraphicsScene()
+        # Only the footprints of this layout are grouped from here on
+        Key.FootprintSignature.ClearInterned()
         
         if not self.showCutout:
             self.switchBrush = self.noBrush
@@ -684,14 +769,18 @@ class KeyboardQ():
     def addKeyToScene(self, keyInfo: Key.KeyReservedSpace):
         padding = QtCore.QPointF(self.paddingLeft, self.paddingTop)
         centerIncPadding = keyInfo.keyCenter + padding
-        originIncPadding = keyInfo.originPoint + padding
+        cluster = self.getRotationCluster(keyInfo)
         reservedSpaceGi = KeyReservedSpaceGi(keyInfo, self.hoverBrush, self.switchBrush)
         reservedSpaceGi.setAcceptHoverEvents(True)
         reservedSpaceGi.setPen(QtCore.Qt.NoPen)
         reservedSpaceGi.setBrush(QtCore.Qt.NoBrush)
+        # Position is in the clusters unrotated coordinates
         reservedSpaceGi.setPos(centerIncPadding)
-        reservedSpaceGi.setData(1, self)
-        self.scene.addItem(reservedSpaceGi)
+        reservedSpaceGi.setData(1, weakref.ref(self))
+        if cluster.groupGi:
+            reservedSpaceGi.setParentItem(cluster.groupGi)
+        else:
+            self.scene.addItem(reservedSpaceGi)
         if self.showKeyCap:
             o = 1.
 
@@ -707,34 +796,177 @@ class KeyboardQ():
 <tr><th>Flipped: </th><td>{}</td></tr>
 <tr><th>Keysize: </th><td>{}</td></tr>
 <tr><th>Stabiliser:</th><td>{}</td></tr>
+<tr><th>Footprint:</th><td>{}</td></tr>
 </table>'''
             keyCapGi.setToolTip(tt.format(
                 keyInfo.key.width,
                 keyInfo.key.height,
                 '🗹' if keyInfo.flipped else '☒',
                 Key.SwitchType.GetSwitchTypeClass(self.switchType).difficulty(keyInfo.getBiggestSize()),
-                keyInfo.stabType
-
+                keyInfo.stabType,
+                keyInfo.getFootprintSignature().toLabelName()
             ))
 
+        if cluster.originPointGi:
+            reservedSpaceGi.setData(2, cluster.originPointGi)
+
+        self.kbPoly = self.kbPoly.united(reservedSpaceGi.rect())
+
+    # Returns the rotation cluster of the given key, the first key of a cluster
+    # creates it (the rotated parent item and the origin point ellipse).
+    def getRotationCluster(self, keyInfo: Key.KeyReservedSpace) -> RotationCluster:
+        clusterKey = keyInfo.getRotationClusterKey()
+        if clusterKey in self.rotationClusters:
+            return self.rotationClusters[clusterKey]
+
+        padding = QtCore.QPointF(self.paddingLeft, self.paddingTop)
+        originIncPadding = keyInfo.originPoint + padding
+        cluster = RotationCluster(originIncPadding, keyInfo.key.rotation_angle)
+
+        if cluster.isRotated():
+            cluster.groupGi = RotationClusterGi(cluster)
+            self.scene.addItem(cluster.groupGi)
+
         if keyInfo.hasOriginPoint():
-            originPointGi = self.scene.addEllipse(
+            cluster.originPointGi = self.scene.addEllipse(
                 self.createCircleRect(originIncPadding, 4),
                 self.noPen, QtGui.QBrush(QtCore.Qt.white)
             )
-            originPointGi.setZValue(2)
-            reservedSpaceGi.setData(2, originPointGi)
-            originPointGi.hide()
+            cluster.originPointGi.setZValue(2)
+            cluster.originPointGi.hide()
 
-        if keyInfo.isRotated():
-            reservedSpaceGi.setTransformOriginPoint(originIncPadding - centerIncPadding)
-            reservedSpaceGi.setRotation(keyInfo.key.rotation_angle)
+        self.rotationClusters[clusterKey] = cluster
 
-        self.kbPoly = self.kbPoly.united(reservedSpaceGi.rect())
+        return cluster
 
     def getKeyReservedSpaceGis(self) -> typing.List[KeyReservedSpaceGi]:
         scene: QtWidgets.QGraphicsScene = self.scene
         return [i for i in scene.items() if isinstance(i, KeyReservedSpaceGi)]
+
+    # 2D check whether the cutouts of different keys overlap (or touch). If they don't
+    # there's no need to fuse them before cutting them out of the plate.
+    def cutoutsOverlap(self) -> bool:
+        keyCutouts = []
+        for keySpaceGi in self.getKeyReservedSpaceGis():
+            polygons = keySpaceGi.getSceneCutoutPolygons()
+            if not polygons:
+                continue
+            bbox = polygons[0].boundingRect()
+            for polygon in polygons[1:]:
+                bbox = bbox.united(polygon.boundingRect())
+            keyCutouts.append((bbox, polygons))
+
+        # Sweep from left to right, only keys that overlap horizontally get compared
+        keyCutouts.sort(key=lambda keyCutout: keyCutout[0].left())
+        active = []
+        for bbox, polygons in keyCutouts:
+            active = [keyCutout for keyCutout in active if keyCutout[0].right() >= bbox.left()]
+            for otherBbox, otherPolygons in active:
+                if otherBbox.intersects(bbox) and any(
+                    polygon.intersects(otherPolygon) for polygon in polygons for otherPolygon in otherPolygons
+                ):
+                    return True
+            active.append((bbox, polygons))
+
+        return False
+
+    # Checks if the cutouts are mirror symmetric across the vertical axis through
+    # the middle of the layout. Returns None if they're not.
+    #
+    # Every key has to be paired with a key (possibly itself) whose cutout points
+    # are all within symmetryToleranceUm of its mirrored cutout points. Candidates
+    # are looked up by the centre of their cutout points in a grid with cells the
+    # size of the tolerance, the neighbouring cells are searched as well so points
+    # on either side of a cell border still pair up.
+    def getMirrorSymmetry(self) -> typing.Optional[MirrorSymmetry]:
+        keyCutoutPoints = [
+            (keySpaceGi, [
+                Key.PointUm.FromQPointF(point)
+                for polygon in keySpaceGi.getSceneCutoutPolygons() for point in polygon
+            ])
+            for keySpaceGi in self.getKeyReservedSpaceGis()
+        ]
+        xs = [point.x for _, points in keyCutoutPoints for point in points]
+        if not xs:
+            return None
+
+        # Twice the axis x coordinate, keeps mirroring in whole micrometres
+        doubleAxisX = min(xs) + max(xs)
+        tolerance = self.symmetryToleranceUm
+
+        # Of the bounding box, unlike the mean it doesn't depend on which point closes a polygon
+        def getCenter(points: typing.List[Key.PointUm]) -> typing.Tuple[float, float]:
+            xs, ys = [p.x for p in points], [p.y for p in points]
+            return (min(xs) + max(xs)) / 2, (min(ys) + max(ys)) / 2
+
+        def getCell(x: float, y: float) -> typing.Tuple[int, int]:
+            return math.floor(x / tolerance), math.floor(y / tolerance)
+
+        centers = [getCenter(points) if points else (0, 0) for _, points in keyCutoutPoints]
+        keysPerCell: typing.Dict[typing.Tuple[int, int], typing.List[int]] = {}
+        for index, center in enumerate(centers):
+            keysPerCell.setdefault(getCell(*center), []).append(index)
+
+        symmetry = MirrorSymmetry(Key.UmToMm(doubleAxisX) / 2, [], [])
+        paired = set()
+        for index, (keySpaceGi, points) in enumerate(keyCutoutPoints):
+            if index in paired:
+                continue
+
+            mirroredPoints = [Key.PointUm(doubleAxisX - p.x, p.y) for p in points]
+            mirroredX, mirroredY = doubleAxisX - centers[index][0], centers[index][1]
+            cellX, cellY = getCell(mirroredX, mirroredY)
+            candidates = [
+                candidate
+                for x in range(cellX - 1, cellX + 2) for y in range(cellY - 1, cellY + 2)
+                for candidate in keysPerCell.get((x, y), [])
+                if candidate not in paired
+                    and abs(centers[candidate][0] - mirroredX) <= tolerance
+                    and abs(centers[candidate][1] - mirroredY) <= tolerance
+            ]
+            # A key on the axis is its own mirror image
+            candidates.sort(key=lambda candidate: candidate != index)
+            match = next((
+                candidate for candidate in candidates
+                if self.pointsMatch(mirroredPoints, keyCutoutPoints[candidate][1], tolerance)
+            ), None)
+            if match is None:
+                return None
+
+            paired.update([index, match])
+            if match == index:
+                symmetry.onAxis.append(keySpaceGi)
+            elif centers[index][0] * 2 < doubleAxisX:
+                symmetry.leftHalf.append(keySpaceGi)
+            else:
+                symmetry.leftHalf.append(keyCutoutPoints[match][0])
+
+        # A layout made up of only keys on the axis has nothing to mirror
+        if not symmetry.leftHalf:
+            return None
+
+        return symmetry
+
+    # Whether every point has a point of the other list within tolerance (on both
+    # axes) and the other way around. Both are sorted by x so only the points within
+    # tolerance on the x axis are compared.
+    @staticmethod
+    def pointsMatch(points: typing.List[Key.PointUm], otherPoints: typing.List[Key.PointUm], tolerance: int) -> bool:
+        if len(points) != len(otherPoints):
+            return False
+
+        def isCovered(points: typing.List[Key.PointUm], otherPoints: typing.List[Key.PointUm]) -> bool:
+            otherPoints = sorted(otherPoints)
+            otherXs = [p.x for p in otherPoints]
+            for p in points:
+                start = bisect.bisect_left(otherXs, p.x - tolerance)
+                end = bisect.bisect_right(otherXs, p.x + tolerance)
+                if not any(abs(other.y - p.y) <= tolerance for other in otherPoints[start:end]):
+                    return False
+
+            return True
+
+        return isCovered(points, otherPoints) and isCovered(otherPoints, points)
     
     # Calculate a Convex hull using the Graham scan algorithm.
     def monotoneChain(self, polygon):
@@ -980,11 +1212,11 @@ class KeyboardQ():
         totalKeyCount = 0
         keyClass: Key.CherryMx = Key.SwitchType.GetSwitchTypeClass(self.switchType) 
         
-        for unit, count in self.keyCount.items():
+        for size, count in self.keyCount.items():
             ud = UnitCountAndDifficulty(
-                sizeInU=unit,
+                sizeInU=Key.KeyReservedSpace.FloatToU(size),
                 count=count,
-                difficulty= keyClass.difficulty(Key.KeyReservedSpace.StrToFloat(unit))
+                difficulty= keyClass.difficulty(size)
             )
             keyDifficulties.append(ud)
             totalKeyCount += count
@@ -1006,11 +1238,11 @@ class KeyboardQ():
         totalStabCount = 0
         keyClass: Key.BaseKey = Key.SwitchType.GetSwitchTypeClass(self.switchType)
         
-        for unit, count in self.stabCount.items():
+        for size, count in self.stabCount.items():
             ud = UnitCountAndDifficulty(
-                sizeInU = unit,
+                sizeInU = Key.KeyReservedSpace.FloatToU(size),
                 count = count,
-                difficulty = keyClass.difficulty(Key.KeyReservedSpace.StrToFloat(unit))
+                difficulty = keyClass.difficulty(size)
             )
             stabDifficulties.append(ud)
             totalStabCount += count
@@ -1023,24 +1255,16 @@ class KeyboardQ():
         )
         return stabDifficultyReport
 
+    # Counts are keyed by size as a float, the 'u' strings are only created
+    # when the reports are made. Every key of 2u and up counts as a stabilizer of
+    # its own size, apart from those a 2u stabilizer is used for.
     def __incrementKeyAndStabCount(self, keyReservedSpace: Key.KeyReservedSpace):
-        # Variable names need to start with a letter (not a number)
-        floatBiggestSize = keyReservedSpace.getBiggestSize()
-        size = keyReservedSpace.FloatToU(floatBiggestSize)
+        size = keyReservedSpace.getBiggestSize()
+        self.keyCount[size] = self.keyCount.get(size, 0) + 1
 
-        if size in self.keyCount:
-            self.keyCount[size] += 1
-        else:
-            self.keyCount[size] = 1
-
-        if floatBiggestSize >= 2:
-            realStabSize = size
-            if Key.Stabilizer.Size.Is2uStabilised(floatBiggestSize):
-                realStabSize = '2u'
-            if realStabSize in self.stabCount:
-                self.stabCount[realStabSize] += 1
-            else:
-                self.stabCount[realStabSize] = 1
+        if Key.Stabilizer.Size.ShouldBeStabilised(size):
+            stabSize = 2 if Key.Stabilizer.Size.Is2uStabilised(size) else size
+            self.stabCount[stabSize] = self.stabCount.get(stabSize, 0) + 1
 
     def hasRightAngles(self):
         return self.allCornersAreEqual() and self.cornerRadiusTopLeft == 0
@@ -0,0 +1,232 @@
+# Cuts the key cutouts out of the plate in tiles, each tile in its own headless
+# FreeCADCmd process so the (single threaded) booleans run in parallel.
+#
+# The plate is split into vertical strips along gaps between the cutouts, so no
+# cutout ever crosses a tile border. The tiles are passed to the workers as BREP
+# files, the job file is handed over through the JOB_ENV environment variable.
+import os
+import sys
+import json
+import shutil
+import subprocess
+import tempfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+import FreeCAD
+import Part
+
+JOB_ENV = 'KEYBOARD_GENERATOR_TILE_JOB'
+
+# The tool shape for cutting all cutouts at once. A compound of overlapping faces
+# intersects itself, which the cut can't handle, so those are fused first.
+def CombineCutouts(cutoutFaces: List[Part.Face], disjoint: bool) -> Part.Shape:
+    if disjoint or len(cutoutFaces) == 1:
+        return Part.makeCompound(cutoutFaces)
+
+    return cutoutFaces[0].multiFuse(cutoutFaces[1:])
+
+# A single (2D) boolean of the plate face and all cutouts, extruded once.
+# disjoint tells whether the cutouts are known not to overlap (cutoutsOverlap()).
+def CutSerial(
+    plateFace: Part.Face, cutoutFaces: List[Part.Face], thickness: float, disjoint: bool = False
+) -> Part.Shape:
+    if cutoutFaces:
+        plateFace = plateFace.cut(CombineCutouts(cutoutFaces, disjoint))
+
+    return plateFace.extrude(FreeCAD.Vector(0, 0, thickness))
+
+def FindFreeCADCmd() -> str:
+    binFolder = os.path.join(FreeCAD.getHomePath(), 'bin')
+    for name in ['FreeCADCmd.exe', 'FreeCADCmd', 'freecadcmd']:
+        path = os.path.join(binFolder, name)
+        if os.path.isfile(path):
+            return path
+
+    return shutil.which('FreeCADCmd') or shutil.which('freecadcmd')
+
+# Splits the plate in (at most) tileCount vertical strips with about the same number
+# of cutouts in each. Strips are only split where no cutout spans the x coordinate.
+def SplitIntoTiles(
+    plateFace: Part.Face, cutoutFaces: List[Part.Face], tileCount: int
+) -> List[Tuple[Part.Shape, List[Part.Face]]]:
+    cutoutFaces = sorted(cutoutFaces, key=lambda face: (face.BoundBox.XMin, face.BoundBox.YMin))
+
+    # x coordinates in the middle of the gaps between cutouts, along with the
+    # number of cutouts left of them
+    gaps: List[Tuple[float, int]] = []
+    spanEnd = None
+    for i, face in enumerate(cutoutFaces):
+        if spanEnd is not None and face.BoundBox.XMin > spanEnd:
+            gaps.append(((spanEnd + face.BoundBox.XMin) / 2, i))
+        spanEnd = face.BoundBox.XMax if spanEnd is None else max(spanEnd, face.BoundBox.XMax)
+
+    # Pick the gaps closest to an even split
+    splits: List[Tuple[float, int]] = []
+    for tile in range(1, tileCount):
+        target = len(cutoutFaces) * tile / tileCount
+        candidates = [gap for gap in gaps if not splits or gap[1] > splits[-1][1]]
+        if candidates:
+            splits.append(min(candidates, key=lambda gap: abs(gap[1] - target)))
+
+    plateBox = plateFace.BoundBox
+    borders = [plateBox.XMin - 1] + [x for x, _ in splits] + [plateBox.XMax + 1]
+    firstCutouts = [0] + [i for _, i in splits] + [len(cutoutFaces)]
+    tiles = []
+    for i in range(len(borders) - 1):
+        tileRect = Part.makePlane(
+            borders[i+1] - borders[i], plateBox.YLength + 2,
+            FreeCAD.Vector(borders[i], plateBox.YMin - 1, 0)
+        )
+        tiles.append((plateFace.common(tileRect), cutoutFaces[firstCutouts[i]:firstCutouts[i+1]]))
+
+    return tiles
+
+# What's wrong with the tiles of SplitIntoTiles, empty if nothing is. The tiles have
+# to be side by side and cover the whole plate, every cutout has to be in exactly
+# one tile and within its x range.
+def GetSplitProblems(
+    plateFace: Part.Face, cutoutFaces: List[Part.Face], tiles: List[Tuple[Part.Shape, List[Part.Face]]]
+) -> List[str]:
+    problems = []
+    tileBoxes = [tileFace.BoundBox for tileFace, _ in tiles]
+    plateBox = plateFace.BoundBox
+    if abs(tileBoxes[0].XMin - plateBox.XMin) > 1e-6 or abs(tileBoxes[-1].XMax - plateBox.XMax) > 1e-6:
+        problems.append('the tiles don\'t cover the plate')
+    for i, (box, nextBox) in enumerate(zip(tileBoxes, tileBoxes[1:])):
+        if abs(box.XMax - nextBox.XMin) > 1e-6:
+            problems.append(f'tile {i} and {i + 1} don\'t meet')
+
+    tiledIds = Counter(id(cutout) for _, tileCutouts in tiles for cutout in tileCutouts)
+    missing = sum(1 for cutout in cutoutFaces if id(cutout) not in tiledIds)
+    duplicated = sum(count - 1 for count in tiledIds.values())
+    if missing or duplicated:
+        problems.append(f'{missing} cutouts missing from the tiles, {duplicated} in more than one tile')
+    for i, ((_, tileCutouts), box) in enumerate(zip(tiles, tileBoxes)):
+        crossing = [
+            cutout for cutout in tileCutouts
+            if cutout.BoundBox.XMin < box.XMin or cutout.BoundBox.XMax > box.XMax
+        ]
+        if crossing:
+            problems.append(f'{len(crossing)} cutouts cross the border of tile {i}')
+
+    return problems
+
+# Same result as CutSerial, the cuts of the tiles are done by tileCount FreeCADCmd
+# processes and fused back into a single solid. Falls back to CutSerial when
+# FreeCADCmd can't be found or a worker fails, returns None then if not fallBack.
+#
+# The workers run workerCommand with the path of this file added, FreeCADCmd if None.
+# Overlapping cutouts never cross a tile border, so every tile fuses its own.
+def CutParallel(
+    plateFace: Part.Face, cutoutFaces: List[Part.Face], thickness: float, tileCount: int,
+    workerCommand: List[str] = None, disjoint: bool = False, fallBack: bool = True
+) -> Optional[Part.Shape]:
+    if workerCommand is None:
+        freeCADCmd = FindFreeCADCmd()
+        if not freeCADCmd:
+            if not fallBack:
+                FreeCAD.Console.PrintError("FreeCADCmd not found\n")
+                return None
+            FreeCAD.Console.PrintWarning("FreeCADCmd not found, cutting the plate in a single process\n")
+            return CutSerial(plateFace, cutoutFaces, thickness, disjoint)
+        workerCommand = [freeCADCmd]
+
+    tiles = SplitIntoTiles(plateFace, cutoutFaces, tileCount)
+    jobFolder = tempfile.mkdtemp(prefix='keyboard-generator-')
+    try:
+        jobPaths = []
+        for i, (tileFace, tileCutouts) in enumerate(tiles):
+            job = {
+                'plate': os.path.join(jobFolder, f'tile{i}-plate.brep'),
+                'cutouts': os.path.join(jobFolder, f'tile{i}-cutouts.brep'),
+                'result': os.path.join(jobFolder, f'tile{i}-result.brep'),
+                'thickness': thickness,
+                'disjoint': disjoint,
+            }
+            tileFace.exportBrep(job['plate'])
+            Part.makeCompound(tileCutouts).exportBrep(job['cutouts'])
+            jobPath = os.path.join(jobFolder, f'tile{i}.json')
+            with open(jobPath, 'w') as file:
+                json.dump(job, file)
+            jobPaths.append((jobPath, job['result']))
+
+        def runWorker(jobPath: str) -> subprocess.CompletedProcess:
+            env = dict(os.environ, **{JOB_ENV: jobPath})
+            return subprocess.run(
+                workerCommand + [os.path.abspath(__file__)], env=env, capture_output=True, text=True
+            )
+
+        with ThreadPoolExecutor(max_workers=len(jobPaths)) as pool:
+            processes = list(pool.map(runWorker, [jobPath for jobPath, _ in jobPaths]))
+
+        solids = []
+        for process, (_, resultPath) in zip(processes, jobPaths):
+            if process.returncode != 0 or not os.path.isfile(resultPath):
+                if not fallBack:
+                    FreeCAD.Console.PrintError(f"Tile worker failed\n{process.stderr}\n")
+                    return None
+                FreeCAD.Console.PrintError(
+                    f"Tile worker failed, cutting the plate in a single process\n{process.stderr}\n"
+                )
+                return CutSerial(plateFace, cutoutFaces, thickness, disjoint)
+            solid = Part.Shape()
+            solid.importBrep(resultPath)
+            solids.append(solid)
+    finally:
+        shutil.rmtree(jobFolder, ignore_errors=True)
+
+    if len(solids) == 1:
+        return solids[0]
+
+    # Stitch the tiles back together, removeSplitter() merges the faces split by the tile borders
+    return solids[0].multiFuse(solids[1:]).removeSplitter()
+
+# How the volume and bounding box of a tiled cut differ from those of the serial cut
+def GetCutDifferences(serialShape: Part.Shape, parallelShape: Part.Shape) -> List[str]:
+    differences = []
+    if abs(serialShape.Volume - parallelShape.Volume) >= 1e-6 * max(serialShape.Volume, 1):
+        differences.append(f'volume {parallelShape.Volume:.4f} (serial {serialShape.Volume:.4f})')
+
+    serialBox, parallelBox = serialShape.BoundBox, parallelShape.BoundBox
+    for name in ['XMin', 'XMax', 'YMin', 'YMax', 'ZMin', 'ZMax']:
+        if abs(getattr(serialBox, name) - getattr(parallelBox, name)) > 1e-6:
+            differences.append(f'{name} {getattr(parallelBox, name):.4f} (serial {getattr(serialBox, name):.4f})')
+
+    return differences
+
+# Cuts the plate serially as well and compares the volume, bounding box and face count of both.
+def CompareWithSerial(
+    parallelShape: Part.Shape, plateFace: Part.Face, cutoutFaces: List[Part.Face], thickness: float,
+    disjoint: bool = False
+) -> bool:
+    serialShape = CutSerial(plateFace, cutoutFaces, thickness, disjoint).removeSplitter()
+    differences = GetCutDifferences(serialShape, parallelShape)
+    if len(serialShape.Faces) != len(parallelShape.Faces):
+        differences.append(f'faces {len(parallelShape.Faces)} (serial {len(serialShape.Faces)})')
+
+    if differences:
+        FreeCAD.Console.PrintError(f"Tiled cut differs: {', '.join(differences)}\n")
+    else:
+        FreeCAD.Console.PrintMessage(
+            f"Tiled cut: volume {parallelShape.Volume:.4f}, faces {len(parallelShape.Faces)}, same as serial\n"
+        )
+
+    return not differences
+
+def RunJob(jobPath: str):
+    with open(jobPath) as file:
+        job = json.load(file)
+
+    plateFace = Part.Shape()
+    plateFace.importBrep(job['plate'])
+    cutouts = Part.Shape()
+    cutouts.importBrep(job['cutouts'])
+
+    result = CutSerial(plateFace, cutouts.Faces, job['thickness'], job['disjoint'])
+    result.exportBrep(job['result'])
+
+# Executed by FreeCADCmd as a tile worker
+if __name__ == '__main__' and JOB_ENV in os.environ:
+    RunJob(os.environ[JOB_ENV])
+    sys.exit(0)
@@ -0,0 +1,462 @@
+# Generates a couple of layouts in every generation mode against the stand-in
+# FreeCAD modules of this folder (so without FreeCAD, PySide2 is still needed)
+# and checks the number of objects, constraints, Sketcher calls, expressions and
+# recomputes against those recorded in baseline.json:
+#
+#   python KeyboardGenerator/freecad_standin/Benchmark.py [--layout my-layout.json5 ...]
+#
+# Exits with 1 if any of them went up, or if what FreeCADKeyboard.estimateCost()
+# predicted isn't what was built. Times are printed but not checked, they're those
+# of the Python side only. After a change that's meant to add objects, constraints
+# etc. the figures are recorded again with --save-baseline (which checks nothing
+# against the earlier ones):
+#
+#   python KeyboardGenerator/freecad_standin/Benchmark.py --save-baseline KeyboardGenerator/freecad_standin/baseline.json
+#
+# Every layout is also built the way it was before there were generation modes
+# (BASELINE_SCENARIO), the other scenarios are compared with it.
+#
+# The plate of every layout is also cut in tiles by TiledCut.CutParallel, with
+# Python running the stand-ins as the tile workers, and compared with the serial
+# cut (the strips and the bounding box, the stand-ins have no volume). So is the
+# fallback to the serial cut when a worker fails.
+#
+# Layouts with overlapping cutouts are built with every fuse tree leaf size of
+# CommandLine.FUSION_LEAF_SIZES, each tree has to fuse the same cutouts as the flat
+# Part::MultiFuse (leaf size 0), every one of them once, with no more than a leaf
+# size per fuse. CommandLine.py --compare-fusion compares times and volumes in FreeCAD.
+#
+# The first layout is also built with a footprint library, cancelled halfway and
+# completed. A cancelled build has to leave the library as it was, an older
+# version of the library is never removed.
+#
+# The first layout is also generated SOAK_RUNS times by CommandLine.py --soak, which
+# fails if the number of open documents or Python objects grows from run to run.
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+standInFolder = os.path.dirname(os.path.abspath(__file__))
+for folder in [os.path.dirname(standInFolder), standInFolder]:
+    if folder in sys.path:
+        sys.path.remove(folder)
+    # The stand-in modules have to come before FreeCAD's own, if it's installed
+    sys.path.insert(0, folder)
+
+# The tile workers of TiledCut have to import the stand-ins as well
+os.environ['PYTHONPATH'] = os.pathsep.join(
+    [standInFolder] + ([os.environ['PYTHONPATH']] if os.environ.get('PYTHONPATH') else [])
+)
+
+import Recorder
+import FreeCAD
+import CommandLine # Creates the QApplication
+import KeyboardQ
+import TiledCut
+import CostEstimate
+import FootprintLibrary
+from pykle_serial import serial
+
+@dataclass
+class Scenario():
+    name: str
+    # Overrides of CommandLine.DEFAULTS
+    settings: dict
+
+SCENARIOS = [
+    # A clone (or a point array with its position sketch) per key group, every key
+    # position constrained to the plate
+    Scenario('Constrained, Draft clones', {
+        'generationMode': KeyboardQ.GenerationMode.CONSTRAINED.value,
+        'placementBackend': KeyboardQ.PlacementBackend.DRAFT.value,
+    }),
+    # Only the left half of symmetric layouts (the split one) is built, the rest is the same
+    Scenario('Constrained, mirror symmetric', {
+        'generationMode': KeyboardQ.GenerationMode.CONSTRAINED.value,
+        'placementBackend': KeyboardQ.PlacementBackend.DRAFT.value,
+        'mirrorSymmetric': True,
+    }),
+    # No constraints, expressions or addExternal calls per key
+    Scenario('Placement only, Draft clones', {
+        'generationMode': KeyboardQ.GenerationMode.PLACEMENT_ONLY.value,
+        'placementBackend': KeyboardQ.PlacementBackend.DRAFT.value,
+    }),
+    # Only the footprints lines are constrained, with a single constraint each
+    Scenario('Placement only, rigid footprints', {
+        'generationMode': KeyboardQ.GenerationMode.PLACEMENT_ONLY.value,
+        'placementBackend': KeyboardQ.PlacementBackend.DRAFT.value,
+        'rigidFootprints': True,
+    }),
+    # A link array per footprint instead of an object per key (group)
+    Scenario('Placement only, Link arrays', {
+        'generationMode': KeyboardQ.GenerationMode.PLACEMENT_ONLY.value,
+        'placementBackend': KeyboardQ.PlacementBackend.LINK_ARRAY.value,
+    }),
+    # A single Part::Feature, no sketches at all
+    Scenario('Direct shape', {
+        'generationMode': KeyboardQ.GenerationMode.DIRECT_SHAPE.value,
+    }),
+]
+
+# Every key position constrained, how plates were generated before there were generation modes
+BASELINE_SCENARIO = SCENARIOS[0]
+
+# The figures the counts may not exceed, recorded by --save-baseline
+RECORDED_FIGURES_PATH = os.path.join(standInFolder, 'baseline.json')
+
+# Numbers of tiles the plates are cut in by CheckTiledCut
+TILE_COUNTS = [2, 4]
+# A tile worker that always fails
+FAILING_WORKER = [sys.executable, '-c', 'import sys; sys.exit(1)']
+
+# Number of runs of CheckSoak, per generation mode
+SOAK_RUNS = 10
+
+# Full size ANSI, 104 keys
+ANSI_104 = '''
+["",{x:1},"","","","",{x:0.5},"","","","",{x:0.5},"","","","",{x:0.25},"","",""],
+[{y:0.5},"","","","","","","","","","","","","",{w:2},"",{x:0.25},"","","",{x:0.25},"","","",""],
+[{w:1.5},"","","","","","","","","","","","","",{w:1.5},"",{x:0.25},"","","",{x:0.25},"","","",{h:2},""],
+[{w:1.75},"","","","","","","","","","","","",{w:2.25},"",{x:3.5},"","",""],
+[{w:2.25},"","","","","","","","","","","",{w:2.75},"",{x:1.25},"",{x:1.25},"","","",{h:2},""],
+[{w:1.25},"",{w:1.25},"",{w:1.25},"",{w:6.25},"",{w:1.25},"",{w:1.25},"",{w:1.25},"",{w:1.25},"",{x:0.25},"","","",{x:0.25,w:2},"",""]
+'''
+
+ANSI_60 = '''
+["","","","","","","","","","","","","",{w:2},""],
+[{w:1.5},"","","","","","","","","","","","","",{w:1.5},""],
+[{w:1.75},"","","","","","","","","","","","",{w:2.25},""],
+[{w:2.25},"","","","","","","","","","","",{w:2.75},""],
+[{w:1.25},"",{w:1.25},"",{w:1.25},"",{w:6.25},"",{w:1.25},"",{w:1.25},"",{w:1.25},"",{w:1.25},""]
+'''
+
+# Two mirrored halves of 4 by 6 keys with a rotated thumb cluster each
+def CreateSplitLayout() -> str:
+    rows = [[''] * 6 + [{'x': 3}] + [''] * 6 for _ in range(4)]
+    rows.append([{'r': 15, 'rx': 4, 'ry': 4.5}, '', '', ''])
+    rows.append([{'r': -15, 'rx': 11, 'ry': 4.5, 'x': -3}, '', '', ''])
+    return json.dumps(rows)
+
+def CreateGridLayout(rowCount: int, columnCount: int) -> str:
+    return json.dumps([[''] * columnCount for _ in range(rowCount)])
+
+# Keys half a unit apart, so the cutouts of neighbouring keys overlap and get fused
+def CreateOverlappingLayout(rowCount: int, columnCount: int) -> str:
+    return json.dumps([[''] + [{'x': -0.5}, ''] * (columnCount - 1) for _ in range(rowCount)])
+
+def GetBuiltInLayouts() -> List[Tuple[str, str]]:
+    with open(os.path.join(os.path.dirname(standInFolder), 'kg-logo.json'), encoding='utf-8') as file:
+        kgLogo = file.read()
+
+    return [
+        ('kg-logo', kgLogo),
+        ('ANSI 60%', ANSI_60),
+        ('ANSI 104', ANSI_104),
+        ('Split', CreateSplitLayout()),
+        ('Grid 10x50', CreateGridLayout(10, 50)),
+        ('Overlapping', CreateOverlappingLayout(4, 20)),
+        ('Grid 20x50', CreateGridLayout(20, 50)),
+    ]
+
+def GetMetrics(counts: Counter) -> Dict[str, int]:
+    return {
+        'objects':        counts['addObject'],
+        'constraints':    counts['constraints'],
+        'sketcher calls': counts['addGeometry'] + counts['addConstraint'] + counts['addExternal'],
+        'expressions':    counts['setExpression'],
+        'recomputes':     counts['recompute'],
+    }
+
+# Estimated and built counts that have to be the same, see CostEstimate
+def GetEstimateMismatches(estimate: CostEstimate.CostEstimate, counts: Counter) -> List[str]:
+    pairs = [
+        ('objects', estimate.objectCount, counts['addObject']),
+        ('sketches', estimate.sketchCount, counts['addObject Sketcher::SketchObject']),
+        ('clones', estimate.cloneCount, counts['make_clone']),
+        ('point arrays', estimate.pointArrayCount, counts['make_point_array']),
+    ]
+    return [f'{name}: {estimated} estimated, {built} built' for name, estimated, built in pairs if estimated != built]
+
+# Generates the layout in a new document, returns the number of keys, the time it
+# took, the metrics and how the estimate differed from what was built
+def Run(layout: str, scenario: Scenario) -> Tuple[int, float, Dict[str, int], List[str]]:
+    keyboard = CommandLine.CreateFreeCADKeyboard(dict(CommandLine.DEFAULTS, measureSolver=True, **scenario.settings))
+    keyboard.getScene(serial.parse(KeyboardQ.AddArrayIfNeeded(layout)))
+    keyCount = len(keyboard.getKeyReservedSpaceGis())
+    estimate = keyboard.estimateCost()
+
+    doc = FreeCAD.newDocument('Benchmark')
+    body = None
+    if keyboard.generationMode != KeyboardQ.GenerationMode.DIRECT_SHAPE:
+        body = doc.addObject('PartDesign::Body', 'KeyboardPlateBody')
+    # Only what createSketches() adds, like the estimate and BuildProfiler
+    Recorder.Reset()
+    startTime = time.perf_counter()
+    keyboard.createSketches(doc, body)
+    elapsed = time.perf_counter() - startTime
+    metrics = GetMetrics(Recorder.counts)
+    mismatches = GetEstimateMismatches(estimate, Recorder.counts)
+    FreeCAD.closeDocument(doc.Name)
+
+    return keyCount, elapsed, metrics, mismatches
+
+# Cuts the direct shape plate of the layout serially and in tiles, returns how
+# the tiles and the results differ. A failing worker has to fall back to the
+# serial cut, with a single error. Overlapping cutouts have to be fused before
+# the serial cut, disjoint ones not.
+def CheckTiledCut(layout: str) -> List[str]:
+    keyboard = CommandLine.CreateFreeCADKeyboard(dict(
+        CommandLine.DEFAULTS, generationMode=KeyboardQ.GenerationMode.DIRECT_SHAPE.value
+    ))
+    keyboard.getScene(serial.parse(KeyboardQ.AddArrayIfNeeded(layout)))
+    plateFace, cutoutFaces = keyboard.getDirectShapeFaces()
+    thickness = keyboard.thickness
+    disjoint = not keyboard.cutoutsOverlap()
+    Recorder.Reset()
+    serialShape = TiledCut.CutSerial(plateFace, cutoutFaces, thickness, disjoint)
+
+    problems = []
+    if bool(Recorder.counts['fuse']) == disjoint:
+        problems.append(f'serial cut: {Recorder.counts["fuse"]} fuses of {"disjoint" if disjoint else "overlapping"} cutouts')
+    for tileCount in TILE_COUNTS:
+        tiles = TiledCut.SplitIntoTiles(plateFace, cutoutFaces, tileCount)
+        splitProblems = TiledCut.GetSplitProblems(plateFace, cutoutFaces, tiles)
+        problems += [f'{tileCount} tiles: {problem}' for problem in splitProblems]
+
+        Recorder.Reset()
+        parallelShape = TiledCut.CutParallel(
+            plateFace, cutoutFaces, thickness, tileCount, [sys.executable], disjoint
+        )
+        if Recorder.counts['PrintError'] or Recorder.counts['importBrep'] != len(tiles):
+            problems.append(
+                f'{tileCount} tiles: {Recorder.counts["importBrep"]} of {len(tiles)} tiles were cut by a worker'
+            )
+        differences = TiledCut.GetCutDifferences(serialShape, parallelShape)
+        problems += [f'{tileCount} tiles: {difference}' for difference in differences]
+
+    Recorder.Reset()
+    Recorder.expectProblems = True
+    fallbackShape = TiledCut.CutParallel(
+        plateFace, cutoutFaces, thickness, TILE_COUNTS[0], FAILING_WORKER, disjoint
+    )
+    Recorder.expectProblems = False
+    if Recorder.counts['PrintError'] != 1 or Recorder.counts['importBrep']:
+        problems.append(
+            f'failing worker: {Recorder.counts["PrintError"]} errors, {Recorder.counts["importBrep"]} tiles imported'
+        )
+    differences = TiledCut.GetCutDifferences(serialShape, fallbackShape)
+    problems += [f'failing worker: {difference}' for difference in differences]
+
+    return problems
+
+# Builds the layout with every fuse tree leaf size and returns how the trees differ
+# from the flat fuse. Nothing is checked for layouts whose cutouts don't overlap.
+def CheckFuseTree(layout: str) -> List[str]:
+    problems = []
+    flatCutouts = None
+    for leafSize in CommandLine.FUSION_LEAF_SIZES:
+        keyboard = CommandLine.CreateFreeCADKeyboard(dict(CommandLine.DEFAULTS, fuseTreeLeafSize=leafSize))
+        keyboard.getScene(serial.parse(KeyboardQ.AddArrayIfNeeded(layout)))
+        if not keyboard.cutoutsOverlap():
+            return []
+        # A clone per key, a point array would be a single cutout
+        keyboard.cloneCap = len(keyboard.getKeyReservedSpaceGis())
+
+        doc = FreeCAD.newDocument('FuseTree')
+        keyboard.createSketches(doc, doc.addObject('PartDesign::Body', 'KeyboardPlateBody'))
+        fuses = [obj for obj in doc.Objects if obj.TypeId == 'Part::MultiFuse']
+        cutouts = sorted(shape.Name for fuse in fuses for shape in fuse.Shapes if shape.TypeId != 'Part::MultiFuse')
+        FreeCAD.closeDocument(doc.Name)
+
+        if len(fuses) != keyboard.getFuseTreeSize(len(cutouts)):
+            problems.append(
+                f'leaf size {leafSize}: {len(fuses)} fuses, {keyboard.getFuseTreeSize(len(cutouts))} expected'
+            )
+        if leafSize and any(len(fuse.Shapes) > max(leafSize, 2) for fuse in fuses):
+            problems.append(f'leaf size {leafSize}: fuses of more than {leafSize} shapes')
+        if len(set(cutouts)) != len(cutouts):
+            problems.append(f'leaf size {leafSize}: cutouts fused more than once')
+        if flatCutouts is None:
+            flatCutouts = cutouts
+        elif cutouts != flatCutouts:
+            problems.append(f'leaf size {leafSize}: fuses other cutouts than the flat fuse')
+
+    return problems
+
+# Builds the layout with a footprint library, cancelled in the phase after the footprints
+# were added to it and completed, once with a new library and once with an existing one.
+# Returns what's left of a cancelled build in the library and older versions that were removed.
+def CheckFootprintLibrary(layout: str) -> List[str]:
+    problems = []
+    with tempfile.TemporaryDirectory() as folder:
+        keyboard = CommandLine.CreateFreeCADKeyboard(dict(CommandLine.DEFAULTS, footprintLibrary=folder))
+        keyboard.getScene(serial.parse(KeyboardQ.AddArrayIfNeeded(layout)))
+        library = FootprintLibrary.FootprintLibrary(
+            folder, keyboard.switchType, keyboard.stabilizerType, keyboard.kerf, keyboard.thickness
+        )
+        outdatedPath = os.path.join(folder, library.getFileNamePrefix() + '_outdated.FCStd')
+        open(outdatedPath, 'w').close()
+
+        for existing in [False, True]:
+            if existing:
+                # The stand-in opens it as an empty document
+                open(library.getFilePath(), 'w').close()
+            for cancel in [True, False]:
+                doc = FreeCAD.newDocument('FootprintLibraryCheck')
+                Recorder.expectProblems = True
+                chunks = keyboard.createSketchesInChunks(doc, doc.addObject('PartDesign::Body', 'KeyboardPlateBody'))
+                for progress in chunks:
+                    if cancel and progress.phase == 'Extrudes':
+                        chunks.close()
+                Recorder.expectProblems = False
+                FreeCAD.closeDocument(doc.Name)
+
+                libraryDocs = [
+                    libraryDoc for libraryDoc in FreeCAD.listDocuments().values()
+                    if libraryDoc.FileName == library.getFilePath()
+                ]
+                footprintCount = sum(len(libraryDoc.Objects) for libraryDoc in libraryDocs)
+                name = f'{"existing" if existing else "new"} library, {"cancelled" if cancel else "completed"}'
+                if cancel and footprintCount:
+                    problems.append(f'{name}: {footprintCount} objects of the cancelled build kept in the library')
+                if cancel and not existing and libraryDocs:
+                    problems.append(f'{name}: the library created by the cancelled build was kept')
+                if not cancel and not footprintCount:
+                    problems.append(f'{name}: the library has no footprints')
+                if not os.path.isfile(outdatedPath):
+                    problems.append(f'{name}: an older version of the library was removed')
+                for libraryDoc in libraryDocs:
+                    FreeCAD.closeDocument(libraryDoc.Name)
+
+    return problems
+
+# Runs CommandLine.py --soak on the layout in every generation mode, returns the modes
+# that left documents or Python objects behind
+def CheckSoak(layout: str) -> List[str]:
+    problems = []
+    with tempfile.TemporaryDirectory() as folder:
+        layoutPath = os.path.join(folder, 'soak.json')
+        with open(layoutPath, 'w', encoding='utf-8') as file:
+            file.write(layout)
+        for generationMode in KeyboardQ.GenerationMode:
+            args = CommandLine.CreateArgumentParser().parse_args(
+                ['--layout', layoutPath, '--generation-mode', generationMode.value, '--soak', str(SOAK_RUNS)]
+            )
+            Recorder.Reset()
+            if CommandLine.Soak(args, args.soak) != 0:
+                problems.append(f'{generationMode.value}: {Recorder.counts["PrintError"]} errors in {SOAK_RUNS} runs')
+
+    return problems
+
+# '300 -> 280 (93%)'
+def FormatChange(before: float, after: float, unit: str = '') -> str:
+    change = f' ({after / before:.0%})' if before else ''
+    return f'{before:g}{unit} -> {after:g}{unit}{change}'
+
+# Lines comparing every scenario of a layout with BASELINE_SCENARIO, results
+# are (time, metrics) by scenario name
+def GetBaselineComparison(layoutName: str, results: Dict[str, Tuple[float, Dict[str, int]]]) -> List[str]:
+    baselineTime, baselineMetrics = results[BASELINE_SCENARIO.name]
+    return [
+        f'{layoutName}, {name}: time {FormatChange(round(baselineTime, 2), round(elapsed, 2), "s")}, '
+        + ', '.join(f'{metric} {FormatChange(baselineMetrics[metric], value)}' for metric, value in metrics.items())
+        for name, (elapsed, metrics) in results.items() if name != BASELINE_SCENARIO.name
+    ]
+
+# The metrics that changed since the figures recorded by --save-baseline
+def GetRecordedChanges(recorded: dict, keyCount: int, metrics: Dict[str, int]) -> List[str]:
+    changes = [
+        f'{metric} {FormatChange(recorded["metrics"][metric], value)}'
+        for metric, value in metrics.items() if recorded['metrics'].get(metric) != value
+    ]
+    if recorded['keyCount'] != keyCount:
+        changes.insert(0, f'keys {FormatChange(recorded["keyCount"], keyCount)}')
+
+    return changes
+
+def Main() -> int:
+    parser = argparse.ArgumentParser(description='Counts what generating a plate takes, without FreeCAD')
+    parser.add_argument('--layout', nargs='+', help='KLE layouts to use instead of the built in ones')
+    parser.add_argument('--save-baseline', dest='saveBaseline', help='JSON file to record the figures of this run in')
+    parser.add_argument(
+        '--baseline', default=RECORDED_FIGURES_PATH,
+        help='JSON file recorded by --save-baseline the counts may not exceed, baseline.json by default'
+    )
+    args = parser.parse_args()
+
+    # Nothing to check against while recording
+    recordedFigures = {}
+    if not args.saveBaseline and os.path.isfile(args.baseline):
+        with open(args.baseline, encoding='utf-8') as file:
+            recordedFigures = json.load(file)
+
+    layouts = GetBuiltInLayouts()
+    if args.layout:
+        layouts = []
+        for path in args.layout:
+            with open(path, encoding='utf-8') as file:
+                layouts.append((os.path.basename(path), file.read()))
+
+    # FreeCADKeyboard prints the sketcher calls and build profile of every run
+    Recorder.quiet = True
+    metricNames = list(GetMetrics(Counter()).keys())
+    print(f"{'Layout':<14}{'Mode':<34}{'Keys':>6}{'Time':>9}" + ''.join(f'{name:>16}' for name in metricNames))
+    failures = []
+    comparisons = []
+    recordedChanges = []
+    figures = {}
+    for layoutName, layout in layouts:
+        results = {}
+        for scenario in SCENARIOS:
+            keyCount, elapsed, metrics, mismatches = Run(layout, scenario)
+            results[scenario.name] = (elapsed, metrics)
+            figures.setdefault(layoutName, {})[scenario.name] = {'keyCount': keyCount, 'time': elapsed, 'metrics': metrics}
+            print(
+                f'{layoutName:<14}{scenario.name:<34}{keyCount:>6}{elapsed:>8.2f}s'
+                + ''.join(f'{metrics[name]:>16}' for name in metricNames)
+            )
+            recorded = recordedFigures.get(layoutName, {}).get(scenario.name)
+            if recorded:
+                changes = GetRecordedChanges(recorded, keyCount, metrics)
+                if changes:
+                    recordedChanges.append(f'{layoutName}, {scenario.name}: ' + ', '.join(changes))
+                if recorded['keyCount'] != keyCount:
+                    failures.append(f'{layoutName}, {scenario.name}: the layout has changed, record the figures again')
+                failures += [
+                    f'{layoutName}, {scenario.name}: {value} {name}, {recorded["metrics"][name]} recorded'
+                    for name, value in metrics.items()
+                    if recorded['keyCount'] == keyCount and value > recorded['metrics'].get(name, value)
+                ]
+            failures += [f'{layoutName}, {scenario.name}: {mismatch}' for mismatch in mismatches]
+        comparisons += GetBaselineComparison(layoutName, results)
+        failures += [f'{layoutName}, tiled cut: {problem}' for problem in CheckTiledCut(layout)]
+        failures += [f'{layoutName}, fuse tree: {problem}' for problem in CheckFuseTree(layout)]
+    failures += [f'{layouts[0][0]}, footprint library: {problem}' for problem in CheckFootprintLibrary(layouts[0][1])]
+    failures += [f'{layouts[0][0]}, soak: {problem}' for problem in CheckSoak(layouts[0][1])]
+
+    print(f'\nCompared with {BASELINE_SCENARIO.name}:')
+    for line in comparisons:
+        print(line)
+    if recordedFigures:
+        print(f'\nChanged since {os.path.basename(args.baseline)} was recorded:')
+        for line in recordedChanges or ['Nothing']:
+            print(line)
+
+    if args.saveBaseline:
+        with open(args.saveBaseline, 'w', encoding='utf-8') as file:
+            json.dump(figures, file, indent=4)
+        print(f'Recorded the figures in {args.saveBaseline}')
+
+    for message in failures:
+        FreeCAD.Console.PrintError(message + '\n')
+
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(Main())
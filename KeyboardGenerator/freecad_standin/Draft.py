@@ -0,0 +1,23 @@
+# Stand-in for the two Draft functions the generator uses. The objects are added to
+# the document of their base object, with the properties Draft gives them.
+import FreeCAD
+import Recorder
+
+def make_clone(obj: FreeCAD.DocumentObject) -> FreeCAD.DocumentObject:
+    Recorder.Record('make_clone', obj.Name)
+    clone = obj.Document.addObject('Part::FeaturePython', 'Clone')
+    clone.Objects = [obj]
+    clone.Scale = FreeCAD.Vector(1, 1, 1)
+    clone.Placement = obj.Placement
+
+    return clone
+
+def make_point_array(base: FreeCAD.DocumentObject, pointObject: FreeCAD.DocumentObject) -> FreeCAD.DocumentObject:
+    Recorder.Record('make_point_array', base.Name)
+    pointArray = base.Document.addObject('Part::FeaturePython', 'PointArray')
+    pointArray.Base = base
+    pointArray.PointObject = pointObject
+    pointArray.Count = len(getattr(pointObject, 'Geometry', []))
+    base.Visibility = False
+
+    return pointArray
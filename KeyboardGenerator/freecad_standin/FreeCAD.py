@@ -0,0 +1,323 @@
+# Stand-in for the parts of FreeCADs App module (imported as FreeCAD) that the
+# generator uses. Objects only hold whatever properties are assigned to them,
+# nothing is computed apart from what the generator reads back (sketch vertexes,
+# the shapes of Part::Feature objects). Calls are counted by Recorder.
+import os
+import sys
+import math
+from typing import Dict, List
+import Recorder
+
+class Vector():
+    def __init__(self, x: float = 0, y: float = 0, z: float = 0):
+        # Also takes another Vector (or a tuple), like FreeCAD does
+        if not isinstance(x, (int, float)):
+            x, y, z = tuple(x) + (0,) * (3 - len(tuple(x)))
+        self.x = float(x)
+        self.y = float(y)
+        self.z = float(z)
+
+    def __add__(self, other: 'Vector') -> 'Vector':
+        return Vector(self.x + other.x, self.y + other.y, self.z + other.z)
+
+    def __sub__(self, other: 'Vector') -> 'Vector':
+        return Vector(self.x - other.x, self.y - other.y, self.z - other.z)
+
+    # Same as FreeCAD, the dot product for two vectors and scaling otherwise
+    def __mul__(self, other):
+        if isinstance(other, Vector):
+            return self.x * other.x + self.y * other.y + self.z * other.z
+
+        return Vector(self.x * other, self.y * other, self.z * other)
+
+    def __neg__(self) -> 'Vector':
+        return Vector(-self.x, -self.y, -self.z)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Vector) and self.isEqual(other, 1e-7)
+
+    def __iter__(self):
+        return iter((self.x, self.y, self.z))
+
+    def __getitem__(self, index: int) -> float:
+        return (self.x, self.y, self.z)[index]
+
+    def __repr__(self) -> str:
+        return f'Vector ({self.x}, {self.y}, {self.z})'
+
+    @property
+    def Length(self) -> float:
+        return math.sqrt(self * self)
+
+    def isEqual(self, other: 'Vector', tolerance: float) -> bool:
+        return (self - other).Length <= tolerance
+
+    def copy(self) -> 'Vector':
+        return Vector(self.x, self.y, self.z)
+
+# Only rotations around the z axis, the only ones the generator makes
+class Rotation():
+    def __init__(self, axis: Vector = None, angle: float = 0):
+        if axis is None or axis.Length == 0:
+            axis = Vector(0, 0, 1)
+        self.Axis = axis
+        # Degrees in the constructor, radians in Angle (like FreeCAD)
+        self.Angle = math.radians(angle)
+
+    def multVec(self, vector: Vector) -> Vector:
+        angle = self.Angle if self.Axis.z >= 0 else -self.Angle
+        cos, sin = math.cos(angle), math.sin(angle)
+        return Vector(vector.x * cos - vector.y * sin, vector.x * sin + vector.y * cos, vector.z)
+
+    def isSame(self, other: 'Rotation', tolerance: float = 1e-7) -> bool:
+        xAxis = Vector(1, 0, 0)
+        return self.multVec(xAxis).isEqual(other.multVec(xAxis), tolerance)
+
+    def copy(self) -> 'Rotation':
+        rotation = Rotation(self.Axis.copy())
+        rotation.Angle = self.Angle
+        return rotation
+
+# Placement(), Placement(base, rotation) or Placement(base, axis, angle)
+class Placement():
+    def __init__(self, base: Vector = None, rotation=None, angle: float = None):
+        self.Base = base.copy() if base is not None else Vector()
+        if isinstance(rotation, Rotation):
+            self.Rotation = rotation.copy()
+        else:
+            self.Rotation = Rotation(rotation, angle or 0)
+
+    def multVec(self, vector: Vector) -> Vector:
+        return self.Rotation.multVec(vector) + self.Base
+
+    def isSame(self, other: 'Placement', tolerance: float = 1e-7) -> bool:
+        return self.Base.isEqual(other.Base, tolerance) and self.Rotation.isSame(other.Rotation, tolerance)
+
+    def copy(self) -> 'Placement':
+        return Placement(self.Base, self.Rotation)
+
+    def __repr__(self) -> str:
+        return f'Placement [Pos={tuple(self.Base)}, Angle={math.degrees(self.Rotation.Angle)}]'
+
+class Console():
+    @staticmethod
+    def PrintMessage(message: str):
+        if not Recorder.quiet:
+            sys.stdout.write(message)
+
+    @staticmethod
+    def PrintLog(message: str):
+        pass
+
+    @staticmethod
+    def PrintWarning(message: str):
+        Recorder.Record('PrintWarning', message)
+        if not Recorder.expectProblems:
+            sys.stderr.write(message)
+
+    @staticmethod
+    def PrintError(message: str):
+        Recorder.Record('PrintError', message)
+        if not Recorder.expectProblems:
+            sys.stderr.write(message)
+
+class DocumentObject():
+    def __init__(self, doc: 'Document', typeId: str, name: str):
+        self.Document = doc
+        self.TypeId = typeId
+        self.Name = name
+        self.Label = name
+        self.Visibility = True
+        # Only there when the GUI is up
+        self.ViewObject = None
+        self.Placement = Placement()
+        self.Group: List['DocumentObject'] = []
+        self.ExpressionEngine: List[tuple] = []
+
+    # Placements and vectors are copied on assignment like FreeCAD does, so an
+    # object never shares one with another
+    def __setattr__(self, name: str, value):
+        if isinstance(value, (Vector, Placement)):
+            value = value.copy()
+        super().__setattr__(name, value)
+
+    # Anything that's never assigned is empty, e.g. the Shape of an object whose
+    # shape is only computed by FreeCAD
+    def __getattr__(self, name: str):
+        if name == 'Shape':
+            import Part
+            self.Shape = Part.Shape()
+            return self.Shape
+
+        raise AttributeError(f"'{self.TypeId}' object has no attribute '{name}'")
+
+    def setExpression(self, path: str, expression: str):
+        Recorder.Record('setExpression', f'{self.Name}{path} = {expression}')
+        self.ExpressionEngine = [entry for entry in self.ExpressionEngine if entry[0] != path]
+        if expression is not None:
+            self.ExpressionEngine.append((path, expression))
+
+    def recompute(self, recursive: bool = False) -> bool:
+        Recorder.Record('recompute', self.Name)
+        return True
+
+    # Adds an object to the document and to this (group like) object, e.g. a body
+    def newObject(self, typeId: str, name: str) -> 'DocumentObject':
+        obj = self.Document.addObject(typeId, name)
+        self.Group = self.Group + [obj]
+        return obj
+
+    def getLinkedObject(self, recursive: bool = True) -> 'DocumentObject':
+        linked = self.__dict__.get('LinkedObject')
+        if linked is None:
+            return self
+
+        return linked.getLinkedObject(recursive) if recursive else linked
+
+    def isValid(self) -> bool:
+        return self.Document is not None
+
+    def __repr__(self) -> str:
+        return f'<{self.TypeId} object {self.Name}>'
+
+class Document():
+    def __init__(self, name: str, label: str = None, hidden: bool = False):
+        self.Name = name
+        self.Label = label or name
+        self.Hidden = hidden
+        self.FileName = ''
+        self.RecomputesFrozen = False
+        self.Objects: List[DocumentObject] = []
+        self.__meta: Dict[str, str] = {}
+        self.__objectsByName: Dict[str, DocumentObject] = {}
+        # Objects at the time the transaction was opened, None when there's none open
+        self.__transactionObjects: List[DocumentObject] = None
+
+    # A copy, like FreeCAD it has to be assigned back for changes to stick
+    @property
+    def Meta(self) -> Dict[str, str]:
+        return dict(self.__meta)
+
+    @Meta.setter
+    def Meta(self, meta: Dict[str, str]):
+        self.__meta = {str(key): str(value) for key, value in meta.items()}
+
+    # Same naming scheme as FreeCAD, Name, Name001, Name002 and so on
+    def getUniqueObjectName(self, name: str) -> str:
+        if name not in self.__objectsByName:
+            return name
+
+        base = name.rstrip('0123456789')
+        number = 1
+        while f'{base}{number:03d}' in self.__objectsByName:
+            number += 1
+
+        return f'{base}{number:03d}'
+
+    def addObject(self, typeId: str, name: str = None) -> DocumentObject:
+        name = self.getUniqueObjectName(name or typeId.split('::')[-1])
+        Recorder.Record('addObject', f'{typeId} {name}')
+        Recorder.Record(f'addObject {typeId}', name)
+        if typeId == 'Sketcher::SketchObject':
+            import Sketcher
+            obj = Sketcher.SketchObject(self, typeId, name)
+        else:
+            obj = DocumentObject(self, typeId, name)
+        self.Objects.append(obj)
+        self.__objectsByName[name] = obj
+
+        return obj
+
+    def getObject(self, name: str) -> DocumentObject:
+        return self.__objectsByName.get(name)
+
+    def getObjectsByLabel(self, label: str) -> List[DocumentObject]:
+        return [obj for obj in self.Objects if obj.Label == label]
+
+    def removeObject(self, name: str):
+        Recorder.Record('removeObject', name)
+        obj = self.__objectsByName.pop(name, None)
+        if obj is not None:
+            self.Objects.remove(obj)
+            obj.Document = None
+
+    # Takes the same arguments as FreeCAD (objects, force, checkCycle) and ignores them
+    def recompute(self, *args) -> int:
+        Recorder.Record('recompute', self.Name)
+        return 0
+
+    def openTransaction(self, name: str = ''):
+        Recorder.Record('openTransaction', name)
+        self.__transactionObjects = list(self.Objects)
+
+    def commitTransaction(self):
+        Recorder.Record('commitTransaction')
+        self.__transactionObjects = None
+
+    # Undoes adding and removing objects, property changes aren't rolled back
+    def abortTransaction(self):
+        Recorder.Record('abortTransaction')
+        if self.__transactionObjects is None:
+            return
+
+        self.Objects = self.__transactionObjects
+        self.__objectsByName = {obj.Name: obj for obj in self.Objects}
+        for obj in self.Objects:
+            obj.Document = self
+        self.__transactionObjects = None
+
+    # Nothing is written, the stand-in can't save documents
+    def save(self):
+        Recorder.Record('save', self.FileName)
+
+    def saveAs(self, filePath: str):
+        self.FileName = filePath
+        self.save()
+
+    def __repr__(self) -> str:
+        return f'<Document {self.Name}>'
+
+documents: Dict[str, Document] = {}
+ActiveDocument: Document = None
+GuiUp = False
+
+def newDocument(name: str = 'Unnamed', label: str = None, hidden: bool = False, temp: bool = False) -> Document:
+    global ActiveDocument
+    uniqueName = name
+    number = 1
+    while uniqueName in documents:
+        uniqueName = f'{name}{number}'
+        number += 1
+
+    doc = Document(uniqueName, label or name, hidden)
+    documents[uniqueName] = doc
+    if not hidden:
+        ActiveDocument = doc
+
+    return doc
+
+# There's nothing to read, the document comes back empty
+def openDocument(filePath: str, hidden: bool = False) -> Document:
+    doc = newDocument(os.path.splitext(os.path.basename(filePath))[0], hidden=hidden)
+    doc.FileName = filePath
+    return doc
+
+def getDocument(name: str) -> Document:
+    return documents[name]
+
+def listDocuments() -> Dict[str, Document]:
+    return dict(documents)
+
+def setActiveDocument(name: str):
+    global ActiveDocument
+    ActiveDocument = documents[name]
+
+def closeDocument(name: str):
+    global ActiveDocument
+    doc = documents.pop(name)
+    if ActiveDocument is doc:
+        ActiveDocument = next(iter(documents.values()), None)
+
+# TiledCut looks for FreeCADCmd in here, it won't find it and cuts in one go
+def getHomePath() -> str:
+    return os.path.dirname(os.path.abspath(__file__)) + os.path.sep
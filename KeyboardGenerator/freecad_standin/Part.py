@@ -0,0 +1,284 @@
+# Stand-in for FreeCADs Part module. Geometry knows its end points, shapes only
+# keep track of the points (and faces) they're made of so bounding boxes and
+# vertexes can be read back. Booleans and extrusions don't compute anything,
+# they're counted by Recorder and return a shape with the points of the inputs.
+# Only common() intersects, the bounding boxes, so the strips TiledCut cuts the
+# plate into are where they'd be in FreeCAD. BREP files hold the points and faces
+# as JSON, so the shapes survive being passed to a tile worker.
+import math
+import json
+from typing import List
+import FreeCAD
+import Recorder
+from FreeCAD import Vector
+
+class Geometry():
+    Construction = False
+
+    def toShape(self) -> 'Edge':
+        return Edge(self)
+
+    def getPoints(self) -> List[Vector]:
+        return [self.StartPoint, self.EndPoint]
+
+class Point(Geometry):
+    def __init__(self, point: Vector = None):
+        point = point if point is not None else Vector()
+        self.X, self.Y, self.Z = point.x, point.y, point.z
+
+    @property
+    def StartPoint(self) -> Vector:
+        return Vector(self.X, self.Y, self.Z)
+
+    EndPoint = StartPoint
+    Location = StartPoint
+
+    def getPoints(self) -> List[Vector]:
+        return [self.StartPoint]
+
+class LineSegment(Geometry):
+    def __init__(self, startPoint: Vector = None, endPoint: Vector = None):
+        self.StartPoint = Vector(startPoint) if startPoint is not None else Vector()
+        self.EndPoint = Vector(endPoint) if endPoint is not None else Vector(1, 0, 0)
+
+    def length(self) -> float:
+        return (self.EndPoint - self.StartPoint).Length
+
+Line = LineSegment
+
+class Circle(Geometry):
+    def __init__(self, center: Vector = None, normal: Vector = None, radius: float = 1):
+        self.Center = Vector(center) if center is not None else Vector()
+        self.Axis = Vector(normal) if normal is not None else Vector(0, 0, 1)
+        self.Radius = radius
+
+    @property
+    def Location(self) -> Vector:
+        return self.Center
+
+    def value(self, parameter: float) -> Vector:
+        return self.Center + Vector(math.cos(parameter), math.sin(parameter)) * self.Radius
+
+    def getPoints(self) -> List[Vector]:
+        return [self.value(math.pi * quarter / 2) for quarter in range(4)]
+
+class Ellipse(Geometry):
+    def __init__(self, center: Vector = None, majorRadius: float = 2, minorRadius: float = 1):
+        self.Center = Vector(center) if center is not None else Vector()
+        self.MajorRadius = majorRadius
+        self.MinorRadius = minorRadius
+        # Angle of the major axis
+        self.AngleXU = 0.
+
+    @property
+    def Location(self) -> Vector:
+        return self.Center
+
+    def value(self, parameter: float) -> Vector:
+        x = self.MajorRadius * math.cos(parameter)
+        y = self.MinorRadius * math.sin(parameter)
+        cos, sin = math.cos(self.AngleXU), math.sin(self.AngleXU)
+        return self.Center + Vector(x * cos - y * sin, x * sin + y * cos)
+
+    def getPoints(self) -> List[Vector]:
+        return [self.value(math.pi * quarter / 2) for quarter in range(4)]
+
+class ArcOfCircle(Geometry):
+    def __init__(self, circle: Circle, startParameter: float, endParameter: float):
+        self.Circle = circle
+        self.FirstParameter = startParameter
+        self.LastParameter = endParameter
+
+    @property
+    def StartPoint(self) -> Vector:
+        return self.Circle.value(self.FirstParameter)
+
+    @property
+    def EndPoint(self) -> Vector:
+        return self.Circle.value(self.LastParameter)
+
+    @property
+    def Location(self) -> Vector:
+        return self.Circle.Center
+
+    @property
+    def Radius(self) -> float:
+        return self.Circle.Radius
+
+class ArcOfEllipse(ArcOfCircle):
+    @property
+    def Ellipse(self) -> Ellipse:
+        return self.Circle
+
+    @property
+    def MajorRadius(self) -> float:
+        return self.Circle.MajorRadius
+
+    @property
+    def MinorRadius(self) -> float:
+        return self.Circle.MinorRadius
+
+    @property
+    def AngleXU(self) -> float:
+        return self.Circle.AngleXU
+
+class BoundBox():
+    def __init__(self, points: List[Vector]):
+        points = points or [Vector()]
+        self.XMin = min(point.x for point in points)
+        self.XMax = max(point.x for point in points)
+        self.YMin = min(point.y for point in points)
+        self.YMax = max(point.y for point in points)
+        self.ZMin = min(point.z for point in points)
+        self.ZMax = max(point.z for point in points)
+
+    @property
+    def XLength(self) -> float:
+        return self.XMax - self.XMin
+
+    @property
+    def YLength(self) -> float:
+        return self.YMax - self.YMin
+
+    @property
+    def ZLength(self) -> float:
+        return self.ZMax - self.ZMin
+
+class Vertex():
+    def __init__(self, point: Vector):
+        self.Point = Vector(point)
+        self.X, self.Y, self.Z = self.Point.x, self.Point.y, self.Point.z
+
+class Shape():
+    def __init__(self, points: List[Vector] = None, faces: List['Face'] = None):
+        self.points: List[Vector] = list(points or [])
+        self.faceList: List['Face'] = list(faces or [])
+
+    # Unique points, in the order they were added
+    @property
+    def Vertexes(self) -> List[Vertex]:
+        vertexes: List[Vertex] = []
+        for point in self.points:
+            if not any(vertex.Point.isEqual(point, 1e-7) for vertex in vertexes):
+                vertexes.append(Vertex(point))
+
+        return vertexes
+
+    @property
+    def Faces(self) -> List['Face']:
+        return list(self.faceList)
+
+    @property
+    def BoundBox(self) -> BoundBox:
+        return BoundBox(self.points)
+
+    @property
+    def Volume(self) -> float:
+        return 0.
+
+    def isNull(self) -> bool:
+        return not self.points
+
+    def isValid(self) -> bool:
+        return True
+
+    def copy(self) -> 'Shape':
+        return Shape(self.points, self.faceList)
+
+    def translate(self, offset: Vector) -> 'Shape':
+        self.points = [point + offset for point in self.points]
+        return self
+
+    def __boolean(self, name: str, others: List['Shape']) -> 'Shape':
+        Recorder.Record(name, f'{len(others)} shapes')
+        return Shape(self.points + [point for other in others for point in other.points], self.faceList)
+
+    def cut(self, other: 'Shape') -> 'Shape':
+        return self.__boolean('cut', [other])
+
+    # A face spanning the overlap of both bounding boxes, at the bottom of this shape
+    def common(self, other: 'Shape') -> 'Shape':
+        Recorder.Record('common', '1 shapes')
+        box, otherBox = self.BoundBox, other.BoundBox
+        xMin, xMax = max(box.XMin, otherBox.XMin), min(box.XMax, otherBox.XMax)
+        yMin, yMax = max(box.YMin, otherBox.YMin), min(box.YMax, otherBox.YMax)
+        if xMin > xMax or yMin > yMax or self.isNull() or other.isNull():
+            return Shape()
+
+        return makePlane(xMax - xMin, yMax - yMin, Vector(xMin, yMin, box.ZMin))
+
+    def fuse(self, other: 'Shape') -> 'Shape':
+        return self.__boolean('fuse', [other])
+
+    def multiFuse(self, others: List['Shape']) -> 'Shape':
+        return self.__boolean('fuse', others)
+
+    def extrude(self, direction: Vector) -> 'Shape':
+        Recorder.Record('extrude')
+        return Shape(self.points + [point + direction for point in self.points], self.faceList)
+
+    def removeSplitter(self) -> 'Shape':
+        return self.copy()
+
+    def slice(self, direction: Vector, distance: float) -> List['Wire']:
+        return []
+
+    def exportBrep(self, filePath: str):
+        Recorder.Record('exportBrep', filePath)
+        with open(filePath, 'w') as file:
+            json.dump({
+                'points': [tuple(point) for point in self.points],
+                'faces': [[tuple(point) for point in face.points] for face in self.faceList],
+            }, file)
+
+    def importBrep(self, filePath: str):
+        Recorder.Record('importBrep', filePath)
+        with open(filePath) as file:
+            brep = json.load(file)
+        self.points = [Vector(point) for point in brep['points']]
+        self.faceList = []
+        for facePoints in brep['faces']:
+            face = Face()
+            face.points = [Vector(point) for point in facePoints]
+            self.faceList.append(face)
+
+class Edge(Shape):
+    def __init__(self, geometry: Geometry):
+        super().__init__(geometry.getPoints())
+        self.Curve = geometry
+
+class Wire(Shape):
+    def __init__(self, edges: List[Edge] = None):
+        edges = edges or []
+        super().__init__([point for edge in edges for point in edge.points])
+        self.Edges = list(edges)
+
+class Face(Shape):
+    def __init__(self, wire: Wire = None):
+        super().__init__(wire.points if wire is not None else [])
+        self.faceList = [self]
+
+class Compound(Shape):
+    def __init__(self, shapes: List[Shape]):
+        super().__init__(
+            [point for shape in shapes for point in shape.points],
+            [face for shape in shapes for face in shape.faceList]
+        )
+
+# The object type of clones and point arrays, only used in type hints
+Part2DObject = FreeCAD.DocumentObject
+
+def makePolygon(points: List[Vector]) -> Wire:
+    return Wire([LineSegment(start, end).toShape() for start, end in zip(points, points[1:])])
+
+def makePlane(length: float, width: float, base: Vector = None) -> Face:
+    base = base if base is not None else Vector()
+    corners = [base, base + Vector(length, 0), base + Vector(length, width), base + Vector(0, width)]
+    return Face(makePolygon(corners + corners[:1]))
+
+def makeCompound(shapes: List[Shape]) -> Compound:
+    return Compound(shapes)
+
+# Stand-in edges are never out of order
+def __sortEdges__(edges: List[Edge]) -> List[Edge]:
+    return list(edges)
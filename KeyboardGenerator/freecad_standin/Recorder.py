@@ -0,0 +1,29 @@
+# Keeps track of the calls made into the stand-in FreeCAD modules of this folder.
+#
+#   Recorder.Reset()
+#   ... generate a plate ...
+#   Recorder.counts['addObject'], Recorder.counts['constraints']
+#
+# Calls are counted by name, the geometry and constraints they add are counted
+# separately ('geometry', 'constraints') as the bulk variants add many per call.
+from collections import Counter
+from typing import List, Tuple
+
+counts: Counter = Counter()
+# (name, detail) of every call, only recorded when logCalls is set
+calls: List[Tuple[str, str]] = []
+logCalls = False
+# Console.PrintMessage is silenced when set, warnings and errors are printed unless
+# expectProblems is set
+quiet = False
+# Warnings and errors are only counted when set, for checks that provoke them
+expectProblems = False
+
+def Record(name: str, detail: str = '', amount: int = 1):
+    counts[name] += amount
+    if logCalls:
+        calls.append((name, detail))
+
+def Reset():
+    counts.clear()
+    calls.clear()
@@ -0,0 +1,104 @@
+# Stand-in for FreeCADs Sketcher module. A SketchObject stores its geometry,
+# constraints and external geometry as given, nothing is solved.
+import math
+from typing import List, Tuple
+import Part
+import FreeCAD
+import Recorder
+
+class Constraint():
+    def __init__(self, type: str, *args):
+        self.Type = type
+        self.args = args
+
+    def __repr__(self) -> str:
+        return f'<Constraint {self.Type}{self.args}>'
+
+class SketchObject(FreeCAD.DocumentObject):
+    def __init__(self, doc: FreeCAD.Document, typeId: str, name: str):
+        super().__init__(doc, typeId, name)
+        self.Geometry: List[Part.Geometry] = []
+        self.Constraints: List[Constraint] = []
+        # (object, (element names)) like FreeCAD, in the order they were added
+        self.ExternalGeometry: List[Tuple[FreeCAD.DocumentObject, Tuple[str, ...]]] = []
+        self.constructionIds = set()
+
+    @property
+    def GeometryCount(self) -> int:
+        return len(self.Geometry)
+
+    @property
+    def ConstraintCount(self) -> int:
+        return len(self.Constraints)
+
+    # The vertexes of the (non construction) geometry
+    @property
+    def Shape(self) -> Part.Shape:
+        return Part.Shape([
+            point
+            for geoId, geometry in enumerate(self.Geometry) if geoId not in self.constructionIds
+            for point in geometry.getPoints()
+        ])
+
+    # Takes a single geometry (returns its id) or a list of them (returns a list of ids)
+    def addGeometry(self, geometry, construction: bool = False):
+        geometries = geometry if isinstance(geometry, list) else [geometry]
+        Recorder.Record('addGeometry', self.Name)
+        Recorder.Record('geometry', self.Name, len(geometries))
+        geoIds = list(range(len(self.Geometry), len(self.Geometry) + len(geometries)))
+        self.Geometry.extend(geometries)
+        if construction:
+            self.constructionIds.update(geoIds)
+
+        return geoIds if isinstance(geometry, list) else geoIds[0]
+
+    # Takes a single constraint (returns its index) or a list of them (returns a list of indices)
+    def addConstraint(self, constraint):
+        constraints = constraint if isinstance(constraint, list) else [constraint]
+        Recorder.Record('addConstraint', self.Name)
+        Recorder.Record('constraints', self.Name, len(constraints))
+        indices = list(range(len(self.Constraints), len(self.Constraints) + len(constraints)))
+        self.Constraints.extend(constraints)
+
+        return indices if isinstance(constraint, list) else indices[0]
+
+    def delConstraint(self, index: int):
+        Recorder.Record('delConstraint', self.Name)
+        del self.Constraints[index]
+
+    def addExternal(self, objectName: str, subElementName: str):
+        Recorder.Record('addExternal', f'{self.Name} {objectName}.{subElementName}')
+        obj = self.Document.getObject(objectName)
+        if obj is None:
+            raise ValueError('Not able to add external shape element')
+
+        for i, (externalObject, names) in enumerate(self.ExternalGeometry):
+            if externalObject is obj:
+                self.ExternalGeometry[i] = (obj, names + (subElementName,))
+                return
+        self.ExternalGeometry.append((obj, (subElementName,)))
+
+    # Adds the major and minor axis and both foci of an ellipse (arc), as construction
+    # geometry. Recorded as an addGeometry call, which it is internally.
+    def exposeInternalGeometry(self, geoId: int) -> int:
+        ellipse = self.Geometry[geoId]
+        ellipse = getattr(ellipse, 'Ellipse', ellipse)
+        center = ellipse.Center
+        major = ellipse.value(0) - center
+        minor = ellipse.value(math.pi / 2) - center
+        self.addGeometry([
+            Part.LineSegment(center - major, center + major),
+            Part.LineSegment(center - minor, center + minor),
+            Part.Point(center + major * 0.5),
+            Part.Point(center - major * 0.5),
+        ], True)
+
+        return 4
+
+    # Always succeeds, nothing is solved
+    def solve(self) -> int:
+        Recorder.Record('solve', self.Name)
+        return 0
+
+# FreeCADs Sketcher.Sketch is the solver, the generator only uses it in type hints
+Sketch = SketchObject